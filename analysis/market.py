@@ -0,0 +1,47 @@
+# analysis/market.py
+import pandas as pd
+import numpy as np
+
+OVERVIEW_COLUMNS = ["物品", "分類", "最新價格", "24h漲跌%", "7d漲跌%", "波動率%", "7日筆數", "總筆數", "距上次更新(小時)", "最後時間"]
+
+def _price_asof(df, cutoff, fallback):
+    """每個物品在 cutoff 當下(含)的最後價格；cutoff 之前沒資料則用 fallback (最早價格)。"""
+    base = df.loc[df['時間'] <= cutoff].groupby('物品', sort=False)['單價'].last()
+    return base.reindex(fallback.index).fillna(fallback)
+
+# 🌐 全市場總覽 (一次 groupby 聚合)
+def compute_market_overview(df, ref_time=None):
+    """
+    以向量化 groupby 一次算出所有物品的最新價、24h/7d 漲跌、波動率、筆數與距上次更新時間。
+    :param df: load_data 回傳的完整 DataFrame
+    :param ref_time: 基準時間 (預設為資料中的最新時間)
+    :return: 每個物品一列的 DataFrame
+    """
+    if df.empty:
+        return pd.DataFrame(columns=OVERVIEW_COLUMNS)
+
+    df = df.sort_values('時間', kind='stable')
+    ref_time = df['時間'].max() if ref_time is None else pd.Timestamp(ref_time)
+
+    g = df.groupby('物品', sort=False)
+    overview = g.agg(
+        分類=('分類', 'last'),
+        最新價格=('單價', 'last'),
+        最早價格=('單價', 'first'),
+        總筆數=('單價', 'size'),
+        最後時間=('時間', 'last'),
+    )
+
+    for label, hours in [("24h", 24), ("7d", 24 * 7)]:
+        base = _price_asof(df, ref_time - pd.Timedelta(hours=hours), overview['最早價格'])
+        overview[f"{label}漲跌%"] = np.where(base > 0, (overview['最新價格'] / base - 1) * 100, 0.0)
+
+    # 波動率 (標準差/平均價)，與互動區間分析器相同定義，取最近 7 日
+    week = df.loc[df['時間'] >= ref_time - pd.Timedelta(days=7)].groupby('物品', sort=False)['單價']
+    week_stats = week.agg(['std', 'mean', 'size']).reindex(overview.index)
+    overview['波動率%'] = (week_stats['std'] / week_stats['mean'] * 100).fillna(0.0)
+    overview['7日筆數'] = week_stats['size'].fillna(0).astype(int)
+
+    overview['距上次更新(小時)'] = (ref_time - overview['最後時間']).dt.total_seconds() / 3600
+
+    return overview.reset_index()[OVERVIEW_COLUMNS]
@@ -3,27 +3,48 @@ import numpy as np
 from scipy.signal import argrelextrema
 from scipy.stats import linregress
 
+PATTERN_MIN_POINTS = 15
+
+def find_extrema(prices, window=3):
+    """
+    取得局部高點 (Peaks) 與 低點 (Troughs)，回傳 (peaks, troughs)，皆為 [(Index, Price)]。
+    最後 window 筆的極值只是暫定的 (右側資料不足)，新資料進來後可能改變。
+    """
+    prices = np.asarray(prices)
+    peak_idxs = argrelextrema(prices, np.greater, order=window)[0]
+    trough_idxs = argrelextrema(prices, np.less, order=window)[0]
+    peaks = [(int(i), prices[i]) for i in peak_idxs]
+    troughs = [(int(i), prices[i]) for i in trough_idxs]
+    return peaks, troughs
+
 # 3️⃣ AI 型態偵測
 def detect_patterns(df, window=3):
     """
     進階型態偵測：頭肩型態、三角收斂、通道、雙重頂/底
     保證所有回傳型態都包含 'start_idx' 與 'end_idx'
     """
-    patterns = []
-    
     # 若資料過少，回傳空的但不報錯
-    if len(df) < 15:
-        return patterns
+    if len(df) < PATTERN_MIN_POINTS:
+        return []
 
     prices = df['單價'].values
-    
-    # 1. 取得局部高點 (Peaks) 與 低點 (Troughs)
-    peak_idxs = argrelextrema(prices, np.greater, order=window)[0]
-    trough_idxs = argrelextrema(prices, np.less, order=window)[0]
-    
-    # 轉換為 (Index, Price) 列表
-    peaks = [(i, prices[i]) for i in peak_idxs]
-    troughs = [(i, prices[i]) for i in trough_idxs]
+    peaks, troughs = find_extrema(prices, window)
+    return classify_patterns(peaks, troughs, len(prices), prices[0], prices[-1], prices.max(), prices.min())
+
+def classify_patterns(peaks, troughs, n, first_price, last_price, max_price, min_price):
+    """
+    依極值點判斷型態 (detect_patterns 的核心)。只會用到最後 5 個高點 / 低點，
+    因此增量計算時只要保留最近的極值與整體統計量，就能得到與全量計算相同的結果。
+    :param n: 資料筆數
+    """
+    patterns = []
+    if n < PATTERN_MIN_POINTS:
+        return patterns
+
+    peak_idxs = np.array([i for i, _ in peaks], dtype=int)
+    trough_idxs = np.array([i for i, _ in troughs], dtype=int)
+    peak_prices = np.array([p for _, p in peaks], dtype=float)
+    trough_prices = np.array([p for _, p in troughs], dtype=float)
 
     # --- A. 頭肩型態 (Head and Shoulders) (無須修正) ---
     if len(peaks) >= 3:
@@ -88,8 +109,8 @@ def detect_patterns(df, window=3):
             pattern_start = int(min(recent_peak_idxs[0], recent_trough_idxs[0]))
             pattern_end = int(max(recent_peak_idxs[-1], recent_trough_idxs[-1]))
             
-            slope_res, _, _, _, _ = linregress(recent_peak_idxs, prices[recent_peak_idxs])
-            slope_sup, _, _, _, _ = linregress(recent_trough_idxs, prices[recent_trough_idxs])
+            slope_res, _, _, _, _ = linregress(recent_peak_idxs, peak_prices[-5:])
+            slope_sup, _, _, _, _ = linregress(recent_trough_idxs, trough_prices[-5:])
         
         # 三角收斂
         if slope_res < -0.05 and slope_sup > 0.05:
@@ -119,13 +140,11 @@ def detect_patterns(df, window=3):
 
     # --- D. 簡單暴漲暴跌 (安全網) (無須修正，邏輯正確) ---
     if not patterns:
-        total_change = (prices[-1] - prices[0]) / prices[0]
-        max_price = prices.max()
-        min_price = prices.min()
+        total_change = (last_price - first_price) / first_price
         volatility = (max_price - min_price) / min_price if min_price > 0 else 0
         
         default_start = 0
-        default_end = len(df) - 1
+        default_end = n - 1
         
         if total_change > 0.3:
             patterns.append({'type': "🚀 急速拉升", 'start_idx': default_start, 'end_idx': default_end})
@@ -152,32 +171,41 @@ def detect_events(df):
         
         df['Price_Change'] = df['單價'].diff()
         
-        # 1. 新高/新低 (針對最新一筆資料)
-        current_price = df.iloc[-1]['單價']
-        cumulative_max = df['單價'].cummax().iloc[-1]
-        cumulative_min = df['單價'].cummin().iloc[-1]
-        
-        if current_price >= cumulative_max:
-            events.append({'index': df.index[-1], 'type': '🔥 創歷史新高'})
-        elif current_price <= cumulative_min:
-            events.append({'index': df.index[-1], 'type': '🧊 創歷史新低'})
-
-        # 2. 價格突變 (針對最新一筆資料)
-        std_change = df['Price_Change'].std()
-        mean_price = df['單價'].mean()
-        last_change = df.iloc[-1]['Price_Change']
-        
-        if pd.isna(std_change):
-            std_change = 0
-            
-        threshold = 3 * std_change
-        
-        if abs(last_change) > threshold and abs(last_change) > mean_price * 0.01:
-            change_type = "⚡ 暴漲突變" if last_change > 0 else "⚡ 暴跌突變"
-            events.append({'index': df.index[-1], 'type': change_type})
+        return classify_events(
+            df.index[-1],
+            current_price=df.iloc[-1]['單價'],
+            max_price=df['單價'].cummax().iloc[-1],
+            min_price=df['單價'].cummin().iloc[-1],
+            last_change=df.iloc[-1]['Price_Change'],
+            std_change=df['Price_Change'].std(),
+            mean_price=df['單價'].mean()
+        )
             
     except Exception as e:
         print(f"Event detection error: {e}")
         return []
 
+def classify_events(index, current_price, max_price, min_price, last_change, std_change, mean_price):
+    """
+    依最新一筆與整體統計量判斷事件 (detect_events 的核心，可由增量統計量直接呼叫)。
+    :param std_change: 價格差分的樣本標準差 (ddof=1)
+    """
+    events = []
+
+    # 1. 新高/新低 (針對最新一筆資料)
+    if current_price >= max_price:
+        events.append({'index': index, 'type': '🔥 創歷史新高'})
+    elif current_price <= min_price:
+        events.append({'index': index, 'type': '🧊 創歷史新低'})
+
+    # 2. 價格突變 (針對最新一筆資料)
+    if pd.isna(std_change):
+        std_change = 0
+        
+    threshold = 3 * std_change
+    
+    if abs(last_change) > threshold and abs(last_change) > mean_price * 0.01:
+        change_type = "⚡ 暴漲突變" if last_change > 0 else "⚡ 暴跌突變"
+        events.append({'index': index, 'type': change_type})
+
     return events
\ No newline at end of file
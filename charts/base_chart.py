@@ -43,9 +43,8 @@ def create_flagship_chart(df, item_name, indicator_config, analysis_data):
 
     # --- 3. 應用 AI 覆蓋層 (2️⃣, 3️⃣, 9️⃣) ---
     if indicator_config['AI_Overlay']:
-        add_support_resistance_lines(fig, df, analysis_data['sr_analysis'])
-        add_pattern_traces(fig, df, analysis_data['pattern_analysis'])
-        add_event_markers(fig, df, analysis_data['event_analysis'])
+        # 🔴 批次建構：所有 shapes/annotations 一次 update_layout，事件依類別合併成單一 trace
+        add_ai_overlays(fig, df, analysis_data)
 
     # --- 4. 基礎佈局設定 (TradingView 風格核心) ---
     fig.update_layout(
@@ -0,0 +1,33 @@
+# charts/compare_chart.py
+import plotly.graph_objects as go
+from utils.theme import TV_THEME, PLOTLY_LAYOUT
+
+# 📊 多物品正規化比較圖
+def create_comparison_chart(rebased, highlight_cols=()):
+    """
+    將已換算成 100 基準的多物品矩陣畫成同一張圖。
+    :param rebased: index 為時間格點、每欄一個物品的 DataFrame
+    :param highlight_cols: 需以虛線強調的欄位 (例如分類指數)
+    """
+    fig = go.Figure()
+    if rebased.empty:
+        return fig
+
+    for col in rebased.columns:
+        is_index = col in highlight_cols
+        fig.add_trace(go.Scatter(
+            x=rebased.index, y=rebased[col],
+            mode='lines', name=col,
+            line=dict(width=3 if is_index else 2, dash='dash' if is_index else 'solid'),
+            hovertemplate=f'<b>{col}</b><br>%{{x|%Y-%m-%d %H:%M}}<br>指數: %{{y:.1f}}<extra></extra>'
+        ))
+
+    fig.add_hline(y=100, line_dash="dot", line_color=TV_THEME['GRID'], line_width=1)
+    fig.update_layout(
+        **PLOTLY_LAYOUT,
+        xaxis=dict(type="date", gridcolor=TV_THEME['GRID'], linecolor=TV_THEME['LINE_AXIS']),
+        yaxis=dict(title="相對表現 (起點 = 100)", side="right", gridcolor=TV_THEME['GRID'], zerolinecolor=TV_THEME['GRID']),
+        hovermode="x unified",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, bgcolor=TV_THEME['BG_PAPER'])
+    )
+    return fig
@@ -0,0 +1,43 @@
+# charts/market_chart.py
+import plotly.graph_objects as go
+import numpy as np
+from utils.theme import TV_THEME, PLOTLY_LAYOUT
+
+# 🌐 市場熱力圖 (分類 Treemap)
+def create_market_treemap(overview, change_col="24h漲跌%"):
+    """
+    以分類為父節點的 Treemap，方塊大小 = 7 日筆數 (至少 1)，顏色 = 漲跌幅。
+    :param overview: compute_market_overview 的結果
+    :param change_col: 用來上色的漲跌欄位
+    """
+    if overview.empty:
+        return go.Figure()
+
+    cats = overview['分類'].unique().tolist()
+    sizes = np.maximum(overview['7日筆數'].to_numpy(), 1)
+    changes = overview[change_col].to_numpy(dtype=float)
+    # 色階以 ±30% 封頂，避免單一暴漲物品把其他顏色壓平
+    limit = max(5.0, min(30.0, float(np.nanmax(np.abs(changes))) if len(changes) else 5.0))
+
+    fig = go.Figure(go.Treemap(
+        ids=cats + overview['物品'].tolist(),
+        labels=cats + overview['物品'].tolist(),
+        parents=[""] * len(cats) + overview['分類'].tolist(),
+        values=[0] * len(cats) + sizes.tolist(),
+        text=[""] * len(cats) + [f"{c:+.1f}%" for c in changes],
+        hovertext=cats + [
+            f"<b>{name}</b><br>價格: ${price:,.0f}<br>漲跌: {c:+.2f}%"
+            for name, price, c in zip(overview['物品'], overview['最新價格'], changes)
+        ],
+        marker=dict(
+            colors=[0.0] * len(cats) + changes.tolist(),
+            colorscale=[[0, TV_THEME['COLOR_DOWN']], [0.5, "#2a2e39"], [1, TV_THEME['COLOR_UP']]],
+            cmin=-limit, cmax=limit, cmid=0,
+            colorbar=dict(title=change_col, ticksuffix="%")
+        ),
+        branchvalues="remainder",
+        texttemplate="<b>%{label}</b><br>%{text}",
+        hovertemplate="%{hovertext}<extra></extra>",
+    ))
+    fig.update_layout(**PLOTLY_LAYOUT)
+    return fig
@@ -0,0 +1,216 @@
+# charts/render.py
+"""
+無頭 (headless) 圖表輸出：在伺服器端把 Plotly 圖表轉成 PNG，給日報等非 Streamlit 場景使用。
+使用 Kaleido 本地渲染 (不需網路)：
+- kaleido >= 1.0 會驅動本機安裝的 Chrome/Chromium
+- kaleido 0.2.1 (搭配 plotly < 6.1) 內建 Chromium
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.theme import TV_THEME, PLOTLY_LAYOUT
+
+REPORT_CHART_SIZE = dict(width=720, height=360, scale=2)
+RENDER_TIMEOUT = float(os.environ.get("CHART_RENDER_TIMEOUT", "60"))  # 單張圖最多等幾秒 (含工作程序暖機)
+
+# 📊 日報用精簡圖表
+def create_report_chart(df, item_name, days=7):
+    """
+    日報用的精簡版價格圖 (無 Range Slider / 互動元件)。
+    :param df: filter_and_prepare_data 的結果
+    :param item_name: 物品名稱
+    :param days: 只顯示最近幾天
+    """
+    if df.empty:
+        return go.Figure()
+
+    recent = df[df['時間'] >= df['時間'].max() - pd.Timedelta(days=days)]
+    if len(recent) < 2:
+        recent = df.tail(2)
+
+    first, last = recent['單價'].iloc[0], recent['單價'].iloc[-1]
+    change = (last - first) / first * 100 if first else 0
+    color = TV_THEME['COLOR_UP'] if change >= 0 else TV_THEME['COLOR_DOWN']
+
+    fig = go.Figure(go.Scatter(
+        x=recent['時間'], y=recent['單價'],
+        mode='lines+markers', name='成交價',
+        line=dict(color=color, width=3),
+        marker=dict(size=4, color=color),
+        fill='tozeroy', fillcolor='rgba(8, 153, 129, 0.15)' if change >= 0 else 'rgba(242, 54, 69, 0.15)'
+    ))
+
+    if len(recent) >= 20:
+        fig.add_trace(go.Scatter(
+            x=recent['時間'], y=recent['單價'].rolling(window=20).mean(),
+            mode='lines', name='MA20', line=dict(color=TV_THEME['COLOR_MA20'], width=1.5)
+        ))
+
+    low, high = recent['單價'].min(), recent['單價'].max()
+    pad = (high - low) * 0.15 or high * 0.05
+    fig.update_layout(
+        **{**PLOTLY_LAYOUT, 'height': REPORT_CHART_SIZE['height'], 'margin': dict(l=20, r=80, t=50, b=30)},
+        # 標題不放 Emoji：無頭環境通常沒有彩色 Emoji 字型
+        title=dict(text=f"{item_name}  {change:+.1f}% ({days}D)  ${last:,.0f}", font=dict(size=18, color=TV_THEME['COLOR_TEXT'])),
+        xaxis=dict(type="date", gridcolor=TV_THEME['GRID'], linecolor=TV_THEME['LINE_AXIS']),
+        yaxis=dict(tickformat=",", side="right", gridcolor=TV_THEME['GRID'], range=[max(0, low - pad), high + pad]),
+        showlegend=False
+    )
+    return fig
+
+# ==========================================
+# 🏭 渲染工作池
+# ==========================================
+def find_chrome():
+    """
+    kaleido >= 1.0 要用本機的 Chrome/Chromium；找不到時常駐渲染器會在背景執行緒失敗，之後每張圖都卡住。
+    :return: (可以渲染, 說明)；kaleido 0.2.1 內建 Chromium，不需要檢查
+    """
+    try:
+        import kaleido
+    except ImportError:
+        return False, "未安裝 kaleido"
+    if not hasattr(kaleido, "start_sync_server"):
+        return True, "kaleido 內建 Chromium"
+    try:
+        from choreographer.browsers.chromium import Chromium
+        path = Chromium.find_browser(skip_local=False)
+    except Exception as e:
+        return False, f"無法檢查 Chrome: {e}"
+    if not path:
+        return False, "找不到 Chrome/Chromium (可執行 kaleido_get_chrome 安裝，或設定 BROWSER_PATH)"
+    return True, path
+
+def _init_render_worker():
+    """工作程序啟動時先暖機：啟動常駐瀏覽器並渲染一張空圖，之後每張圖只需數十毫秒。"""
+    try:
+        import kaleido
+        if hasattr(kaleido, "start_sync_server"):
+            kaleido.start_sync_server(silence_warnings=True)
+    except Exception:
+        pass
+    try:
+        pio.to_image(go.Figure(), format="png", width=10, height=10)
+    except Exception as e:
+        print(f"⚠️ 渲染程序暖機失敗: {e}")
+
+def _noop():
+    return None
+
+def _render_png(fig_dict, width, height, scale):
+    start = time.perf_counter()
+    png = pio.to_image(fig_dict, format="png", width=width, height=height, scale=scale)
+    return png, (time.perf_counter() - start) * 1000
+
+class ChartRenderPool:
+    """
+    可重複使用的 PNG 渲染工作池。每個工作程序各自維持一個暖機好的渲染器，
+    多張圖可並行輸出，總時間約等於一張圖。
+
+    找不到渲染器時不啟動工作程序；單張圖超過 timeout 秒就終止整個工作池，render_all 回傳空清單 (報告改為純文字)。
+
+    用法:
+        with ChartRenderPool() as pool:
+            images = pool.render_all({"chart_1.png": fig1, "chart_2.png": fig2})
+    """
+    def __init__(self, max_workers=None, timeout=RENDER_TIMEOUT):
+        self.max_workers = max_workers or int(os.environ.get("CHART_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+        self.timeout = timeout
+        self.unavailable = None     # 無法渲染的原因
+        self._executor = None
+        self._futures = []
+
+    def start(self):
+        if self._executor is None and self.unavailable is None:
+            ok, detail = find_chrome()
+            if not ok:
+                self.unavailable = detail
+                print(f"⚠️ 圖表渲染停用: {detail}")
+                return self
+            # spawn：避免在已開執行緒 (asyncio / requests) 的程序中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_render_worker
+            )
+        return self
+
+    def prewarm(self):
+        """提前啟動所有工作程序並完成暖機 (不等待)，讓渲染器啟動時間與其他工作重疊。"""
+        self.start()
+        if self._executor is not None:
+            self._futures += [self._executor.submit(_noop) for _ in range(self.max_workers)]
+        return self
+
+    def terminate(self):
+        """強制結束工作程序 (卡住的渲染器不會自己結束)，之後不再渲染。"""
+        if self._executor is None:
+            return
+        # ProcessPoolExecutor 在 3.14 之前沒有公開的終止方法
+        for process in list((self._executor._processes or {}).values()):
+            process.terminate()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._futures = []
+        self.unavailable = "渲染逾時，工作池已終止"
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        _, pending = wait(self._futures, timeout=self.timeout)
+        if pending:
+            print(f"⚠️ 渲染程序 {self.timeout:.0f}s 內未結束，強制終止")
+            self.terminate()
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._futures = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, fig, width=REPORT_CHART_SIZE['width'], height=REPORT_CHART_SIZE['height'], scale=REPORT_CHART_SIZE['scale']):
+        """送出單張圖，回傳 Future -> (png_bytes, 渲染毫秒)。"""
+        self.start()
+        if self._executor is None:
+            raise RuntimeError(self.unavailable)
+        fig_dict = fig.to_dict() if isinstance(fig, go.Figure) else fig
+        future = self._executor.submit(_render_png, fig_dict, width, height, scale)
+        self._futures = [f for f in self._futures if not f.done()] + [future]
+        return future
+
+    def render_all(self, figures, **size):
+        """
+        並行渲染多張圖。
+        :param figures: {檔名: Figure}
+        :return: [(檔名, png_bytes)]，依輸入順序；失敗的圖會被略過並記錄，逾時則全部放棄 (回傳空清單)
+        """
+        start = time.perf_counter()
+        self.start()
+        if self._executor is None:
+            print(f"⚠️ 略過圖表渲染: {self.unavailable}")
+            return []
+        futures = {name: self.submit(fig, **size) for name, fig in figures.items()}
+        results = []
+        for name, future in futures.items():
+            try:
+                png, ms = future.result(timeout=self.timeout)
+                print(f"🖼️ 圖表渲染完成: {name} ({ms:,.0f} ms, {len(png) / 1024:,.0f} KB)")
+                results.append((name, png))
+            except FutureTimeout:
+                print(f"❌ 圖表渲染逾時 ({self.timeout:.0f}s): {name}，終止渲染池，報告改為純文字")
+                self.terminate()
+                return []
+            except Exception as e:
+                print(f"❌ 圖表渲染失敗: {name} - {e}")
+        print(f"🖼️ 共 {len(results)} 張圖表，總耗時 {(time.perf_counter() - start) * 1000:,.0f} ms")
+        return results
@@ -1,14 +1,11 @@
 # daily_report.py
 import os
-import requests
 import pandas as pd
 import datetime
 import time
-import json
 import re
 import asyncio 
-import edge_tts     
-import google.generativeai as genai 
+import argparse
 
 # 為了避免 Streamlit 的警告洗版，我們把它靜音
 import logging
@@ -17,18 +14,44 @@ logging.getLogger("streamlit").setLevel(logging.ERROR)
 from utils.preprocess import load_data, filter_and_prepare_data
 from analysis.trend import analyze_trend
 from analysis.patterns import detect_patterns, detect_events
+from charts.render import create_report_chart, ChartRenderPool
+from reporting import llm, tts
+from reporting.discord import DiscordWebhookClient
+from reporting.config import make_report_definition, load_report_definitions, resolve_webhooks, matches_report
+from reporting.state import ReportState, StateOutOfRange
 
 # ==========================================
 # 🔑 設定區
 # ==========================================
 SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQtSvfsvYpDjQutAO9L4AV1Rq8XzZAQEAZcLZxl9JsSvxCo7X2JsaFTVdTAQwGNQRC2ySe5OPJaTzp9/pub?gid=915078159&single=true&output=csv"
 DISCORD_WEBHOOK_URL = os.environ.get("DISCORD_WEBHOOK_URL")
+# 可用逗號分隔多個 webhook，會同時發送
+DISCORD_WEBHOOK_URLS = [u.strip() for u in (DISCORD_WEBHOOK_URL or "").split(",") if u.strip()]
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "").strip()
+REPORT_CHARTS = os.environ.get("REPORT_CHARTS", "1") != "0"  # 是否附上焦點物品走勢圖
+AI_RACE_K = int(os.environ.get("AI_RACE_K", 3))                # 同時競速的模型數 (1 = 依序嘗試)
+AI_CALL_TIMEOUT = float(os.environ.get("AI_CALL_TIMEOUT", 45)) # 單次模型呼叫逾時 (秒)
+REPORT_INCREMENTAL = os.environ.get("REPORT_INCREMENTAL", "1") != "0"  # 以 .cache 中的狀態快照只分析新成交
 
 # ==========================================
 # 🧠 AI 模型 (早晚報智能切換版)
 # ==========================================
-def generate_ai_script(market_stats, ai_focus_items, report_type):
+def discover_models(client=None):
+    """查詢可用的 Gemini 模型並依優先順序排列 (磁碟快取 + TTL，與市場數據無關，可和下載/分析同時進行)。"""
+    try:
+        client = client or llm.GeminiClient(GEMINI_API_KEY)
+    except Exception as e:
+        print(f"⚠️ Gemini 初始化失敗: {e}")
+        return list(llm.FALLBACK_MODELS)
+    return llm.discover_models(client)
+
+def generate_ai_script(market_stats, ai_focus_items, report_type, target_models=None):
+    return asyncio.run(generate_ai_script_async(market_stats, ai_focus_items, report_type, target_models))
+
+async def generate_ai_script_async(market_stats, ai_focus_items, report_type, target_models=None, client=None, scope=None):
+    """
+    :param scope: 分送報告的範圍說明 (例如「⚔️ 武器王石」)，None 代表全市場
+    """
     
     # 1. 時間設定
     utc_now = datetime.datetime.utcnow()
@@ -53,14 +76,16 @@ def generate_ai_script(market_stats, ai_focus_items, report_type):
     def get_backup_script():
         return "(AI 分析師連線忙碌中，請直接查看下方數據看板)", 0
     
-    if not GEMINI_API_KEY: return get_backup_script()
+    if not GEMINI_API_KEY and client is None: return get_backup_script()
 
     # --- 準備 Prompt ---
     items_str = ""
     for h in ai_focus_items:
         role = h.get('role', '重點關注')
         tags_str = ", ".join(h['tags']) if h['tags'] else "無"
+        if h.get('is_new'): role += "，本時段新上榜"
         items_str += f"- {h['item']} ({role}): 漲跌 {h['change_pct']:+.1f}%, 價格 {h['price']:,.0f}, 特徵: {tags_str}\n"
+    scope_str = f"\n    - 報告範圍：只涵蓋「{scope}」，請在開場提到這是該類別的專題報告。" if scope else ""
 
     prompt = f"""
     【角色設定】
@@ -71,18 +96,18 @@ def generate_ai_script(market_stats, ai_focus_items, report_type):
     【時間情境】
     - 日期：{date_str}
     - 時段：**{report_type}**
-    - 開場問候：請說「{greeting}」，並說明這是「{time_context}」的市場變化。
+    - 開場問候：請說「{greeting}」，並說明這是「{time_context}」的市場變化。{scope_str}
     
     【市場數據】
     - 上漲 {market_stats['up']} 家 / 下跌 {market_stats['down']} 家
     - 平均漲跌幅：{market_stats['avg_change']:+.1f}%
 
-    【本時段 6 大焦點物品】
+    【本時段 {len(ai_focus_items)} 大焦點物品】
     {items_str}
 
     【寫作要求】
 
-    1. **自然流暢**：順暢介紹這 6 個物品，不要用生硬的標題。
+    1. **自然流暢**：順暢介紹這 {len(ai_focus_items)} 個物品，不要用生硬的標題。
     2. **情緒起伏**：
        - 大漲/新高：開心、恭喜玩家。
        - 大跌/頭肩頂：關心、提醒風險。
@@ -96,33 +121,19 @@ def generate_ai_script(market_stats, ai_focus_items, report_type):
     6. 字數約 350 字，多用Emoji。
     """
 
-    # --- 呼叫模型 ---
-    target_models = []
+    # --- 呼叫模型 (前 AI_RACE_K 個候選同時競速，取第一個有效回應) ---
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        all_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-        priority_list = ["gemini-2.0-flash-exp", "gemini-1.5-flash", "gemini-1.5-flash-001", "flash"]
-        seen = set()
-        for p in priority_list:
-            for m in all_models:
-                if p in m and m not in seen:
-                    target_models.append(m)
-                    seen.add(m)
-        if not target_models: target_models = all_models
-    except:
-        target_models = ["models/gemini-1.5-flash"]
+        client = client or llm.GeminiClient(GEMINI_API_KEY)
+    except Exception as e:
+        print(f"❌ Gemini 初始化失敗: {e}")
+        return get_backup_script()
+    if target_models is None:
+        target_models = await asyncio.to_thread(discover_models, client)
 
-    for model_name in target_models:
-        try:
-            print(f"🧠 嘗試呼叫: {model_name} ...")
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt, generation_config=genai.types.GenerationConfig(temperature=0.7))
-            if response.text:
-                color = 5763719 if market_stats['up'] >= market_stats['down'] else 15548997
-                return response.text, color
-        except Exception as e:
-            if "429" not in str(e): print(f"❌ {model_name} error: {e}")
-            time.sleep(1)
+    _, text = await llm.race_generate(client, target_models, prompt, k=AI_RACE_K, timeout=AI_CALL_TIMEOUT)
+    if text:
+        color = 5763719 if market_stats['up'] >= market_stats['down'] else 15548997
+        return text, color
 
     return get_backup_script()
 
@@ -174,49 +185,55 @@ def num_to_chinese(num_str):
     return result
 
 # ==========================================
-# 🎵 使用 Edge-TTS 生成加速語音 (優化版)
+# 🎵 使用 Edge-TTS 生成加速語音 (優化版：分段並行、記憶體內串接)
 # ==========================================
-async def generate_voice_async(text, output_file):
-    # 增加 rate="+30%" 語速稍微加快，聽起來較有精神
-    communicate = edge_tts.Communicate(text, "zh-TW-HsiaoChenNeural", rate="+30%")
-    await communicate.save(output_file)
+def clean_script_for_tts(text):
+    """把 AI 文案整理成適合朗讀的純文字。"""
+    # 去除 Markdown 粗體
+    clean_text = re.sub(r'\*\*(.*?)\*\*', r'\1', text) 
+    # 去除標題符號
+    clean_text = clean_text.replace("###", "").replace("##", "")
+    
+    # 處理金錢格式：$10,000 -> 一萬眾神幣 (使用您的 num_to_chinese 函式)
+    clean_text = re.sub(
+        r'\$([0-9,]+)', 
+        lambda m: f"{num_to_chinese(m.group(1))}眾神幣", 
+        clean_text
+    )        
+    
+    # 去除 Emoji (避免 Edge-TTS 讀出奇怪的描述)
+    clean_text = re.sub(r'[\U00010000-\U0010ffff]', '', clean_text) 
+    clean_text = re.sub(r'[\u2600-\u27bf]', '', clean_text)
+    return clean_text
 
 def create_audio_file(text, report_type):
-    print("🎙️ 正在生成語音報導 (Edge-TTS 加速版)...")
+    # 如果是在 Jupyter Notebook 中執行，需改用 nest_asyncio，但在 .py 腳本中這樣寫是正確的
+    return asyncio.run(create_audio_file_async(text, report_type))
+
+async def create_audio_file_async(text, report_type, engine=None, report_name="托蘭市場"):
+    """
+    :return: (檔名, mp3_bytes)，失敗時回傳 None。音訊只存在記憶體中，不寫暫存檔。
+    """
+    print("🎙️ 正在生成語音報導 (Edge-TTS 分段並行版)...")
     try:
-        # (1) 產生動態檔名
+        # (1) 產生動態檔名 (只用於 Discord 附件名稱)
         utc_now = datetime.datetime.utcnow()
         tw_now = utc_now + datetime.timedelta(hours=8)
         month_day = tw_now.strftime('%m-%d')
-        filename = f"托蘭市場{report_type} ({month_day}).mp3"
+        filename = f"{report_name}{report_type} ({month_day}).mp3"
 
         # (2) 清理文字
-        # 去除 Markdown 粗體
-        clean_text = re.sub(r'\*\*(.*?)\*\*', r'\1', text) 
-        # 去除標題符號
-        clean_text = clean_text.replace("###", "").replace("##", "")
-        
-        # 處理金錢格式：$10,000 -> 一萬眾神幣 (使用您的 num_to_chinese 函式)
-        clean_text = re.sub(
-            r'\$([0-9,]+)', 
-            lambda m: f"{num_to_chinese(m.group(1))}眾神幣", 
-            clean_text
-        )        
-        
-        # 去除 Emoji (避免 Edge-TTS 讀出奇怪的描述)
-        clean_text = re.sub(r'[\U00010000-\U0010ffff]', '', clean_text) 
-        clean_text = re.sub(r'[\u2600-\u27bf]', '', clean_text)
+        clean_text = clean_script_for_tts(text)
         
-        # (3) 執行非同步生成
-        # 如果是在 Jupyter Notebook 中執行，需改用 nest_asyncio，但在 .py 腳本中這樣寫是正確的
-        asyncio.run(generate_voice_async(clean_text, filename))
+        # (3) 分段並行合成 (相同句子直接命中快取)
+        audio, stats = await tts.synthesize_script(clean_text, engine=engine)
         
-        # 檢查檔案是否真的生成成功
-        if os.path.exists(filename) and os.path.getsize(filename) > 0:
-            print(f"✅ 語音生成成功：{filename}")
-            return filename
+        if audio:
+            print(f"✅ 語音生成成功：{filename} ({len(audio) / 1024:,.0f} KB, "
+                  f"{stats['segments']} 段, 快取命中 {stats['cache_hits']}, {stats['ms']:,.0f} ms)")
+            return filename, audio
         else:
-            print("❌ 語音生成失敗：檔案未建立或為空")
+            print("❌ 語音生成失敗：沒有取得音訊")
             return None
 
     except Exception as e:
@@ -226,48 +243,44 @@ def create_audio_file(text, report_type):
 # ==========================================
 # 🛠️ Discord 發送功能
 # ==========================================
-def send_discord_webhook(embeds, file_path=None):
-    if not DISCORD_WEBHOOK_URL:
+def send_discord_webhook(embeds, audio=None, images=None, webhook_urls=None):
+    """
+    :param audio: (檔名, mp3_bytes)
+    :param images: [(檔名, png_bytes)]，embed 可用 attachment://檔名 引用
+    :param webhook_urls: 預設為 DISCORD_WEBHOOK_URLS
+    超過 Discord 上限時會自動拆成多則訊息；多個 webhook 同時發送。
+    """
+    webhook_urls = webhook_urls or DISCORD_WEBHOOK_URLS
+    if not webhook_urls:
         print("❌ 未設定 DISCORD_WEBHOOK_URL")
         return
 
-    payload = {
-        "username": "托蘭 AI 分析師",
-        "avatar_url": "https://cdn-icons-png.flaticon.com/512/6997/6997662.png",
-        "embeds": embeds
-    }
+    files = []
+    if audio:
+        name, data = audio
+        files.append((name, data, 'audio/mpeg'))
+    files += [(name, png, 'image/png') for name, png in images or []]
 
     try:
-        if file_path and os.path.exists(file_path):
-            with open(file_path, 'rb') as f:
-                files = {'file': (file_path, f, 'audio/mpeg')}
-                response = requests.post(
-                    DISCORD_WEBHOOK_URL, 
-                    data={'payload_json': json.dumps(payload)}, 
-                    files=files
-                )
+        with DiscordWebhookClient(
+            username="托蘭 AI 分析師",
+            avatar_url="https://cdn-icons-png.flaticon.com/512/6997/6997662.png"
+        ) as client:
+            results = client.send_many(webhook_urls, embeds, files)
+        ok = sum(results.values())
+        if ok == len(results):
+            print(f"✅ Discord 通知發送成功！({ok} 個 webhook)")
         else:
-            response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
-            
-        if response.status_code in [200, 204]:
-            print("✅ Discord 通知發送成功！")
-        else:
-            print(f"❌ Discord 回傳錯誤: {response.status_code} - {response.text}")
+            print(f"❌ Discord 部分發送失敗: {ok}/{len(results)} 個 webhook 成功")
 
     except Exception as e:
         print(f"❌ 發送失敗: {e}")
 
 # ==========================================
-# 🚀 主程式
+# 📊 市場分析與看板
 # ==========================================
-def main():
-    print("🚀 SYSTEM CHECK: 腳本開始執行...")
-    
-    # 1. 讀取數據
-    df, err = load_data(SHEET_URL)
-    if df.empty: return
-
-    # 2. 時間與時段判斷
+def get_report_time():
+    """回傳 (台灣時間, 早報/晚報)。"""
     utc_now = datetime.datetime.utcnow()
     tw_now = utc_now + datetime.timedelta(hours=8)
     
@@ -279,20 +292,20 @@ def main():
         report_type = "早報"
     else:
         report_type = "晚報"
+    return tw_now, report_type
 
-    print(f"🕒 當前台灣時間: {tw_now}, 執行報告類型: {report_type}")
-
-    yesterday = tw_now - pd.Timedelta(hours=25)
-    
+def analyze_items(df, yesterday):
+    """
+    逐一分析最近有成交的物品 (所有報告共用這一次分析，全量版本)。
+    :return: records: [{"item", "category", "price", "change_pct", "tags"}]
+    """
     if not pd.api.types.is_datetime64_any_dtype(df['時間']):
         df['時間'] = pd.to_datetime(df['時間'])
 
     recent_df = df[df['時間'] >= yesterday]
     active_items = recent_df['物品'].unique().tolist()
     
-    # --- 3. 數據收集與分析 ---
-    all_changes = [] 
-    highlights = []
+    records = []
     
     for item in active_items:
         item_df = filter_and_prepare_data(df, item)
@@ -305,28 +318,58 @@ def main():
             prev = item_df.iloc[0]['單價']
             
         change = ((latest - prev) / prev) * 100 if prev else 0
-        all_changes.append(change)
 
         patterns = detect_patterns(item_df)
         events = detect_events(item_df)
         tags = [p['type'] for p in patterns if any(k in p['type'] for k in ["頭肩", "雙重", "三角"])]
         tags += [e['type'] for e in events if "新高" in e['type'] or "新低" in e['type']]
 
-        if abs(change) >= 10 or tags:
-            highlights.append({
-                "item": item,
-                "price": latest,
-                "change_pct": change,
-                "tags": tags
-            })
+        records.append({
+            "item": item,
+            "category": item_df['分類'].iloc[-1] if '分類' in item_df else None,
+            "price": latest,
+            "change_pct": change,
+            "tags": tags
+        })
+    return records
 
+def analyze_items_incremental(df, yesterday, state):
+    """
+    增量版 analyze_items：只把狀態快照之後的新成交併入 state，結果與全量計算相同。
+    快照不足以計算這次的基準時間時，自動全量重建。
+    """
+    processed = state.update(df)
+    try:
+        records = state.records(yesterday)
+    except StateOutOfRange as e:
+        print(f"⚠️ {e}，報告狀態全量重建")
+        state.reset()
+        processed = state.update(df)
+        records = state.records(yesterday)
+    print(f"📦 增量分析：處理 {processed:,} 筆新成交 (資料共 {len(df):,} 筆，{len(records)} 個活躍物品)")
+    return records
+
+def summarize_report(records, definition):
+    """
+    依報告設定篩選物品，回傳 (highlights, market_stats)。
+    highlights 是複本，select_focus_items 標註 role 不會影響其他報告。
+    """
+    scoped = [r for r in records if matches_report(r, definition)]
+    changes = [r['change_pct'] for r in scoped]
+    highlights = [
+        {k: v for k, v in r.items() if k != "category"}
+        for r in scoped
+        if abs(r['change_pct']) >= definition['min_change_pct'] or r['tags']
+    ]
     market_stats = {
-        'up': sum(1 for x in all_changes if x > 0),
-        'down': sum(1 for x in all_changes if x < 0),
-        'avg_change': sum(all_changes) / len(all_changes) if all_changes else 0
+        'up': sum(1 for x in changes if x > 0),
+        'down': sum(1 for x in changes if x < 0),
+        'avg_change': sum(changes) / len(changes) if changes else 0
     }
+    return highlights, market_stats
 
-    # --- 4. 挑選焦點物品 ---
+def select_focus_items(highlights, max_items=6):
+    """挑選 AI 播報的焦點物品 (預設 6 個，會在 highlight 上標註 role)。"""
     ai_focus_items = []
     selected_names = set()
     def add_item(item_obj, role_name):
@@ -350,68 +393,254 @@ def main():
         add_item(pattern_items[0], "技術型態")
     highlights.sort(key=lambda x: abs(x['change_pct']), reverse=True)
     for h in highlights:
-        if len(ai_focus_items) >= 6: break
+        if len(ai_focus_items) >= max_items: break
         add_item(h, "重點關注")
+    return ai_focus_items[:max_items]
 
-    # 5. 生成 AI 報告 (傳入 report_type)
-    # 【關鍵修復】這裡原本少傳了 report_type
-    ai_script, color = generate_ai_script(market_stats, ai_focus_items, report_type)
+def build_data_board_embed(highlights, tw_now, limit=15):
+    """[Embed 2] 數據看板 (與 AI 文案無關)。"""
+    if not highlights:
+        return None
+    board = sorted(highlights, key=lambda x: abs(x['change_pct']), reverse=True)
+    fields = []
+    for h in board[:limit]: 
+        emoji = "🚀" if h['change_pct'] > 0 else ("🩸" if h['change_pct'] < 0 else "➖")
+        new_badge = "🆕 " if h.get('is_new') else ""
+        pretty_tags = []
+        for tag in h.get('tags', []):
+            if "新高" in tag: pretty_tags.append("🔥 創歷史新高")
+            elif "新低" in tag: pretty_tags.append("🧊 創歷史新低")
+            elif "頭肩頂" in tag: pretty_tags.append("👤 頭肩頂(看跌)")
+            elif "頭肩底" in tag: pretty_tags.append("🧘 頭肩底(看漲)")
+            elif "雙重頂" in tag: pretty_tags.append("Ⓜ️ M頭(看跌)")
+            elif "雙重底" in tag: pretty_tags.append("🇼 W底(看漲)")
+            elif "三角" in tag: pretty_tags.append("📐 三角收斂")
+            else: pretty_tags.append(tag) 
+            # 已在上次看板上的物品，新出現的標籤另外標示 (整個物品新上榜時名稱已有 🆕)
+            if not h.get('is_new') and tag in h.get('new_tags', ()): pretty_tags[-1] += " 🆕"
+        tag_display = f"\n" + "\n".join([f"└ {t}" for t in pretty_tags]) if pretty_tags else ""
+        fields.append({
+            "name": f"{new_badge}{h['item']}", 
+            "value": f"{emoji} `{h['change_pct']:+.1f}%` | ${h['price']:,.0f}{tag_display}",
+            "inline": True
+        })
+        
+    return {
+        "title": "📋 精選數據看板",
+        "description": "*(此區域數據不包含在語音播報中)*",
+        "color": 3447003,
+        "fields": fields,
+        "footer": {"text": f"統計時間: {tw_now.strftime('%Y-%m-%d %H:%M')} (GMT+8)"}
+    }
 
-    # 6. 生成音檔
-    audio_file_path = None
-    if ai_script and "AI 分析師連線忙碌中" not in ai_script:
-        # 【關鍵修復】這裡原本少傳了 report_type
-        audio_file_path = create_audio_file(ai_script, report_type)
+def render_focus_charts(render_pool, item_names, df):
+    """
+    6.5 渲染焦點物品走勢圖 (工作池並行輸出 PNG)。多份報告的焦點物品合併後只渲染一次。
+    :return: {物品: (檔名, png_bytes)}
+    """
+    names = {item: f"chart_{i + 1}.png" for i, item in enumerate(item_names)}
+    figures = {names[item]: create_report_chart(filter_and_prepare_data(df, item), item) for item in item_names}
+    try:
+        rendered = dict(render_pool.render_all(figures))
+    except Exception as e:
+        print(f"❌ 圖表渲染池失敗: {e}")
+        return {}
+    return {item: (name, rendered[name]) for item, name in names.items() if name in rendered}
 
-    # --- 7. 製作 Embeds ---
-    embeds = []
-    
-    # [Embed 1] AI 報告 (標題動態顯示早報/晚報)
-    embeds.append({
-        "title": f"🎙️ 托蘭市場{report_type} ({tw_now.strftime('%m/%d')})",
-        "description": ai_script,
-        "color": color,
-        "thumbnail": {"url": "https://cdn-icons-png.flaticon.com/512/6997/6997662.png"}
-    })
-
-    # [Embed 2] 數據看板
-    if highlights:
-        highlights.sort(key=lambda x: abs(x['change_pct']), reverse=True)
-        fields = []
-        for h in highlights[:15]: 
-            emoji = "🚀" if h['change_pct'] > 0 else ("🩸" if h['change_pct'] < 0 else "➖")
-            pretty_tags = []
-            for tag in h.get('tags', []):
-                if "新高" in tag: pretty_tags.append("🔥 創歷史新高")
-                elif "新低" in tag: pretty_tags.append("🧊 創歷史新低")
-                elif "頭肩頂" in tag: pretty_tags.append("👤 頭肩頂(看跌)")
-                elif "頭肩底" in tag: pretty_tags.append("🧘 頭肩底(看漲)")
-                elif "雙重頂" in tag: pretty_tags.append("Ⓜ️ M頭(看跌)")
-                elif "雙重底" in tag: pretty_tags.append("🇼 W底(看漲)")
-                elif "三角" in tag: pretty_tags.append("📐 三角收斂")
-                else: pretty_tags.append(tag) 
-            tag_display = f"\n" + "\n".join([f"└ {t}" for t in pretty_tags]) if pretty_tags else ""
-            fields.append({
-                "name": f"{h['item']}", 
-                "value": f"{emoji} `{h['change_pct']:+.1f}%` | ${h['price']:,.0f}{tag_display}",
-                "inline": True
-            })
-            
+def build_chart_embeds(charts_by_item, ai_focus_items):
+    """
+    [Embed 3+] 焦點物品走勢圖 (每張圖一個 embed，以 attachment:// 引用)。
+    :return: (embeds, images)
+    """
+    embeds, images = [], []
+    for h in ai_focus_items:
+        if h['item'] not in charts_by_item:
+            continue
+        name, png = charts_by_item[h['item']]
+        images.append((name, png))
         embeds.append({
-            "title": "📋 精選數據看板",
-            "description": "*(此區域數據不包含在語音播報中)*",
-            "color": 3447003,
-            "fields": fields,
-            "footer": {"text": f"統計時間: {tw_now.strftime('%Y-%m-%d %H:%M')} (GMT+8)"}
+            "title": f"📈 {h['item']} ({h.get('role', '重點關注')})",
+            "color": 5763719 if h['change_pct'] >= 0 else 15548997,
+            "image": {"url": f"attachment://{name}"}
         })
+    return embeds, images
+
+# ==========================================
+# ⏱️ 非同步管線工具
+# ==========================================
+async def timed_stage(name, awaitable, timings):
+    """等待一個階段並記錄耗時 (阻塞型 SDK 呼叫請先用 asyncio.to_thread 包起來)。"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+        print(f"⏱️ [{name}] {timings[name]:,.0f} ms")
+
+def print_stage_summary(timings, wall_ms):
+    print("⏱️ ===== 階段耗時 =====")
+    for name, ms in timings.items():
+        print(f"⏱️ {name:<8} {ms:>8,.0f} ms")
+    print(f"⏱️ 各階段加總 {sum(timings.values()):,.0f} ms / 實際總耗時 {wall_ms:,.0f} ms")
+
+def print_fanout_summary(shared_ms, report_ms, wall_ms):
+    """比較共用管線與「每份報告各跑一次」的估計總耗時。"""
+    separate_ms = sum(shared_ms + ms for ms in report_ms.values())
+    print(f"⏱️ ===== 分送 {len(report_ms)} 份報告 =====")
+    print(f"⏱️ 共用 (讀取 + 分析) {shared_ms:,.0f} ms")
+    for name, ms in report_ms.items():
+        print(f"⏱️ {name:<8} {ms:>8,.0f} ms")
+    saved = (1 - wall_ms / separate_ms) * 100 if separate_ms else 0
+    print(f"⏱️ 實際總耗時 {wall_ms:,.0f} ms / 分開執行 {len(report_ms)} 次估計 {separate_ms:,.0f} ms (省下 {saved:.0f}%)")
+
+# ==========================================
+# 🚀 主程式
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="托蘭市場日報")
+    parser.add_argument("--config", default=os.environ.get("REPORT_CONFIG"),
+                        help="分送設定檔 (JSON)，未指定時只產生一份全市場報告")
+    args = parser.parse_args(argv)
 
-    # 8. 發送
-    send_discord_webhook(embeds, file_path=audio_file_path)
+    print("🚀 SYSTEM CHECK: 腳本開始執行...")
+    definitions = load_report_definitions(args.config) if args.config else None
+    if definitions:
+        print(f"📑 分送模式：{len(definitions)} 份報告 ({', '.join(d['name'] for d in definitions)})")
+    
+    # 0. 先啟動圖表渲染池 (暖機時間與下載/分析重疊)
+    render_pool = ChartRenderPool().prewarm() if REPORT_CHARTS else None
+    try:
+        asyncio.run(run_report(render_pool, definitions))
+    finally:
+        if render_pool: render_pool.shutdown()
+        # .cache 每次都存回 Actions 快取：清掉不再使用的語音片段，避免無限成長
+        tts.TTSCache().prune()
+
+async def run_report(render_pool=None, definitions=None):
+    """
+    以相依關係組成的非同步管線 (多份報告共用讀取與分析)：
+        模型探索 ─────────────┐
+        讀取數據 → 市場分析 ─┼→ [每份報告] AI 文案 → 語音合成 ─┐
+                             ├→ 圖表渲染 (所有報告的焦點物品一次渲染) ┼→ 發送
+                             └→ [每份報告] 數據看板 ────────────┘
+    :param definitions: reporting.config 的報告設定；None 代表單一全市場報告，送往 DISCORD_WEBHOOK_URL
+    """
+    wall_start = time.perf_counter()
+    timings = {}
+    if definitions:
+        targets = [(d, resolve_webhooks(d)) for d in definitions]
+    else:
+        targets = [(make_report_definition(), DISCORD_WEBHOOK_URLS)]
+    fanout = len(targets) > 1
+
+    # 1. 時間與時段判斷
+    tw_now, report_type = get_report_time()
+    print(f"🕒 當前台灣時間: {tw_now}, 執行報告類型: {report_type}")
+    yesterday = tw_now - pd.Timedelta(hours=25)
 
-    # 9. 清理暫存
-    if audio_file_path and os.path.exists(audio_file_path):
-        os.remove(audio_file_path)
-        print("🧹 暫存音檔已清理")
+    # 2. 模型探索與下載數據同時進行
+    models_task = None
+    if GEMINI_API_KEY and any(d['features']['ai_script'] for d, _ in targets):
+        models_task = asyncio.create_task(timed_stage("模型探索", asyncio.to_thread(discover_models), timings))
+
+    df, err = await timed_stage("讀取數據", asyncio.to_thread(load_data, SHEET_URL), timings)
+    if df.empty:
+        if models_task: models_task.cancel()
+        return
+
+    # 3. 數據收集與分析 (只做一次；有狀態快照時只處理新成交)
+    state = ReportState.load() if REPORT_INCREMENTAL else None
+    if state is not None:
+        records = await timed_stage(
+            "市場分析", asyncio.to_thread(analyze_items_incremental, df, yesterday, state), timings
+        )
+    else:
+        records = await timed_stage("市場分析", asyncio.to_thread(analyze_items, df, yesterday), timings)
+    shared_ms = (time.perf_counter() - wall_start) * 1000
+
+    # 4. 各報告挑選焦點物品
+    plans = []
+    for definition, webhook_urls in targets:
+        highlights, market_stats = summarize_report(records, definition)
+        if state is not None:
+            state.diff_highlights(definition['name'], highlights)
+        ai_focus_items = select_focus_items(highlights, definition['max_focus'])
+        plans.append((definition, webhook_urls, highlights, market_stats, ai_focus_items))
+
+    # 6.5 圖表渲染：所有報告的焦點物品合併後一次渲染
+    chart_items = list(dict.fromkeys(
+        h['item'] for d, _, _, _, focus in plans if d['features']['charts'] for h in focus
+    ))
+    charts_task = None
+    if render_pool and chart_items:
+        charts_task = asyncio.create_task(timed_stage(
+            "圖表渲染", asyncio.to_thread(render_focus_charts, render_pool, chart_items, df), timings
+        ))
+
+    async def produce(definition, webhook_urls, highlights, market_stats, ai_focus_items):
+        start = time.perf_counter()
+        name, features = definition['name'], definition['features']
+        label = (lambda stage: f"{name}/{stage}") if fanout else (lambda stage: stage)
+        scope = "、".join(definition['categories'] + definition['items']) or None
+
+        # 5+6. AI 文案 → 語音 (同一條相依鏈)
+        ai_script, color, audio = None, 0, None
+        if features['ai_script']:
+            target_models = await models_task if models_task else None
+            # 【關鍵修復】這裡原本少傳了 report_type
+            ai_script, color = await timed_stage(
+                label("AI 文案"),
+                generate_ai_script_async(market_stats, ai_focus_items, report_type, target_models, scope=scope),
+                timings
+            )
+            if features['audio'] and ai_script and "AI 分析師連線忙碌中" not in ai_script:
+                audio = await timed_stage(
+                    label("語音合成"), create_audio_file_async(ai_script, report_type, report_name=name), timings
+                )
+
+        # 數據看板不依賴 AI 文案
+        board_embed = build_data_board_embed(highlights, tw_now, definition['board_size'])
+        charts_by_item = (await charts_task if charts_task else {}) if features['charts'] else {}
+
+        # --- 7. 製作 Embeds ---
+        embeds = []
+        
+        # [Embed 1] AI 報告 (標題動態顯示早報/晚報)
+        if ai_script:
+            embeds.append({
+                "title": f"🎙️ {name}{report_type} ({tw_now.strftime('%m/%d')})",
+                "description": ai_script,
+                "color": color,
+                "thumbnail": {"url": "https://cdn-icons-png.flaticon.com/512/6997/6997662.png"}
+            })
+        if board_embed:
+            embeds.append(board_embed)
+
+        # 超過 Discord 上限 (10 個 embed / 6000 字) 時由發送端自動拆成多則訊息
+        chart_embeds, chart_images = build_chart_embeds(charts_by_item, ai_focus_items)
+        embeds += chart_embeds
+
+        # 8. 發送
+        if not embeds:
+            print(f"⚠️ {name}: 範圍內沒有可報告的內容，略過")
+        elif not webhook_urls:
+            print(f"❌ {name}: 未設定 webhook ({', '.join(definition['webhook_envs'])})")
+        else:
+            await timed_stage(
+                label("發送"),
+                asyncio.to_thread(send_discord_webhook, embeds, audio=audio, images=chart_images, webhook_urls=webhook_urls),
+                timings
+            )
+        return name, (time.perf_counter() - start) * 1000
+
+    report_ms = dict(await asyncio.gather(*(produce(*plan) for plan in plans)))
+    if state is not None:
+        state.save()
+
+    wall_ms = (time.perf_counter() - wall_start) * 1000
+    print_stage_summary(timings, wall_ms)
+    if fanout:
+        print_fanout_summary(shared_ms, report_ms, wall_ms)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,107 @@
+# ingest/client.py
+"""
+收價服務的讀取端：記住游標，每次只抓新成交，清洗後接在已有的資料後面。
+
+用法:
+    feed = TickFeed("http://127.0.0.1:8765", prepare=prepare_frame)
+    new_rows = feed.poll()     # 游標之後的新成交 (已清洗)
+    feed.frame                 # 目前為止的全部成交 (依時間排序)
+"""
+import os
+import pickle
+import threading
+
+import pandas as pd
+import requests
+
+RAW_COLUMNS = ["時間", "物品", "屬性", "單價"]
+DEPTH_COLUMNS = ["數量", "掛單量"]   # 最低價那列的數量 / 前幾列掛單的總數量 (舊資料為空)
+
+class TickFeed:
+    """
+    :param prepare: 清洗函式 (utils.preprocess.prepare_frame)，只會對新資料呼叫
+    :param cache_path: 選用，把游標與資料存成 pickle，下次啟動接著讀
+    可以在多個執行緒共用 (Streamlit 的 st.cache_resource)：poll 整段互斥。
+    """
+    def __init__(self, base_url, prepare=None, cache_path=None, token=None, timeout=10, page_size=5000):
+        self.base_url = base_url.rstrip("/")
+        self.prepare = prepare or (lambda df: df)
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.page_size = page_size
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self.cursor = 0
+        self.frame = self.prepare(pd.DataFrame(columns=RAW_COLUMNS))
+        self._lock = threading.Lock()
+        if cache_path:
+            self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("base_url") == self.base_url:
+                self.cursor, self.frame = cached["cursor"], cached["frame"]
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, KeyError, EOFError) as e:
+            print(f"⚠️ 收價快取讀取失敗，將從頭讀取: {e}")
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"base_url": self.base_url, "cursor": self.cursor, "frame": self.frame}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️ 收價快取寫入失敗: {e}")
+
+    def fetch_raw(self, merged):
+        """
+        游標之後的原始成交 (分頁讀完)。
+        :param merged: 已併入 frame 的最後一個 id
+        :return: (成交, 新游標)
+        """
+        pages, cursor = [], merged
+        while True:
+            response = self.session.get(
+                f"{self.base_url}/ticks", params={"since": cursor, "limit": self.page_size}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            body = response.json()
+            if body["ticks"]:
+                pages.append(pd.DataFrame(body["ticks"], columns=["id"] + RAW_COLUMNS + DEPTH_COLUMNS))
+            cursor = body["cursor"]
+            if not body.get("more"):
+                break
+        if not pages:
+            return pd.DataFrame(columns=RAW_COLUMNS + DEPTH_COLUMNS), cursor
+        raw = pd.concat(pages, ignore_index=True)
+        # 只收已併入的 id 之後的成交：同一頁不會被接上兩次
+        raw = raw[raw["id"] > merged].drop_duplicates("id")
+        return raw.drop(columns="id").reset_index(drop=True), cursor
+
+    def poll(self):
+        """讀取新成交、清洗後併入 frame；回傳新成交。"""
+        # 讀取 → 併入 → 存快取 整段互斥：同時 rerun 的工作階段不會讀到同一個游標、重複接上同一頁
+        with self._lock:
+            raw, cursor = self.fetch_raw(self.cursor)
+            if raw.empty:
+                self.cursor = cursor
+                return raw
+            new = self.prepare(raw)
+            if self.frame.empty:
+                self.frame = new.reset_index(drop=True)
+            else:
+                # 新成交幾乎都比已有的晚，只有補送的舊資料才需要重新排序
+                needs_sort = not new.empty and new['時間'].min() < self.frame['時間'].max()
+                frame = pd.concat([self.frame, new], ignore_index=True)
+                self.frame = frame.sort_values("時間", kind="stable").reset_index(drop=True) if needs_sort else frame
+            # 併入之後才推進游標：清洗失敗時下次會重新讀取
+            self.cursor = cursor
+            if self.cache_path:
+                self._save_cache()
+            return new
@@ -0,0 +1,172 @@
+# ingest/server.py
+"""
+本機收價服務：取代 Google 表單 → 試算表 → 發佈 CSV 的繞路。
+
+    POST /ticks              JSON 陣列 [{"item", "attr", "price", "captured_at" (epoch 秒) 或 "time", "uid"?,
+                                         "quantity"?, "depth"?: [[單價, 數量], ...]}]
+                             → {"accepted", "duplicates", "cursor"}
+    GET  /ticks?since=N      游標 N 之後的成交 (最多 limit 筆，預設 5000；depth=1 附上每列掛單)
+                             → {"ticks": [[id, time, item, attr, price, quantity, depth_qty(, depth)]], "cursor", "more"}
+    GET  /health             → {"ok", "count", "cursor"}
+
+設定 INGEST_TOKEN 時，請求需帶 Authorization: Bearer <token>。
+
+用法:
+    python -m ingest.server serve [--host 127.0.0.1] [--port 8765] [--db data/ticks.sqlite3]
+    python -m ingest.server import-sheet <CSV 網址>     # 一次性匯入試算表的歷史資料 (可重複執行，不會重複寫入)
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from ingest.store import TickStore, DB_PATH, MAX_PAGE
+
+DEFAULT_PORT = 8765
+MAX_BODY = 4 * 1024 * 1024
+
+class IngestServer:
+    """
+    :param store: TickStore
+    :param port: 0 = 隨機可用埠 (測試用)
+    """
+    def __init__(self, store, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+        self.store = store
+        self.token = token
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _authorized(self):
+                if server.token and self.headers.get("Authorization") != f"Bearer {server.token}":
+                    self._reply(401, {"error": "unauthorized"})
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path == "/health":
+                    self._reply(200, {"ok": True, **server.store.stats()})
+                elif url.path == "/ticks":
+                    try:
+                        since, limit = int(query.get("since", 0)), int(query.get("limit", MAX_PAGE))
+                    except ValueError:
+                        self._reply(400, {"error": "since / limit 必須是整數"})
+                        return
+                    ticks, cursor = server.store.since(since, limit, depth=query.get("depth") == "1")
+                    self._reply(200, {"ticks": ticks, "cursor": cursor, "more": len(ticks) >= min(limit, MAX_PAGE)})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                if urlparse(self.path).path != "/ticks":
+                    self._reply(404, {"error": "not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                if length > MAX_BODY:
+                    self._reply(413, {"error": "body too large"})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(length) or b"[]")
+                    ticks = body.get("ticks", []) if isinstance(body, dict) else body
+                    if not isinstance(ticks, list):
+                        raise ValueError("需要 JSON 陣列")
+                    accepted, duplicates = server.store.append(ticks)
+                except ValueError as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, {"accepted": accepted, "duplicates": duplicates, **server.store.stats()})
+
+        return Handler
+
+def import_sheet(store, sheet_url):
+    """把發佈的試算表 CSV 匯入 (uid = sheet:列號，重複執行只會補上新列)。"""
+    import pandas as pd
+    from utils.preprocess import parse_google_time
+
+    raw = pd.read_csv(sheet_url).iloc[:, :4]
+    raw.columns = ["時間", "物品", "屬性", "單價"]
+    ticks = []
+    for i, row in enumerate(raw.itertuples(index=False)):
+        when = parse_google_time(row.時間)
+        price = pd.to_numeric(row.單價, errors="coerce")
+        if pd.isna(when) or pd.isna(price) or pd.isna(row.物品):
+            continue
+        attr = None if pd.isna(row.屬性) else str(row.屬性)
+        ticks.append({"time": when.isoformat(), "item": row.物品, "attr": attr, "price": float(price), "uid": f"sheet:{i}"})
+    return store.append(ticks)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="托蘭本機收價服務")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p_import = sub.add_parser("import-sheet")
+    p_import.add_argument("sheet_url")
+    args = parser.parse_args(argv)
+
+    store = TickStore(args.db)
+    if args.command == "import-sheet":
+        added, duplicates = import_sheet(store, args.sheet_url)
+        print(f"📥 匯入 {added} 筆 (已存在 {duplicates} 筆)，目前共 {store.stats()['count']} 筆")
+        return 0
+
+    server = IngestServer(store, args.host, args.port, token=os.environ.get("INGEST_TOKEN"))
+    print(f"🛰️ 收價服務啟動: {server.url} (資料庫 {args.db}，目前 {store.stats()['count']} 筆)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
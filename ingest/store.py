@@ -0,0 +1,109 @@
+# ingest/store.py
+"""
+本機成交紀錄庫 (SQLite)：抓價機送來的價格直接寫進這裡，儀表板與日報用「游標之後的新資料」增量讀取。
+
+ticks 表：
+    id    遞增序號 (游標)
+    time  成交時間，台灣時間、不含時區的 ISO 字串 (與 load_data 解析 Google 表單時間的結果相同)
+    item / attr / price
+    uid   送出端的唯一鍵 (重送時去重)，可為 NULL
+    quantity   最低價那列掛單的數量 (VWAP 的成交量)，舊資料為 NULL
+    depth      前幾列掛單 [[單價, 數量], ...] 的 JSON，depth_qty 為其數量總和 (流動性)
+"""
+import os
+import json
+import math
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+DB_PATH = os.environ.get("INGEST_DB", os.path.join("data", "ticks.sqlite3"))
+TAIPEI = timezone(timedelta(hours=8))
+MAX_PAGE = 5000
+
+def to_local_time(epoch):
+    """epoch 秒 → 台灣時間 ISO 字串 (秒為單位)。"""
+    return datetime.fromtimestamp(float(epoch), TAIPEI).replace(tzinfo=None).isoformat(timespec="seconds")
+
+class TickStore:
+    def __init__(self, path=DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ticks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT NOT NULL, item TEXT NOT NULL,"
+            " attr TEXT, price REAL NOT NULL, uid TEXT UNIQUE)"
+        )
+        # 舊資料庫補上掛單欄位
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(ticks)")}
+        for name, kind in (("quantity", "INTEGER"), ("depth", "TEXT"), ("depth_qty", "INTEGER")):
+            if name not in columns:
+                self.db.execute(f"ALTER TABLE ticks ADD COLUMN {name} {kind}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_ticks_item_time ON ticks (item, time)")
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def append(self, ticks):
+        """
+        寫入多筆成交 (同一個交易)。
+        :param ticks: [{"time" 或 "captured_at", "item", "attr", "price", "uid"?, "quantity"?, "depth"?}]
+        :return: (新增筆數, 重複筆數)
+        :raises ValueError: 缺少欄位或價格不是有限數字 (NaN / inf；整批不寫入)
+        """
+        rows = []
+        for i, t in enumerate(ticks):
+            try:
+                when = t.get("time") or to_local_time(t["captured_at"])
+                quantity = int(t["quantity"]) if t.get("quantity") is not None else None
+                depth = [[float(p), int(q)] for p, q in t["depth"]] if t.get("depth") else None
+                price = float(t["price"])
+                # JSON 可以送 NaN，SQLite 會存成 NULL → 違反 NOT NULL 被 INSERT OR IGNORE 悄悄當成重複
+                if not math.isfinite(price) or (depth and not all(math.isfinite(p) for p, _ in depth)):
+                    raise ValueError("價格不是有限數字")
+                rows.append((
+                    str(when), str(t["item"]).strip(), t.get("attr"), price, t.get("uid"), quantity,
+                    json.dumps(depth) if depth else None, sum(q for _, q in depth) if depth else None,
+                ))
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                raise ValueError(f"第 {i + 1} 筆格式錯誤: {e!r}") from None
+            if not rows[-1][1]:
+                raise ValueError(f"第 {i + 1} 筆缺少物品名稱")
+        with self._lock:
+            before = self.db.total_changes
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR IGNORE INTO ticks (time, item, attr, price, uid, quantity, depth, depth_qty)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self.db.execute("COMMIT")
+            added = self.db.total_changes - before
+        return added, len(rows) - added
+
+    def since(self, cursor=0, limit=MAX_PAGE, depth=False):
+        """
+        游標之後的成交，依 id 排序。
+        :param depth: 是否附上每一列掛單 (JSON 解開後的 list)
+        :return: ([[id, time, item, attr, price, quantity, depth_qty(, depth)]], 新游標)
+        """
+        limit = max(1, min(int(limit), MAX_PAGE))
+        columns = "id, time, item, attr, price, quantity, depth_qty" + (", depth" if depth else "")
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT {columns} FROM ticks WHERE id > ? ORDER BY id LIMIT ?", (int(cursor), limit)
+            ).fetchall()
+        ticks = [list(r) for r in rows]
+        if depth:
+            for t in ticks:
+                t[-1] = json.loads(t[-1]) if t[-1] else None
+        return ticks, (rows[-1][0] if rows else int(cursor))
+
+    def stats(self):
+        with self._lock:
+            count, last = self.db.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM ticks").fetchone()
+        return {"count": count, "cursor": last}
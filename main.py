@@ -7,8 +7,10 @@ from scipy.signal import argrelextrema
 from scipy.stats import linregress
 
 # 導入模組
-from utils.preprocess import load_data, filter_and_prepare_data
+from utils.preprocess import load_data, filter_and_prepare_data, get_data_version
+from utils.range_stats import RangeStatsIndex
 from utils.theme import TV_THEME
+from utils.timing import section_timer, show_section_timing, render_timing_panel, DEBUG_KEY
 from charts.base_chart import create_flagship_chart
 from analysis.trend import analyze_trend
 from analysis.support_resistance import find_support_resistance
@@ -19,13 +21,191 @@ from utils.regression import calculate_r_squared # 🔴 新增導入
 SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQtSvfsvYpDjQutAO9L4AV1Rq8XzZAQEAZcLZxl9JsSvxCo7X2JsaFTVdTAQwGNQRC2ySe5OPJaTzp9/pub?gid=915078159&single=true&output=csv"
 
 st.set_page_config(
-    page_title="📈 托蘭交易所旗艦版", 
-    layout="wide", 
+    page_title="📈 托蘭交易所旗艦版",
+    layout="wide",
     page_icon="💎"
 )
 
+# ==========================================
+# 🧠 快取層 (依資料版本 + 物品 + 範圍)
+# ==========================================
+# 🔴 每個物品建一次區間統計索引 (同一資料版本內重複使用，日期變更只做 O(1) 查詢)
+@st.cache_resource(max_entries=64)
+def get_range_index(data_version, item, _df):
+    return RangeStatsIndex.from_df(filter_and_prepare_data(_df, item))
+
+# 🔴 四個 AI 分析函式只在 (資料版本, 物品, 範圍) 改變時重算，切換指標不會觸發
+@st.cache_data(max_entries=64)
+def run_ai_analysis(data_version, item, start_date, end_date, _target_df):
+    r_squared_global, _ = calculate_r_squared(_target_df)
+
+    # 1️⃣ AI 趨勢分析
+    trend_report = analyze_trend(_target_df)
+    trend_report['R_squared'] = r_squared_global # 🔴 將計算結果賦值給 AI 報告
+
+    return {
+        'trend_analysis': trend_report,
+        'sr_analysis': find_support_resistance(_target_df),   # 2️⃣ AI S/R 偵測
+        'pattern_analysis': detect_patterns(_target_df),      # 3️⃣ AI 型態偵測
+        'event_analysis': detect_events(_target_df)           # 9️⃣ AI 事件偵測
+    }
+
+# ==========================================
+# 🧩 可獨立重跑的頁面區塊 (st.fragment)
+# 每個區塊只依賴傳入的參數；區塊內的元件變動只會重跑該區塊。
+# ==========================================
+
+# --- 6. AI 分析面板 (依賴: analysis_data) ---
+def render_ai_panel(analysis_data):
+    trend_report = analysis_data['trend_analysis']
+    sr_report = analysis_data['sr_analysis']
+    pattern_report = analysis_data['pattern_analysis']
+
+    st.subheader("🤖 AI 智能分析報告")
+
+    # 提取 R_squared，並進行安全格式化
+    r_squared_value = trend_report['R_squared']
+    r_squared_display = f"{r_squared_value:.2f}" if isinstance(r_squared_value, (float, int)) else 'N/A'
+
+    # 🔴 AI 摘要 Metric
+    col_a1, col_a2, col_a3, col_a4 = st.columns(4)
+
+    with col_a1:
+        st.metric(
+            label="趨勢方向",
+            value=trend_report['趨勢方向'],
+            delta=f"強度: {trend_report['多空強度']}/100"
+        )
+    with col_a2:
+        st.metric(
+            label="反轉風險",
+            value=trend_report['反轉風險提示'],
+            delta=f"信心值: {trend_report['AI統計信心值']}/100"
+        )
+    with col_a3:
+        st.metric(
+            label="短期預測價",
+            value=trend_report['未來短期預測價格']
+        )
+    with col_a4:
+        patterns = ", ".join([p['type'] for p in pattern_report]) if pattern_report else "無型態"
+        resistance = ', '.join([f'${r:,}' for r in sr_report['resistance']])
+        st.metric(
+            label="偵測型態 / R²",
+            value=patterns,
+            delta=f"R²: {r_squared_display}"
+        )
+
+    # 🔴 詳細 AI 參數與建議
+    with st.expander("🛠️ 詳細 AI 參數與建議", expanded=False):
+        st.markdown(f"""
+        - **當前趨勢方向**: **{trend_report['趨勢方向']}**
+        - **多空強度 (0-100)**: **{trend_report['多空強度']}**
+        - **AI 統計信心值 (0-100)**: **{trend_report['AI統計信心值']}**
+        - **回歸線 R² (趨勢可信度)**: **{r_squared_display}**
+        ---
+        - **主要阻力線 (R)**: `{resistance}`
+        - **主要支撐線 (S)**: `{', '.join([f'${s:,}' for s in sr_report['support']])}`
+        - **預測價格 (短期 7 點)**: **{trend_report['未來短期預測價格']}**
+        - **反轉風險提示**: **{trend_report['反轉風險提示']}**
+        - **偵測型態**: **{patterns}**
+        """)
+
+# --- 7. 圖表繪製 (8️⃣) (依賴: target_df, analysis_data；指標開關屬於此區塊) ---
+@st.fragment
+def render_chart_section(target_df, item_name, analysis_data):
+    st.subheader(f"📈 {item_name} 旗艦圖表")
+
+    # 指標與 AI 開關 (4️⃣, 5️⃣, 6️⃣, 7️⃣, 2️⃣, 3️⃣, 9️⃣)
+    # 🔴 放在片段內：切換指標只重建圖表 (片段無法寫入側邊欄，因此改用彈出式選單)
+    with st.popover("⚙️ 指標與 AI 設定"):
+        indicator_config = {
+            'AI_Overlay': st.checkbox("AI 覆蓋層 (S/R, 型態, 事件)", value=True),
+            'MA5': st.checkbox("MA5 (5日均線)", value=False),
+            'MA20': st.checkbox("MA20 (20日均線)", value=True),
+            'MA60': st.checkbox("MA60 (60日均線)", value=False),
+            'EMA': st.checkbox("EMA (指數均線)", value=False),
+            'BB': st.checkbox("布林通道 (Bollinger Bands)", value=True),
+            'VWAP': st.checkbox("VWAP (加權均價)", value=False),
+            'Regression': st.checkbox("線性趨勢回歸線", value=True),
+        }
+
+    with section_timer("📈 旗艦圖表"):
+        fig = create_flagship_chart(target_df, item_name, indicator_config, analysis_data)
+        st.plotly_chart(fig, use_container_width=True)
+    show_section_timing("📈 旗艦圖表")
+
+# --- 8. 區間選取分析器 (1️⃣0️⃣) (依賴: df_full 的資料版本, 物品, 可選日期範圍) ---
+@st.fragment
+def render_interval_analyzer(df_full, data_version, item_name, start_date, end_date):
+    st.markdown("---")
+    st.subheader("🎯 互動區間分析器")
+    st.info("拖曳上方的 Plotly 圖表中的 **Range Slider** 選擇範圍，查看該區間的統計數據。")
+
+    # 獲取 Range Slider 選擇的範圍
+    # 由於 Streamlit 的 st.plotly_chart 不直接支持 Range Slider 的事件回傳，
+    # 我們使用一個簡易的時間範圍選擇來模擬互動分析。
+
+    col_r1, col_r2 = st.columns(2)
+    with col_r1:
+        analysis_start = st.date_input("分析起始日期", value=start_date.date(), min_value=start_date.date(), max_value=end_date.date())
+    with col_r2:
+        analysis_end = st.date_input("分析結束日期", value=end_date.date(), min_value=analysis_start, max_value=end_date.date())
+
+    with section_timer("🎯 區間分析器"):
+        range_index = get_range_index(data_version, item_name, df_full)
+        range_stats = range_index.query(pd.to_datetime(analysis_start), pd.to_datetime(analysis_end) + pd.Timedelta(days=1))
+
+        if range_stats['count'] > 0:
+
+            # 計算區間統計 (直接由索引取得)
+            range_max = range_stats['max']
+            range_min = range_stats['min']
+            range_avg = range_stats['mean']
+            range_start_price = range_stats['first']
+            range_end_price = range_stats['last']
+            range_change = range_end_price - range_start_price
+            range_change_pct = (range_change / range_start_price) * 100
+
+            # 波動率 (標準差/平均價)
+            volatility = (range_stats['std'] / range_avg) * 100 if range_avg != 0 else 0
+
+            col_rs1, col_rs2, col_rs3, col_rs4, col_rs5 = st.columns(5)
+            with col_rs1: st.metric("區間最高價", f"${range_max:,.0f}")
+            with col_rs2: st.metric("區間最低價", f"${range_min:,.0f}")
+            with col_rs3: st.metric("區間平均價", f"${range_avg:,.0f}")
+            with col_rs4: st.metric("升跌幅", f"${range_change:,.0f}", delta=f"{range_change_pct:.2f}%")
+            with col_rs5: st.metric("波動率 (%)", f"{volatility:.2f}%")
+
+            # 近一年每週統計 (單次批次查詢)
+            with st.expander("📅 近一年每週統計", expanded=False):
+                week_starts = pd.date_range(end=end_date.normalize(), periods=52, freq='W-MON')
+                weekly = range_index.query_many(week_starts, week_starts + pd.Timedelta(days=7) - pd.Timedelta(1, unit='ns'))
+                weekly = weekly[weekly['count'] > 0]
+                weekly = pd.DataFrame({
+                    "週起始": weekly['start'].dt.date,
+                    "筆數": weekly['count'],
+                    "開盤": weekly['first'],
+                    "收盤": weekly['last'],
+                    "最高": weekly['max'],
+                    "最低": weekly['min'],
+                    "平均": weekly['mean'],
+                    "週漲跌%": (weekly['last'] / weekly['first'] - 1) * 100,
+                    "波動率%": weekly['std'] / weekly['mean'] * 100,
+                }).sort_values("週起始", ascending=False)
+                st.dataframe(weekly.round(2), hide_index=True, use_container_width=True)
+
+        else:
+            st.warning("所選範圍內無數據。")
+    show_section_timing("🎯 區間分析器")
+
+# ==========================================
+# 🚀 主頁面 (側邊欄選項變動才會整頁重跑)
+# ==========================================
+
 # --- 1. 資料讀取 ---
-df_full, err = load_data(SHEET_URL)
+with section_timer("📥 讀取資料"):
+    df_full, err = load_data(SHEET_URL)
 
 st.title("💎 Toram Online 市場價格追蹤 (TradingView + AI 旗艦版)")
 st.caption(f"數據更新時間: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (每 5 分鐘自動更新)")
@@ -38,6 +218,7 @@ if df_full.empty:
         st.info("📭 資料庫目前是空的。")
     st.stop()
 
+data_version = get_data_version(df_full)
 
 # --- 2. 側邊欄設定 (主控制台) ---
 st.sidebar.header("🔍 交易控制台")
@@ -55,7 +236,7 @@ selected_item = st.sidebar.selectbox("2️⃣ 選擇物品", items)
 # 1️⃣1️⃣ 日期範圍選擇 (快速切換模式)
 st.sidebar.subheader("📅 數據範圍選擇")
 date_mode = st.sidebar.radio(
-    "快速範圍", 
+    "快速範圍",
     ["全部", "90 日圖", "30 日圖", "7 日圖"],
     index=1,
     horizontal=True
@@ -71,29 +252,21 @@ elif date_mode == "30 日圖":
 elif date_mode == "7 日圖":
     start_date = end_date - pd.Timedelta(days=7)
 
-# --- 3. 指標與 AI 開關 (4️⃣, 5️⃣, 6️⃣, 7️⃣, 2️⃣, 3️⃣, 9️⃣) ---
-st.sidebar.subheader("⚙️ 指標與 AI 設定")
-indicator_config = {
-    'AI_Overlay': st.sidebar.checkbox("AI 覆蓋層 (S/R, 型態, 事件)", value=True),
-    'MA5': st.sidebar.checkbox("MA5 (5日均線)", value=False),
-    'MA20': st.sidebar.checkbox("MA20 (20日均線)", value=True),
-    'MA60': st.sidebar.checkbox("MA60 (60日均線)", value=False),
-    'EMA': st.sidebar.checkbox("EMA (指數均線)", value=False),
-    'BB': st.sidebar.checkbox("布林通道 (Bollinger Bands)", value=True),
-    'VWAP': st.sidebar.checkbox("VWAP (加權均價)", value=False),
-    'Regression': st.sidebar.checkbox("線性趨勢回歸線", value=True),
-}
+# 🐞 效能除錯
+st.sidebar.subheader("🐞 除錯")
+st.sidebar.checkbox("顯示各區塊耗時", value=False, key=DEBUG_KEY)
 
 
 if selected_item:
-    target_df = filter_and_prepare_data(df_full, selected_item, start_date, end_date)
-    
+    with section_timer("🔎 資料篩選"):
+        target_df = filter_and_prepare_data(df_full, selected_item, start_date, end_date)
+
     if not target_df.empty:
         # --- 4. 數據總覽 (Metric) ---
         col_m1, col_m2, col_m3, col_m4, col_m5 = st.columns(5)
         latest_price = target_df.iloc[-1]['單價']
         prev_price = target_df.iloc[-2]['單價'] if len(target_df) >= 2 else latest_price
-        
+
         with col_m1: st.metric(label=f"💰 最新價格", value=f"${latest_price:,.0f}", delta=f"{latest_price - prev_price:,.0f}")
         with col_m2: st.metric(label="⬆️ 最高價", value=f"${target_df['單價'].max():,.0f}")
         with col_m3: st.metric(label="⬇️ 最低價", value=f"${target_df['單價'].min():,.0f}")
@@ -101,128 +274,19 @@ if selected_item:
         with col_m5: st.metric(label="📊 數據筆數", value=f"{len(target_df):,}")
 
         # --- 5. AI 分析計算 (1️⃣, 2️⃣, 3️⃣) ---
-        # 🔴 在 AI 報告前先計算 R²
-        from utils.regression import calculate_r_squared 
-        r_squared_global, _ = calculate_r_squared(target_df)
-        
-        # 1️⃣ AI 趨勢分析
-        trend_report = analyze_trend(target_df)
-        trend_report['R_squared'] = r_squared_global # 🔴 將計算結果賦值給 AI 報告
-
-        # 2️⃣ AI S/R 偵測
-        sr_report = find_support_resistance(target_df)
-        
-        # 3️⃣ AI 型態偵測
-        pattern_report = detect_patterns(target_df)
-        
-        # 9️⃣ AI 事件偵測
-        event_report = detect_events(target_df)
-        
-        # 組合分析數據
-        analysis_data = {
-            'trend_analysis': trend_report,
-            'sr_analysis': sr_report,
-            'pattern_analysis': pattern_report,
-            'event_analysis': event_report
-        }
+        with section_timer("🤖 AI 分析"):
+            analysis_data = run_ai_analysis(data_version, selected_item, start_date, end_date, target_df)
+            render_ai_panel(analysis_data)
+        show_section_timing("🤖 AI 分析")
+
+        # --- 7. 圖表 / 8. 區間分析器：各自為獨立片段 ---
+        render_chart_section(target_df, selected_item, analysis_data)
+        render_interval_analyzer(df_full, data_version, selected_item, start_date, end_date)
 
-        st.subheader("🤖 AI 智能分析報告")
-        
-        # 提取 R_squared，並進行安全格式化
-        r_squared_value = trend_report['R_squared'] 
-        r_squared_display = f"{r_squared_value:.2f}" if isinstance(r_squared_value, (float, int)) else 'N/A'
-        
-        # --- 6. AI 分析面板顯示 (使用 st.metric 和 st.expander) ---
-        
-        # 🔴 AI 摘要 Metric
-        col_a1, col_a2, col_a3, col_a4 = st.columns(4)
-        
-        with col_a1: 
-            st.metric(
-                label="趨勢方向", 
-                value=trend_report['趨勢方向'], 
-                delta=f"強度: {trend_report['多空強度']}/100"
-            )
-        with col_a2: 
-            st.metric(
-                label="反轉風險", 
-                value=trend_report['反轉風險提示'], 
-                delta=f"信心值: {trend_report['AI統計信心值']}/100"
-            )
-        with col_a3: 
-            st.metric(
-                label="短期預測價", 
-                value=trend_report['未來短期預測價格']
-            )
-        with col_a4:
-            patterns = ", ".join([p['type'] for p in pattern_report]) if pattern_report else "無型態"
-            resistance = ', '.join([f'${r:,}' for r in sr_report['resistance']])
-            st.metric(
-                label="偵測型態 / R²", 
-                value=patterns, 
-                delta=f"R²: {r_squared_display}"
-            )
-
-        # 🔴 詳細 AI 參數與建議
-        with st.expander("🛠️ 詳細 AI 參數與建議", expanded=False):
-            st.markdown(f"""
-            - **當前趨勢方向**: **{trend_report['趨勢方向']}**
-            - **多空強度 (0-100)**: **{trend_report['多空強度']}**
-            - **AI 統計信心值 (0-100)**: **{trend_report['AI統計信心值']}**
-            - **回歸線 R² (趨勢可信度)**: **{r_squared_display}**
-            ---
-            - **主要阻力線 (R)**: `{resistance}`
-            - **主要支撐線 (S)**: `{', '.join([f'${s:,}' for s in sr_report['support']])}`
-            - **預測價格 (短期 7 點)**: **{trend_report['未來短期預測價格']}**
-            - **反轉風險提示**: **{trend_report['反轉風險提示']}**
-            - **偵測型態**: **{patterns}**
-            """)
-
-        # --- 7. 圖表繪製 (8️⃣) ---
-        st.subheader(f"📈 {selected_item} 旗艦圖表")
-        fig = create_flagship_chart(target_df, selected_item, indicator_config, analysis_data) 
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # --- 8. 區間選取分析器 (1️⃣0️⃣) ---
-        st.markdown("---")
-        st.subheader("🎯 互動區間分析器")
-        st.info("拖曳上方的 Plotly 圖表中的 **Range Slider** 選擇範圍，查看該區間的統計數據。")
-        
-        # 獲取 Range Slider 選擇的範圍
-        # 由於 Streamlit 的 st.plotly_chart 不直接支持 Range Slider 的事件回傳，
-        # 我們使用一個簡易的時間範圍選擇來模擬互動分析。
-        
-        col_r1, col_r2 = st.columns(2)
-        with col_r1:
-            analysis_start = st.date_input("分析起始日期", value=start_date.date(), min_value=start_date.date(), max_value=end_date.date())
-        with col_r2:
-            analysis_end = st.date_input("分析結束日期", value=end_date.date(), min_value=analysis_start, max_value=end_date.date())
-            
-        analysis_df = filter_and_prepare_data(df_full, selected_item, pd.to_datetime(analysis_start), pd.to_datetime(analysis_end) + pd.Timedelta(days=1))
-        
-        if not analysis_df.empty:
-            
-            # 計算區間統計
-            range_max = analysis_df['單價'].max()
-            range_min = analysis_df['單價'].min()
-            range_avg = analysis_df['單價'].mean()
-            range_start_price = analysis_df.iloc[0]['單價']
-            range_end_price = analysis_df.iloc[-1]['單價']
-            range_change = range_end_price - range_start_price
-            range_change_pct = (range_change / range_start_price) * 100
-            
-            # 波動率 (標準差/平均價)
-            volatility = (analysis_df['單價'].std() / range_avg) * 100 if range_avg != 0 else 0
-            
-            col_rs1, col_rs2, col_rs3, col_rs4, col_rs5 = st.columns(5)
-            with col_rs1: st.metric("區間最高價", f"${range_max:,.0f}")
-            with col_rs2: st.metric("區間最低價", f"${range_min:,.0f}")
-            with col_rs3: st.metric("區間平均價", f"${range_avg:,.0f}")
-            with col_rs4: st.metric("升跌幅", f"${range_change:,.0f}", delta=f"{range_change_pct:.2f}%")
-            with col_rs5: st.metric("波動率 (%)", f"{volatility:.2f}%")
-            
-        else:
-            st.warning("所選範圍內無數據。")
-            
     else:
         st.info("此物品在所選時間範圍內沒有數據。")
+
+# 🐞 除錯面板 (整頁重跑時刷新；片段單獨重跑的耗時會顯示在片段底部)
+if st.session_state.get(DEBUG_KEY):
+    with st.sidebar.expander("⏱️ 區塊耗時", expanded=True):
+        render_timing_panel(st)
@@ -0,0 +1,68 @@
+import streamlit as st
+import datetime
+
+from utils.preprocess import load_data, get_data_version
+from analysis.market import compute_market_overview
+from charts.market_chart import create_market_treemap
+
+# 🔴 你的 Google Sheet CSV 連結
+SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQtSvfsvYpDjQutAO9L4AV1Rq8XzZAQEAZcLZxl9JsSvxCo7X2JsaFTVdTAQwGNQRC2ySe5OPJaTzp9/pub?gid=915078159&single=true&output=csv"
+
+st.set_page_config(
+    page_title="🌐 托蘭市場總覽",
+    layout="wide",
+    page_icon="💎"
+)
+
+# 🔴 以資料版本為快取鍵：同一版本資料只聚合一次 (_df 不參與雜湊)
+@st.cache_data(max_entries=4)
+def get_market_overview(data_version, _df):
+    return compute_market_overview(_df)
+
+# --- 1. 資料讀取 ---
+df_full, err = load_data(SHEET_URL)
+
+st.title("🌐 市場總覽")
+st.caption(f"數據更新時間: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (每 5 分鐘自動更新)")
+
+if df_full.empty:
+    if err:
+        st.error(f"❌ 資料讀取錯誤：{err}")
+    else:
+        st.info("📭 資料庫目前是空的。")
+    st.stop()
+
+overview = get_market_overview(get_data_version(df_full), df_full)
+
+# --- 2. 篩選 ---
+st.sidebar.header("🔍 總覽篩選")
+all_cats = overview['分類'].unique().tolist()
+selected_cats = st.sidebar.multiselect("種類", all_cats, default=all_cats)
+color_by = st.sidebar.radio("熱力圖上色依據", ["24h漲跌%", "7d漲跌%"], horizontal=True)
+view = overview[overview['分類'].isin(selected_cats)]
+
+# --- 3. 市場摘要 ---
+col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+with col_m1: st.metric("📦 追蹤物品數", f"{len(view):,}")
+with col_m2: st.metric("🚀 24h 上漲", f"{int((view['24h漲跌%'] > 0).sum()):,}")
+with col_m3: st.metric("🩸 24h 下跌", f"{int((view['24h漲跌%'] < 0).sum()):,}")
+with col_m4: st.metric("⚖️ 24h 平均漲跌", f"{view['24h漲跌%'].mean() if len(view) else 0:+.2f}%")
+
+# --- 4. 分類熱力圖 ---
+st.subheader("🗺️ 分類熱力圖")
+st.plotly_chart(create_market_treemap(view, change_col=color_by), use_container_width=True)
+
+# --- 5. 全市場排行表 (點擊欄位標題即可排序) ---
+st.subheader("📋 全市場排行")
+st.dataframe(
+    view.drop(columns=['最後時間']).sort_values('24h漲跌%', ascending=False),
+    hide_index=True,
+    use_container_width=True,
+    column_config={
+        "最新價格": st.column_config.NumberColumn(format="$%,.0f"),
+        "24h漲跌%": st.column_config.NumberColumn(format="%+.2f%%"),
+        "7d漲跌%": st.column_config.NumberColumn(format="%+.2f%%"),
+        "波動率%": st.column_config.NumberColumn(format="%.2f%%"),
+        "距上次更新(小時)": st.column_config.NumberColumn(format="%.1f"),
+    }
+)
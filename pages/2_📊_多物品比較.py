@@ -0,0 +1,97 @@
+import streamlit as st
+import pandas as pd
+
+from utils.preprocess import load_data, get_data_version
+from utils.resample import choose_grid_freq, make_time_grid, resample_to_grid, rebase_to_100
+from charts.compare_chart import create_comparison_chart
+
+# 🔴 你的 Google Sheet CSV 連結
+SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQtSvfsvYpDjQutAO9L4AV1Rq8XzZAQEAZcLZxl9JsSvxCo7X2JsaFTVdTAQwGNQRC2ySe5OPJaTzp9/pub?gid=915078159&single=true&output=csv"
+
+st.set_page_config(
+    page_title="📊 多物品比較",
+    layout="wide",
+    page_icon="💎"
+)
+
+# --- 快取層 ---
+# 🔴 每個物品欄位獨立快取：增減物品時只需計算該欄
+@st.cache_data(max_entries=512)
+def get_item_column(data_version, item, start, end, freq, _df):
+    item_df = _df[_df['物品'] == item]
+    grid = make_time_grid(start, end, freq)
+    return pd.Series(resample_to_grid(item_df['時間'].to_numpy(), item_df['單價'].to_numpy(), grid), index=grid, name=item)
+
+# 🔴 以 (物品組合, 範圍) 快取整個對齊後的矩陣
+@st.cache_data(max_entries=32)
+def get_comparison_matrix(data_version, items, start, end, freq, _df):
+    if not items:
+        # 只選分類指數時：回傳只有時間格點的空矩陣，後面再接上指數欄
+        return pd.DataFrame(index=make_time_grid(start, end, freq))
+    cols = [get_item_column(data_version, item, start, end, freq, _df) for item in items]
+    return rebase_to_100(pd.concat(cols, axis=1))
+
+@st.cache_data(max_entries=32)
+def get_category_index(data_version, category, start, end, freq, _df):
+    """分類等權重指數：該分類所有物品 (各自換算 100 基準後) 的平均。"""
+    members = tuple(sorted(_df.loc[_df['分類'] == category, '物品'].unique()))
+    rebased = get_comparison_matrix(data_version, members, start, end, freq, _df)
+    return rebased.mean(axis=1, skipna=True).rename(f"📦 {category} 指數")
+
+# --- 1. 資料讀取 ---
+df_full, err = load_data(SHEET_URL)
+
+st.title("📊 多物品正規化比較")
+
+if df_full.empty:
+    if err:
+        st.error(f"❌ 資料讀取錯誤：{err}")
+    else:
+        st.info("📭 資料庫目前是空的。")
+    st.stop()
+
+data_version = get_data_version(df_full)
+
+# --- 2. 側邊欄 ---
+st.sidebar.header("🔍 比較設定")
+all_items = sorted(df_full['物品'].unique().tolist())
+selected_items = st.sidebar.multiselect("選擇物品", all_items, default=all_items[:2])
+
+all_cats = df_full['分類'].unique().tolist()
+compare_cats = st.sidebar.multiselect("加入分類指數", all_cats)
+
+date_mode = st.sidebar.radio("快速範圍", ["全部", "90 日圖", "30 日圖", "7 日圖"], index=2, horizontal=True)
+end_date = df_full['時間'].max()
+start_date = df_full['時間'].min()
+if date_mode == "90 日圖":
+    start_date = end_date - pd.Timedelta(days=90)
+elif date_mode == "30 日圖":
+    start_date = end_date - pd.Timedelta(days=30)
+elif date_mode == "7 日圖":
+    start_date = end_date - pd.Timedelta(days=7)
+
+freq = choose_grid_freq(start_date, end_date)
+
+if not selected_items and not compare_cats:
+    st.info("請在左側選擇至少一個物品或分類。")
+    st.stop()
+
+# --- 3. 計算並繪圖 ---
+matrix = get_comparison_matrix(data_version, tuple(sorted(selected_items)), start_date, end_date, freq, df_full)
+index_cols = [get_category_index(data_version, cat, start_date, end_date, freq, df_full) for cat in compare_cats]
+if index_cols:
+    matrix = pd.concat([matrix] + index_cols, axis=1)
+
+st.caption(f"時間格點: 每 {freq}，共 {len(matrix):,} 點；起點 = 100")
+fig = create_comparison_chart(matrix, highlight_cols=[c.name for c in index_cols])
+st.plotly_chart(fig, use_container_width=True)
+
+# --- 4. 區間表現摘要 ---
+last_valid = matrix.ffill().iloc[-1]
+summary = pd.DataFrame({
+    "期末指數": last_valid,
+    "區間漲跌%": last_valid - 100,
+    "區間最高": matrix.max(),
+    "區間最低": matrix.min(),
+}).sort_values("區間漲跌%", ascending=False)
+st.dataframe(summary.round(2), use_container_width=True)
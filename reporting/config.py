@@ -0,0 +1,85 @@
+# reporting/config.py
+"""
+日報分送設定：一次讀取與分析市場，依設定檔產生多份報告並送往不同的 webhook。
+
+設定檔格式 (JSON，可參考 reports.example.json)：
+{
+  "reports": [
+    {
+      "name": "托蘭市場",                  # 標題前綴，例如「托蘭市場早報」
+      "webhook_envs": ["DISCORD_WEBHOOK_URL"],  # 存放 webhook 網址的環境變數 (網址不寫進設定檔)
+      "categories": ["⚔️ 武器王石"],       # 只納入這些分類 (空 = 全部)
+      "items": [],                         # 只納入這些物品 (空 = 全部)
+      "min_change_pct": 10,                # 漲跌幅達到多少才列入看板
+      "max_focus": 6,                      # AI 播報的焦點物品數
+      "board_size": 15,                    # 數據看板最多幾個物品
+      "features": {"ai_script": true, "audio": true, "charts": true}
+    }
+  ]
+}
+"""
+import os
+import copy
+import json
+
+DEFAULT_FEATURES = {"ai_script": True, "audio": True, "charts": True}
+
+DEFAULT_REPORT = {
+    "name": "托蘭市場",
+    "webhook_envs": ["DISCORD_WEBHOOK_URL"],
+    "categories": [],
+    "items": [],
+    "min_change_pct": 10,
+    "max_focus": 6,
+    "board_size": 15,
+    "features": DEFAULT_FEATURES,
+}
+
+def make_report_definition(**overrides):
+    """以預設值補齊一份報告設定。"""
+    definition = copy.deepcopy(DEFAULT_REPORT)
+    features = {**DEFAULT_FEATURES, **(overrides.pop("features", None) or {})}
+    definition.update(overrides)
+    definition["features"] = features
+    return definition
+
+def load_report_definitions(path):
+    """
+    讀取設定檔。
+    :raises ValueError: 格式錯誤或沒有任何報告
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    reports = config.get("reports") if isinstance(config, dict) else config
+    if not reports:
+        raise ValueError(f"{path} 沒有任何報告設定")
+
+    definitions, names = [], set()
+    for i, raw in enumerate(reports):
+        if not isinstance(raw, dict):
+            raise ValueError(f"第 {i + 1} 份報告設定不是物件")
+        unknown = set(raw) - set(DEFAULT_REPORT)
+        if unknown:
+            raise ValueError(f"第 {i + 1} 份報告有未知欄位: {sorted(unknown)}")
+        definition = make_report_definition(**raw)
+        if definition["name"] in names:
+            raise ValueError(f"報告名稱重複: {definition['name']}")
+        names.add(definition["name"])
+        definitions.append(definition)
+    return definitions
+
+def resolve_webhooks(definition, environ=None):
+    """從環境變數取出 webhook 網址 (每個變數可用逗號分隔多個)。"""
+    environ = os.environ if environ is None else environ
+    urls = []
+    for env_name in definition["webhook_envs"]:
+        urls += [u.strip() for u in environ.get(env_name, "").split(",") if u.strip()]
+    return list(dict.fromkeys(urls))
+
+def matches_report(record, definition):
+    """物品是否在此報告的範圍內。"""
+    if definition["categories"] and record.get("category") not in definition["categories"]:
+        return False
+    if definition["items"] and record["item"] not in definition["items"]:
+        return False
+    return True
@@ -0,0 +1,282 @@
+# reporting/discord.py
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ==========================================
+# 📏 Discord 限制 (https://discord.com/developers/docs/resources/message#embed-object-embed-limits)
+# ==========================================
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_FILES_PER_MESSAGE = 10
+MAX_TOTAL_EMBED_CHARS = 6000
+MAX_FIELDS = 25
+MAX_TITLE = 256
+MAX_DESCRIPTION = 4096
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+MAX_FOOTER = 2048
+MAX_AUTHOR_NAME = 256
+
+ATTACHMENT_REF = re.compile(r'attachment://([^\s"\')]+)')
+
+# ==========================================
+# ✂️ Embed 正規化與切割
+# ==========================================
+def _truncate(text, limit):
+    text = str(text or "")
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def _split_text(text, limit):
+    """在換行處把長文字切成不超過 limit 的片段 (單行過長則硬切)。"""
+    chunks, current = [], ""
+    for line in str(text).splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks or [""]
+
+def embed_size(embed):
+    """Discord 計入 6000 字上限的字數。"""
+    size = len(embed.get("title", "")) + len(embed.get("description", ""))
+    size += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for field in embed.get("fields", []):
+        size += len(field.get("name", "")) + len(field.get("value", ""))
+    return size
+
+def normalize_embed(embed):
+    """
+    把單一 embed 調整到符合限制：
+    - 過長的 description 在換行處拆成多個 embed
+    - 超過 25 個 fields 拆成多個 embed
+    - 標題 / 欄位 / 頁尾過長則截斷
+    :return: [embed, ...] (續篇的標題加上「(續)」，圖片與頁尾只留在最後一個)
+    """
+    embed = dict(embed)
+    fields = [
+        {**f, "name": _truncate(f.get("name"), MAX_FIELD_NAME) or "​",
+              "value": _truncate(f.get("value"), MAX_FIELD_VALUE) or "​"}
+        for f in embed.pop("fields", [])
+    ]
+    descriptions = _split_text(embed.pop("description"), MAX_DESCRIPTION) if embed.get("description") else []
+    footer = embed.pop("footer", None)
+    if footer:
+        footer = {**footer, "text": _truncate(footer.get("text"), MAX_FOOTER)}
+    image = embed.pop("image", None)
+    if "title" in embed:
+        embed["title"] = _truncate(embed["title"], MAX_TITLE)
+    if "author" in embed:
+        embed["author"] = {**embed["author"], "name": _truncate(embed["author"].get("name"), MAX_AUTHOR_NAME)}
+
+    # 每一片 (含標題與頁尾) 都要能單獨放進一則訊息的 6000 字上限
+    budget = MAX_TOTAL_EMBED_CHARS - MAX_TITLE - len(footer["text"] if footer else "")
+    parts = [{"description": desc} for desc in descriptions]
+    for field in fields:
+        size = len(field["name"]) + len(field["value"])
+        last = parts[-1] if parts else None
+        if last is None or len(last.get("fields", [])) >= MAX_FIELDS or embed_size(last) + size > budget:
+            last = {}
+            parts.append(last)
+        last.setdefault("fields", []).append(field)
+    if not parts:
+        parts.append({})
+
+    result = []
+    for i, part in enumerate(parts):
+        piece = {**embed, **part}
+        if i > 0:
+            piece.pop("thumbnail", None)
+            piece.pop("author", None)
+            if "title" in embed:
+                piece["title"] = _truncate(f"{embed['title']} (續)", MAX_TITLE)
+        result.append(piece)
+    if footer:
+        result[-1]["footer"] = footer
+    if image:
+        result[-1]["image"] = image
+    return result
+
+def _referenced_files(embed):
+    return set(ATTACHMENT_REF.findall(json.dumps(embed, ensure_ascii=False)))
+
+def split_messages(embeds, files=None):
+    """
+    把 embeds 與附件切成多則訊息，每則都符合 Discord 上限。
+    - embed 以 attachment:// 引用的圖片會跟著同一則訊息
+    - 沒有被引用的附件 (例如語音檔) 放在第一則訊息
+    :param files: [(檔名, bytes, content_type)]
+    :return: [(embeds, files)]
+    """
+    files = list(files or [])
+    by_name = {f[0]: f for f in files}
+    referenced = set()
+    for embed in embeds:
+        referenced |= _referenced_files(embed)
+    loose_files = [f for f in files if f[0] not in referenced]
+
+    messages = []
+    cur_embeds, cur_files, cur_size = [], list(loose_files), 0
+    for embed in (piece for e in embeds for piece in normalize_embed(e)):
+        size = embed_size(embed)
+        attach = [by_name[n] for n in sorted(_referenced_files(embed)) if n in by_name and by_name[n] not in cur_files]
+        if cur_embeds and (
+            len(cur_embeds) >= MAX_EMBEDS_PER_MESSAGE
+            or cur_size + size > MAX_TOTAL_EMBED_CHARS
+            or len(cur_files) + len(attach) > MAX_FILES_PER_MESSAGE
+        ):
+            messages.append((cur_embeds, cur_files))
+            cur_embeds, cur_files, cur_size = [], [], 0
+            attach = [by_name[n] for n in sorted(_referenced_files(embed)) if n in by_name]
+        cur_embeds.append(embed)
+        cur_files += attach
+        cur_size += size
+    if cur_embeds or cur_files:
+        # 附件超過上限 (只可能發生在未被引用的附件) 時另外分批
+        while len(cur_files) > MAX_FILES_PER_MESSAGE:
+            messages.append(([], cur_files[:MAX_FILES_PER_MESSAGE]))
+            cur_files = cur_files[MAX_FILES_PER_MESSAGE:]
+        messages.append((cur_embeds, cur_files))
+    return messages
+
+# ==========================================
+# 📮 Webhook 用戶端
+# ==========================================
+class DiscordWebhookClient:
+    """
+    共用連線池的 Discord Webhook 發送器：
+    - 自動切割 embed / 附件，依序送出
+    - 依 X-RateLimit-Remaining / X-RateLimit-Reset-After 預先等待，遇到 429 依 retry_after 重試
+    - 5xx / 連線錯誤以指數退避重試
+    - send_many 可同時發送到多個 webhook (每個 webhook 內仍保持順序)
+    """
+    def __init__(self, username=None, avatar_url=None, max_retries=5, pool_size=8, timeout=30):
+        self.username = username
+        self.avatar_url = avatar_url
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._buckets = {}  # webhook -> 可再次發送的時間 (monotonic)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 速率限制 ---
+    def _wait_for_bucket(self, url):
+        with self._lock:
+            ready_at = self._buckets.get(url, 0)
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            print(f"⏳ Discord 速率限制，等待 {delay:.2f}s")
+            time.sleep(delay)
+
+    def _update_bucket(self, url, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_after = response.headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None:
+            try:
+                if int(remaining) <= 0:
+                    with self._lock:
+                        self._buckets[url] = time.monotonic() + float(reset_after)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.json().get("retry_after"))
+        except (ValueError, TypeError, AttributeError):
+            pass
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return 1.0
+
+    # --- 發送 ---
+    def _payload(self, embeds):
+        payload = {"embeds": embeds}
+        if self.username:
+            payload["username"] = self.username
+        if self.avatar_url:
+            payload["avatar_url"] = self.avatar_url
+        return payload
+
+    def _post(self, url, embeds, files):
+        payload = self._payload(embeds)
+        for attempt in range(1, self.max_retries + 1):
+            self._wait_for_bucket(url)
+            try:
+                if files:
+                    multipart = {f"files[{i}]": (name, data, ctype) for i, (name, data, ctype) in enumerate(files)}
+                    response = self.session.post(
+                        url, data={"payload_json": json.dumps(payload)}, files=multipart, timeout=self.timeout
+                    )
+                else:
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"⚠️ Discord 連線錯誤 ({attempt}/{self.max_retries}): {e}")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            self._update_bucket(url, response)
+            if response.status_code in (200, 204):
+                return True
+            if response.status_code == 429:
+                wait = self._retry_after(response)
+                print(f"⏳ Discord 429，{wait:.2f}s 後重試 ({attempt}/{self.max_retries})")
+                time.sleep(wait)
+                continue
+            if response.status_code >= 500:
+                print(f"⚠️ Discord {response.status_code}，重試 ({attempt}/{self.max_retries})")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            print(f"❌ Discord 回傳錯誤: {response.status_code} - {response.text}")
+            return False
+        print("❌ Discord 重試次數用盡")
+        return False
+
+    def send(self, url, embeds, files=None):
+        """
+        送出到單一 webhook。
+        :param files: [(檔名, bytes, content_type)]
+        :return: 是否所有訊息都送出成功
+        """
+        messages = split_messages(embeds, files)
+        ok = True
+        for i, (msg_embeds, msg_files) in enumerate(messages, start=1):
+            sent = self._post(url, msg_embeds, msg_files)
+            ok = ok and sent
+            if len(messages) > 1:
+                print(f"📮 第 {i}/{len(messages)} 則訊息{'已送出' if sent else '失敗'} ({len(msg_embeds)} embeds, {len(msg_files)} 附件)")
+        return ok
+
+    def send_many(self, urls, embeds, files=None):
+        """同時發送到多個 webhook，回傳 {url: 是否成功}。"""
+        urls = list(urls)
+        if len(urls) <= 1:
+            return {url: self.send(url, embeds, files) for url in urls}
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            futures = {url: executor.submit(self.send, url, embeds, files) for url in urls}
+            return {url: future.result() for url, future in futures.items()}
@@ -0,0 +1,288 @@
+# reporting/fakes.py
+"""
+日報外部服務的本地替身 (不需網路、不需金鑰)，用來測試與量測管線：
+    python -m reporting.fakes
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+import email.policy
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==========================================
+# 🧠 假 LLM 用戶端 (介面同 reporting.llm.GeminiClient)
+# ==========================================
+class FakeLLMClient:
+    """
+    :param models: list_models 回傳的模型名稱
+    :param latency: 每次呼叫延遲秒數 (min, max)，或 {模型: (min, max)}
+    :param error_rate: 一般錯誤機率
+    :param rate_limit_rate: 429 錯誤機率
+    :param list_latency: list_models 延遲秒數
+    """
+    def __init__(self, models=None, latency=(0.5, 2.0), error_rate=0.0, rate_limit_rate=0.0,
+                 list_latency=0.5, seed=None):
+        self.models = models or ["models/gemini-2.0-flash-exp", "models/gemini-1.5-flash", "models/gemini-1.5-flash-001", "models/gemini-1.5-pro"]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.list_latency = list_latency
+        self.rng = random.Random(seed)
+        self.list_calls = 0
+        self.calls = []       # 依序記錄被呼叫的模型
+        self.cancelled = []   # 被取消的模型
+
+    def list_models(self):
+        self.list_calls += 1
+        time.sleep(self.list_latency)
+        return list(self.models)
+
+    def _latency_for(self, model_name):
+        lat = self.latency.get(model_name, (0.5, 2.0)) if isinstance(self.latency, dict) else self.latency
+        return self.rng.uniform(*lat)
+
+    async def generate(self, model_name, prompt):
+        self.calls.append(model_name)
+        try:
+            await asyncio.sleep(self._latency_for(model_name))
+        except asyncio.CancelledError:
+            self.cancelled.append(model_name)
+            raise
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            raise RuntimeError("429 Resource has been exhausted (fake)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError("500 Internal error (fake)")
+        return f"[{model_name}] 早安！這是假的市場分析文案，價格 **$10,000** 漲幅 **+5.0%**。"
+
+# ==========================================
+# 🎙️ 假 TTS 引擎 (介面同 reporting.tts.EdgeTTSEngine)
+# ==========================================
+class FakeTTSEngine:
+    """
+    :param seconds_per_char: 每個字的合成時間 (模擬語音服務延遲與文字長度成正比)
+    :param base_latency: 每次連線的固定延遲
+    :param error_rate: 失敗機率
+    """
+    def __init__(self, seconds_per_char=0.01, base_latency=0.2, error_rate=0.0, seed=None):
+        self.seconds_per_char = seconds_per_char
+        self.base_latency = base_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = []
+
+    async def synthesize(self, text, voice="fake", rate="+0%"):
+        self.calls.append(text)
+        await asyncio.sleep(self.base_latency + self.seconds_per_char * len(text))
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError("503 TTS service unavailable (fake)")
+        # 以文字內容產生可重現的假音訊位元組
+        return b"FAKEMP3|" + text.encode("utf-8") + b"|"
+
+# ==========================================
+# 📮 假 Discord Webhook 伺服器 (套用 Discord 的上限與速率限制)
+# ==========================================
+class StubDiscordServer:
+    """
+    本機 HTTP 伺服器，路徑任意 (例如 /webhooks/1/abc)，每條路徑各自一個速率限制桶。
+    違反上限回 400，超過速率回 429 (含 retry_after 與 X-RateLimit-* 標頭)。
+
+    用法:
+        with StubDiscordServer(rate_limit=5, window=1.0) as server:
+            client.send(server.url("/webhooks/1/abc"), embeds)
+            server.messages  # [(路徑, payload, [檔名])]
+    """
+    def __init__(self, rate_limit=5, window=2.0, error_rate=0.0, seed=None):
+        self.rate_limit = rate_limit
+        self.window = window
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.messages = []
+        self.rejected = []   # (路徑, 狀態碼, 原因)
+        self._buckets = {}   # 路徑 -> (視窗開始時間, 已用次數)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = None
+
+    def url(self, path="/webhooks/1/token"):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _take_token(self, path):
+        """固定視窗計數；回傳 (是否允許, 剩餘次數, 重置秒數)。"""
+        with self._lock:
+            now = time.monotonic()
+            start, used = self._buckets.get(path, (now, 0))
+            if now - start >= self.window:
+                start, used = now, 0
+            reset_after = self.window - (now - start)
+            if used >= self.rate_limit:
+                return False, 0, reset_after
+            used += 1
+            self._buckets[path] = (start, used)
+            return True, self.rate_limit - used, reset_after
+
+    @staticmethod
+    def validate(payload, file_names):
+        """回傳違反的規則說明，全部符合則回傳 None。"""
+        embeds = payload.get("embeds", [])
+        if not embeds and not payload.get("content") and not file_names:
+            return "empty message"
+        if len(embeds) > 10: return f"too many embeds ({len(embeds)})"
+        if len(file_names) > 10: return f"too many files ({len(file_names)})"
+        total = 0
+        for e in embeds:
+            if len(e.get("title", "")) > 256: return "title too long"
+            if len(e.get("description", "")) > 4096: return "description too long"
+            if len(e.get("fields", [])) > 25: return "too many fields"
+            if len(e.get("footer", {}).get("text", "")) > 2048: return "footer too long"
+            for f in e.get("fields", []):
+                if not f.get("name") or not f.get("value"): return "empty field"
+                if len(f["name"]) > 256 or len(f["value"]) > 1024: return "field too long"
+            total += len(e.get("title", "")) + len(e.get("description", "")) + len(e.get("footer", {}).get("text", ""))
+            total += sum(len(f["name"]) + len(f["value"]) for f in e.get("fields", []))
+        if total > 6000: return f"embeds exceed 6000 characters ({total})"
+        missing = set(re.findall(r'attachment://([^\s"\')]+)', json.dumps(payload, ensure_ascii=False))) - set(file_names)
+        if missing: return f"missing attachments {sorted(missing)}"
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, str(v))
+                if data:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _parse(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                ctype = self.headers.get("Content-Type", "")
+                if ctype.startswith("application/json"):
+                    return json.loads(body), []
+                # HTTP policy：requests 直接以 UTF-8 送出中文檔名
+                msg = BytesParser(policy=email.policy.HTTP).parsebytes(f"Content-Type: {ctype}\r\n\r\n".encode() + body)
+                payload, file_names = {}, []
+                for part in msg.get_payload():
+                    name = part.get_param("name", header="content-disposition")
+                    if name == "payload_json":
+                        payload = json.loads(part.get_payload(decode=True))
+                    elif part.get_filename():
+                        file_names.append(part.get_filename())
+                return payload, file_names
+
+            def do_POST(self):
+                allowed, remaining, reset_after = server._take_token(self.path)
+                headers = {"X-RateLimit-Limit": server.rate_limit, "X-RateLimit-Remaining": remaining,
+                           "X-RateLimit-Reset-After": f"{reset_after:.3f}"}
+                if not allowed:
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    server.rejected.append((self.path, 429, "rate limited"))
+                    return self._reply(429, {"message": "You are being rate limited.", "retry_after": round(reset_after, 3), "global": False},
+                                       {**headers, "Retry-After": f"{reset_after:.3f}"})
+                try:
+                    payload, file_names = self._parse()
+                except Exception as e:
+                    server.rejected.append((self.path, 400, f"bad body: {e}"))
+                    return self._reply(400, {"message": "Cannot parse body"}, headers)
+                if server.rng.random() < server.error_rate:
+                    server.rejected.append((self.path, 502, "fake upstream error"))
+                    return self._reply(502, {"message": "Bad Gateway"}, headers)
+                error = server.validate(payload, file_names)
+                if error:
+                    server.rejected.append((self.path, 400, error))
+                    return self._reply(400, {"message": error}, headers)
+                server.messages.append((self.path, payload, file_names))
+                self._reply(204, None, headers)
+
+        return Handler
+
+# ==========================================
+# ⏱️ 示範量測
+# ==========================================
+async def _bench_llm(runs=20):
+    from reporting.llm import race_generate
+
+    for k in (1, 3):
+        durations, wins = [], 0
+        for seed in range(runs):
+            client = FakeLLMClient(latency=(0.3, 1.5), rate_limit_rate=0.4, seed=seed)
+            start = time.perf_counter()
+            model, _ = await race_generate(client, client.models, "prompt", k=k, timeout=5)
+            durations.append(time.perf_counter() - start)
+            wins += model is not None
+        durations.sort()
+        print(f"🏁 k={k}: 成功 {wins}/{runs}，中位數 {durations[len(durations) // 2]:.2f}s，最慢 {durations[-1]:.2f}s")
+
+async def _bench_tts():
+    import tempfile
+    from reporting.tts import synthesize_script, TTSCache
+
+    script = "早安各位冒險者！今天市場整體偏多。魔晶獸大漲百分之二十，恭喜持有的玩家！" * 8
+    with tempfile.TemporaryDirectory() as cold_dir, tempfile.TemporaryDirectory() as warm_dir:
+        # 最後一輪沿用上一輪的快取目錄，模擬文案未變的重跑
+        for label, concurrency, cache_dir in [("單段依序", 1, cold_dir), ("分段並行", 4, warm_dir), ("快取重跑", 4, warm_dir)]:
+            engine = FakeTTSEngine(seconds_per_char=0.005, seed=0)
+            cache = TTSCache(cache_dir)
+            start = time.perf_counter()
+            audio, stats = await synthesize_script(script, engine=engine, cache=cache, concurrency=concurrency)
+            print(f"🎙️ {label}: {time.perf_counter() - start:.2f}s，{stats['segments']} 段，快取命中 {stats['cache_hits']}，{len(audio):,} bytes")
+
+def _bench_discord():
+    from reporting.discord import DiscordWebhookClient
+
+    # 超過單則訊息上限的看板：40 個長欄位 + 12 張圖 + 語音
+    board = {"title": "📋 精選數據看板", "fields": [
+        {"name": f"物品 {i}", "value": "🚀 `+5.0%` | $10,000\n" + "└ 🔥 創歷史新高\n" * 30, "inline": True} for i in range(40)
+    ]}
+    images = [(f"chart_{i}.png", b"PNG" * 100, "image/png") for i in range(12)]
+    embeds = [{"title": "🎙️ 報告", "description": "早安！" * 1500}, board]
+    embeds += [{"title": f"📈 圖 {i}", "image": {"url": f"attachment://{name}"}} for i, (name, _, _) in enumerate(images)]
+    files = [("report.mp3", b"FAKEMP3" * 1000, "audio/mpeg")] + images
+
+    with StubDiscordServer(rate_limit=3, window=1.0, error_rate=0.1, seed=0) as server:
+        urls = [server.url(f"/webhooks/{i}/token") for i in range(3)]
+        with DiscordWebhookClient(username="托蘭 AI 分析師") as client:
+            start = time.perf_counter()
+            results = client.send_many(urls, embeds, files)
+            elapsed = time.perf_counter() - start
+        rejected = {}
+        for _, status, reason in server.rejected:
+            rejected[status] = rejected.get(status, 0) + 1
+        print(f"📮 {len(urls)} 個 webhook，{len(server.messages)} 則訊息，{elapsed:.2f}s，結果 {list(results.values())}，被拒 {rejected}")
+        bad = [r for r in server.rejected if r[1] == 400]
+        if bad:
+            print(f"❌ 違反上限: {bad}")
+
+if __name__ == "__main__":
+    asyncio.run(_bench_llm())
+    asyncio.run(_bench_tts())
+    _bench_discord()
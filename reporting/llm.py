@@ -0,0 +1,139 @@
+# reporting/llm.py
+import os
+import json
+import time
+import asyncio
+
+# ==========================================
+# 🔑 設定
+# ==========================================
+MODEL_CACHE_PATH = os.environ.get("MODEL_CACHE_PATH", os.path.join(".cache", "gemini_models.json"))
+MODEL_CACHE_TTL = int(os.environ.get("MODEL_CACHE_TTL", 24 * 3600))  # 秒
+FALLBACK_MODELS = ["models/gemini-1.5-flash"]
+PRIORITY_LIST = ["gemini-2.0-flash-exp", "gemini-1.5-flash", "gemini-1.5-flash-001", "flash"]
+
+# ==========================================
+# 🧠 Gemini 用戶端 (與 FakeLLMClient 介面相同)
+# ==========================================
+class GeminiClient:
+    def __init__(self, api_key, temperature=0.7):
+        import google.generativeai as genai
+        self.genai = genai
+        self.temperature = temperature
+        genai.configure(api_key=api_key)
+
+    def list_models(self):
+        return [m.name for m in self.genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+    async def generate(self, model_name, prompt):
+        model = self.genai.GenerativeModel(model_name)
+        response = await model.generate_content_async(
+            prompt, generation_config=self.genai.types.GenerationConfig(temperature=self.temperature)
+        )
+        return response.text
+
+# ==========================================
+# 📦 模型清單快取
+# ==========================================
+def rank_models(all_models, priority_list=PRIORITY_LIST):
+    """依優先關鍵字排序模型；沒有任何符合時回傳全部。"""
+    target_models = []
+    seen = set()
+    for p in priority_list:
+        for m in all_models:
+            if p in m and m not in seen:
+                target_models.append(m)
+                seen.add(m)
+    return target_models or list(all_models)
+
+def load_cached_models(path=MODEL_CACHE_PATH, ttl=MODEL_CACHE_TTL):
+    """讀取磁碟上的模型清單，過期或損毀則回傳 None。"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached["saved_at"] <= ttl and cached["models"]:
+            return cached["models"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_cached_models(models, path=MODEL_CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "models": models}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 模型清單快取寫入失敗: {e}")
+
+def discover_models(client, cache_path=MODEL_CACHE_PATH, ttl=MODEL_CACHE_TTL):
+    """
+    取得排序後的候選模型：優先使用 TTL 內的磁碟快取，否則呼叫 list_models 並寫回快取。
+    查詢失敗時回傳 FALLBACK_MODELS (不寫入快取)。
+    """
+    cached = load_cached_models(cache_path, ttl)
+    if cached:
+        print(f"📦 使用快取模型清單 ({len(cached)} 個)")
+        return cached
+    try:
+        models = rank_models(client.list_models())
+    except Exception as e:
+        print(f"⚠️ 模型清單查詢失敗: {e}")
+        return list(FALLBACK_MODELS)
+    if models:
+        save_cached_models(models, cache_path)
+    return models or list(FALLBACK_MODELS)
+
+# ==========================================
+# 🏁 多模型競速
+# ==========================================
+async def _call_model(client, model_name, prompt, timeout):
+    text = await asyncio.wait_for(client.generate(model_name, prompt), timeout=timeout)
+    if not text:
+        raise ValueError("empty response")
+    return text
+
+async def race_generate(client, models, prompt, k=3, timeout=30.0):
+    """
+    同時把 prompt 送給前 k 個候選模型，採用第一個有效回應並取消其餘請求。
+    某個模型失敗 (429 / 逾時 / 空回應) 時立刻補上下一個候選，始終維持 k 個請求在途。
+    k=1 即為依序嘗試 (但不再每次失敗後 sleep)。
+    :return: (model_name, text)，全部失敗時回傳 (None, None)
+    """
+    queue = list(models)
+    in_flight = {}
+
+    def launch_next():
+        if queue:
+            model_name = queue.pop(0)
+            print(f"🧠 嘗試呼叫: {model_name} ...")
+            task = asyncio.ensure_future(_call_model(client, model_name, prompt, timeout))
+            in_flight[task] = model_name
+
+    for _ in range(max(1, k)):
+        launch_next()
+
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model_name = in_flight.pop(task)
+                try:
+                    text = task.result()
+                except asyncio.TimeoutError:
+                    print(f"⌛ {model_name} 逾時 ({timeout:g}s)")
+                    launch_next()
+                except Exception as e:
+                    if "429" not in str(e): print(f"❌ {model_name} error: {e}")
+                    launch_next()
+                else:
+                    print(f"🏁 採用 {model_name} 的回應")
+                    return model_name, text
+        return None, None
+    finally:
+        # 取消其餘仍在途的請求
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
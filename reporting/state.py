@@ -0,0 +1,267 @@
+# reporting/state.py
+"""
+日報增量狀態：把上一次分析的結果濃縮成一份 JSON 快照 (.cache/report_state.json)，
+下一次只需要處理新進來的成交紀錄，就能得到與全量重算相同的標籤與漲跌幅。
+
+每個物品保存：
+- 筆數、首筆 / 最新價格、最高 / 最低、價格總和 (均價)
+- 價格差分的 Welford 統計量 (暴漲暴跌事件用)
+- 已確認的最近 5 個高點 / 低點，以及最後 2*window 筆價格 (用來確認新的極值)
+- 最近約兩天的成交 (計算 25 小時漲跌幅)
+另外保存每份報告上一次的看板，用來標示新上榜的物品。
+"""
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis.patterns import find_extrema, classify_patterns, classify_events
+
+STATE_PATH = os.environ.get("REPORT_STATE_PATH", os.path.join(".cache", "report_state.json"))
+STATE_VERSION = 1
+PATTERN_WINDOW = 3
+KEEP_EXTREMA = 5                           # classify_patterns 只看最後 5 個極值
+RECENT_KEEP = pd.Timedelta(hours=25 + 24)  # 漲跌幅基準 (25h) 再多留一天，容許提早重跑
+
+class StateOutOfRange(Exception):
+    """快照保留的資料不足以計算這次的報告 (例如基準時間往前移太多)，需要全量重建。"""
+
+# ==========================================
+# 🧮 單一物品
+# ==========================================
+def _new_item_state():
+    return {
+        "count": 0, "first_price": None, "last_price": None, "last_time": None, "category": None,
+        "max": None, "min": None, "sum": 0.0,
+        "diff_n": 0, "diff_mean": 0.0, "diff_m2": 0.0, "last_change": None,
+        "peaks": [], "troughs": [], "tail": [],
+        "recent": [],  # [[ISO 時間, 價格]]
+    }
+
+def _update_item(st, times, prices, categories, window=PATTERN_WINDOW):
+    """把一個物品的新成交 (依時間排序) 併入狀態。"""
+    prices = np.asarray(prices, dtype=float)
+    n_old, n_new = st["count"], st["count"] + len(prices)
+
+    # 1. 基本統計
+    if n_old == 0:
+        st["first_price"] = float(prices[0])
+        st["max"], st["min"] = float(prices.max()), float(prices.min())
+    else:
+        st["max"], st["min"] = max(st["max"], float(prices.max())), min(st["min"], float(prices.min()))
+    st["sum"] += float(prices.sum())
+
+    # 2. 差分統計 (Welford，批次合併)
+    diffs = np.diff(np.concatenate(([st["last_price"]], prices))) if n_old else np.diff(prices)
+    if len(diffs):
+        n_a, mean_a, m2_a = st["diff_n"], st["diff_mean"], st["diff_m2"]
+        n_b, mean_b = len(diffs), float(diffs.mean())
+        m2_b = float(((diffs - mean_b) ** 2).sum())
+        n_ab = n_a + n_b
+        delta = mean_b - mean_a
+        st["diff_mean"] = mean_a + delta * n_b / n_ab
+        st["diff_m2"] = m2_a + m2_b + delta ** 2 * n_a * n_b / n_ab
+        st["diff_n"] = n_ab
+        st["last_change"] = float(diffs[-1])
+
+    # 3. 極值：舊的最後 window 筆 + 新資料中，右側已有完整 window 筆的點才算確認
+    tail_start = n_old - len(st["tail"])
+    segment = np.concatenate((np.asarray(st["tail"], dtype=float), prices))
+    peaks, troughs = find_extrema(segment, window)
+    lo, hi = max(n_old - window, 0), n_new - window  # 確認範圍 [lo, hi)
+    for key, found in (("peaks", peaks), ("troughs", troughs)):
+        confirmed = [[tail_start + i, float(p)] for i, p in found if lo <= tail_start + i < hi]
+        st[key] = (st[key] + confirmed)[-KEEP_EXTREMA:]
+    st["tail"] = [float(p) for p in segment[-2 * window:]]
+
+    # 4. 最新資訊與近期成交
+    st["count"] = n_new
+    st["last_price"] = float(prices[-1])
+    st["last_time"] = times[-1].isoformat()
+    st["category"] = categories[-1]
+    st["recent"] += [[t.isoformat(), float(p)] for t, p in zip(times, prices)]
+
+def _prune_recent(st, keep_from):
+    """只保留 keep_from 之後的成交，再加上之前的最後一筆 (漲跌幅基準)。"""
+    recent = st["recent"]
+    cut = 0
+    for i, (t, _) in enumerate(recent):
+        if pd.Timestamp(t) <= keep_from:
+            cut = i
+        else:
+            break
+    st["recent"] = recent[cut:]
+
+def _item_record(item, st, yesterday, window=PATTERN_WINDOW):
+    """與 daily_report.analyze_items 逐物品的結果相同。"""
+    # 漲跌幅基準：yesterday 之前的最後一筆，沒有則用首筆
+    prev = None
+    for t, p in st["recent"]:
+        if pd.Timestamp(t) <= yesterday:
+            prev = p
+        else:
+            break
+    if prev is None:
+        has_older = st["count"] > len(st["recent"])
+        if has_older:
+            raise StateOutOfRange(f"{item}: 快照沒有 {yesterday} 之前的成交")
+        prev = st["first_price"]
+    latest = st["last_price"]
+    change = ((latest - prev) / prev) * 100 if prev else 0
+
+    # 型態：已確認的極值 + 最後 window 筆的暫定極值
+    n, tail = st["count"], np.asarray(st["tail"], dtype=float)
+    tail_start = n - len(tail)
+    peaks, troughs = find_extrema(tail, window)
+    provisional_from = max(n - window, 0)
+    peaks = [tuple(p) for p in st["peaks"]] + [(tail_start + i, p) for i, p in peaks if tail_start + i >= provisional_from]
+    troughs = [tuple(p) for p in st["troughs"]] + [(tail_start + i, p) for i, p in troughs if tail_start + i >= provisional_from]
+    patterns = classify_patterns(peaks[-KEEP_EXTREMA:], troughs[-KEEP_EXTREMA:], n,
+                                 st["first_price"], latest, st["max"], st["min"])
+
+    std_change = np.sqrt(st["diff_m2"] / (st["diff_n"] - 1)) if st["diff_n"] > 1 else np.nan
+    events = classify_events(
+        n - 1, latest, st["max"], st["min"],
+        st["last_change"] if st["last_change"] is not None else np.nan,
+        std_change, st["sum"] / n
+    )
+
+    tags = [p['type'] for p in patterns if any(k in p['type'] for k in ["頭肩", "雙重", "三角"])]
+    tags += [e['type'] for e in events if "新高" in e['type'] or "新低" in e['type']]
+    return {"item": item, "category": st["category"], "price": latest, "change_pct": change, "tags": tags}
+
+# ==========================================
+# 💾 整份快照
+# ==========================================
+class ReportState:
+    """
+    用法:
+        state = ReportState.load()
+        new_rows = state.update(df)           # 只處理上次之後的新成交
+        records = state.records(yesterday)    # 與 analyze_items 相同格式
+        state.save()
+    """
+    def __init__(self, items=None, cursor=None, highlights=None, window=PATTERN_WINDOW):
+        self.items = items or {}
+        # 游標：已處理的最新時間，以及該時間點已處理的筆數 (同一時間可能有多筆)
+        self.cursor = cursor or {"time": None, "count_at_time": 0, "total": 0}
+        self.highlights = highlights or {}  # 報告名稱 -> [{"item", "change_pct", "tags"}]
+        self.window = window
+
+    # --- 讀寫 ---
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        """讀取快照，不存在、版本不符或損毀時回傳空狀態 (下一次 update 會全量建立)。"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != STATE_VERSION or data.get("window") != PATTERN_WINDOW:
+                print("⚠️ 報告狀態版本不符，將全量重建")
+                return cls()
+            return cls(data["items"], data["cursor"], data.get("highlights"), data["window"])
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ 報告狀態讀取失敗，將全量重建: {e}")
+            return cls()
+
+    def save(self, path=STATE_PATH):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": STATE_VERSION, "window": self.window, "saved_at": time.time(),
+                    "cursor": self.cursor, "items": self.items, "highlights": self.highlights,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 報告狀態寫入失敗: {e}")
+
+    @property
+    def empty(self):
+        return not self.items
+
+    def reset(self):
+        """清空物品狀態 (保留上次的看板)，下一次 update 會從頭建立。"""
+        self.items = {}
+        self.cursor = {"time": None, "count_at_time": 0, "total": 0}
+
+    # --- 增量更新 ---
+    def new_rows(self, df):
+        """取出游標之後的新成交；資料筆數變少 (表單被改寫) 或有舊時間的成交補進來時回傳 None 代表需要重建。"""
+        if len(df) < self.cursor["total"]:
+            return None
+        if self.cursor["time"] is None:
+            return df
+        cursor_time = pd.Timestamp(self.cursor["time"])
+        at_cursor = df[df['時間'] == cursor_time]
+        if len(at_cursor) < self.cursor["count_at_time"]:
+            return None
+        new = pd.concat([at_cursor.iloc[self.cursor["count_at_time"]:], df[df['時間'] > cursor_time]])
+        if len(new) != len(df) - self.cursor["total"]:
+            return None  # 有比游標更早的成交補進來 (例如收價服務的補送)
+        return new
+
+    def update(self, df):
+        """
+        把新成交併入狀態。
+        :param df: load_data 的完整結果 (依時間排序)
+        :return: 這次處理的筆數
+        """
+        new = self.new_rows(df)
+        if new is None:
+            print("⚠️ 資料來源被改寫，報告狀態全量重建")
+            self.reset()
+            new = df
+        if new.empty:
+            return 0
+
+        for item, group in new.groupby('物品', sort=False):
+            st = self.items.setdefault(item, _new_item_state())
+            _update_item(st, list(group['時間']), group['單價'].values, list(group['分類']), self.window)
+
+        last_time = df['時間'].iloc[-1]
+        self.cursor = {
+            "time": last_time.isoformat(),
+            "count_at_time": int((df['時間'] == last_time).sum()),
+            "total": len(df),
+        }
+        return len(new)
+
+    def records(self, yesterday, min_points=5):
+        """
+        最近 25 小時有成交的物品分析結果，格式同 analyze_items 的 records。
+        :raises StateOutOfRange: 快照保留的近期成交不足，需要全量重建
+        """
+        active = []
+        for item, st in self.items.items():
+            if st["count"] < min_points or pd.Timestamp(st["last_time"]) < yesterday:
+                continue
+            # 與全量版相同的順序：依物品在 yesterday 之後的第一筆成交排序
+            first_active = next(pd.Timestamp(t) for t, _ in st["recent"] if pd.Timestamp(t) >= yesterday)
+            active.append((first_active, item, st))
+        active.sort(key=lambda x: x[0])
+        records = [_item_record(item, st, yesterday, self.window) for _, item, st in active]
+        for st in self.items.values():
+            _prune_recent(st, yesterday - (RECENT_KEEP - pd.Timedelta(hours=25)))
+        return records
+
+    # --- 與上次看板比較 ---
+    def diff_highlights(self, report_name, highlights):
+        """
+        標記新上榜 (is_new) 與新出現的標籤 (new_tags)，並記下這次的看板。
+        這份報告還沒有上次的看板 (第一次執行 / 狀態重置) 時不標記，避免全部都是 🆕。
+        """
+        has_previous = report_name in self.highlights
+        previous = {h["item"]: h for h in self.highlights.get(report_name, [])}
+        for h in highlights:
+            prev = previous.get(h["item"])
+            h["is_new"] = has_previous and prev is None
+            h["new_tags"] = [t for t in h["tags"] if has_previous and (not prev or t not in prev["tags"])]
+        self.highlights[report_name] = [
+            {"item": h["item"], "change_pct": float(h["change_pct"]), "tags": list(h["tags"])} for h in highlights
+        ]
+        return highlights
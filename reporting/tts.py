@@ -0,0 +1,172 @@
+# reporting/tts.py
+import os
+import re
+import time
+import asyncio
+import hashlib
+
+# ==========================================
+# 🔑 設定
+# ==========================================
+TTS_VOICE = "zh-TW-HsiaoChenNeural"
+TTS_RATE = "+30%"  # 語速稍微加快，聽起來較有精神
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+TTS_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", 4))
+TTS_RETRIES = 2
+# 快取清理：超過天數沒用到的片段刪除，總量超過上限時再從最久沒用到的刪起
+TTS_CACHE_MAX_AGE_DAYS = float(os.environ.get("TTS_CACHE_MAX_AGE_DAYS", 14))
+TTS_CACHE_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", 200))
+
+SENTENCE_END = re.compile(r'(?<=[。！？!?；;\n])')
+
+# ==========================================
+# 🎙️ Edge-TTS 引擎 (與 FakeTTSEngine 介面相同)
+# ==========================================
+class EdgeTTSEngine:
+    async def synthesize(self, text, voice=TTS_VOICE, rate=TTS_RATE):
+        """直接在記憶體中收集音訊串流，不寫暫存檔。"""
+        import edge_tts
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        audio = b"".join(chunks)
+        if not audio:
+            raise RuntimeError("Edge-TTS 沒有回傳音訊")
+        return audio
+
+# ==========================================
+# ✂️ 斷句
+# ==========================================
+def split_sentences(text, max_chars=120):
+    """
+    在句尾標點處切段，再把過短的句子合併，每段不超過 max_chars (單句過長則保留原樣)。
+    """
+    sentences = [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+    segments, current = [], ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current += sentence
+    if current:
+        segments.append(current)
+    return segments
+
+# ==========================================
+# 📦 內容雜湊快取
+# ==========================================
+def segment_cache_key(text, voice=TTS_VOICE, rate=TTS_RATE):
+    return hashlib.sha256(f"{voice}|{rate}|{text}".encode("utf-8")).hexdigest()
+
+class TTSCache:
+    """以 (聲音, 語速, 文字) 的 SHA-256 為檔名存放各段音訊；命中時更新檔案時間，prune 依此清理。"""
+    def __init__(self, cache_dir=TTS_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._path(key))
+            return audio
+        except OSError:
+            return None
+
+    def put(self, key, audio):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(key)}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"⚠️ 語音快取寫入失敗: {e}")
+
+    def prune(self, max_age_days=TTS_CACHE_MAX_AGE_DAYS, max_mb=TTS_CACHE_MAX_MB):
+        """
+        刪除過期的片段 (與中斷留下的 .tmp)，總量仍超過上限時從最久沒用到的刪起。
+        :return: (刪除檔案數, 剩餘 bytes)
+        """
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return 0, 0
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        cutoff = time.time() - max_age_days * 86400
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= max_mb * 1024 * 1024:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            total -= size
+        if removed:
+            print(f"🧹 語音快取清理: 刪除 {removed} 個片段，剩餘 {total / 1024 / 1024:,.1f} MB")
+        return removed, total
+
+# ==========================================
+# 🚀 分段並行合成
+# ==========================================
+async def synthesize_script(text, engine=None, cache=None, concurrency=TTS_CONCURRENCY,
+                            voice=TTS_VOICE, rate=TTS_RATE, max_chars=120):
+    """
+    將整理好的文稿分段，以有上限的並行度合成，依原順序在記憶體中串接 (MP3 frame 可直接串接)。
+    :return: (audio_bytes, stats)；任一段最終失敗則回傳 (None, stats)
+    """
+    engine = engine or EdgeTTSEngine()
+    cache = cache if cache is not None else TTSCache()
+    segments = split_sentences(text, max_chars=max_chars)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    stats = {"segments": len(segments), "cache_hits": 0, "synthesized": 0}
+
+    async def render(segment):
+        key = segment_cache_key(segment, voice, rate)
+        cached = cache.get(key)
+        if cached:
+            stats["cache_hits"] += 1
+            return cached
+        async with semaphore:
+            for attempt in range(1, TTS_RETRIES + 1):
+                try:
+                    audio = await engine.synthesize(segment, voice=voice, rate=rate)
+                    break
+                except Exception as e:
+                    if attempt == TTS_RETRIES:
+                        raise
+                    print(f"⚠️ 語音片段重試 ({attempt}/{TTS_RETRIES}): {e}")
+        cache.put(key, audio)
+        stats["synthesized"] += 1
+        return audio
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(render(seg)) for seg in segments]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except Exception as e:
+        # 任一段最終失敗整份音訊就作廢：其餘片段不必再合成
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print(f"❌ 語音片段合成失敗: {e}")
+        return None, stats
+    stats["ms"] = (time.perf_counter() - start) * 1000
+    return b"".join(parts), stats
@@ -1,68 +1,115 @@
 # utils/preprocess.py
+import os
 import pandas as pd
 import numpy as np
 import streamlit as st # <-- 🔴 新增這行
 
-@st.cache_data(ttl=60 * 5) # 緩存 5 分鐘
+from ingest.client import TickFeed
+
+# 🛰️ 設定後改從本機收價服務 (ingest/server.py) 增量讀取，不再下載整份試算表 CSV
+INGEST_URL = os.environ.get("INGEST_URL")
+# 選用：把已讀到的成交存到這個檔案，下次啟動 (例如日報) 只讀游標之後的新資料
+INGEST_CACHE = os.environ.get("INGEST_CACHE")
+
+def parse_google_time(t_str):
+    """Google 表單的時間 (含「上午 / 下午」) 或一般時間字串。"""
+    try:
+        t_str = str(t_str).strip()
+        if "下午" in t_str or "上午" in t_str:
+            is_pm = "下午" in t_str
+            clean_str = t_str.replace("下午", "").replace("上午", "").strip()
+            dt = pd.to_datetime(clean_str)
+            if is_pm and dt.hour != 12: dt += pd.Timedelta(hours=12)
+            elif not is_pm and dt.hour == 12: dt -= pd.Timedelta(hours=12)
+            return dt
+        else:
+            t_str = t_str.replace("/", "-")
+            return pd.to_datetime(t_str)
+    except:
+        return pd.NaT
+
+# 自動分類 (與原版相同)
+def get_category(row):
+    name = str(row['物品']).strip()
+    attr = str(row['屬性']).strip() if pd.notna(row['屬性']) else ""
+    check_str = name + attr
+    if "武器" in check_str: return "⚔️ 武器王石"
+    if "防具" in check_str: return "🛡️ 防具王石"
+    if "追加" in check_str: return "🎩 追加王石"
+    if "特殊" in check_str: return "💍 特殊王石"
+    if "通用" in check_str: return "*️⃣ 通用王石"
+    if "外觀" in check_str: return "👗 外觀"
+    if any(x in check_str for x in ["雙洞", "單洞", "不限洞", "空洞"]): return "⚔️ 裝備"
+    return "📦 其他雜項"
+
+def prepare_frame(df):
+    """
+    清洗 [時間, 物品, 屬性, 單價] 四欄的原始資料：解析時間、轉數值、分類、依時間排序。
+    CSV 與收價服務共用 (收價服務只對新進的資料呼叫)。
+    """
+    df = df.dropna(subset=["物品", "單價"])
+    df['時間'] = df['時間'].apply(parse_google_time)
+    df = df.dropna(subset=["時間"])
+    df['單價'] = pd.to_numeric(df['單價'], errors='coerce')
+    df = df.dropna(subset=["單價"])
+
+    df['分類'] = df.apply(get_category, axis=1) if not df.empty else pd.Series(dtype=object)
+    df = df.sort_values("時間", kind="stable")  # 同一時間的成交保持原始順序
+
+    # 6️⃣ VWAP (成交量加權平均) 的成交量：收價服務有掛單數量就用，否則每筆交易量為 1
+    if '數量' in df.columns:
+        df['Volume'] = pd.to_numeric(df['數量'], errors='coerce').fillna(1).clip(lower=1).astype(int)
+    else:
+        df['Volume'] = 1 
+    return df
+
 def load_data(SHEET_URL):
-    """讀取資料並進行基礎清洗與分類。"""
+    """
+    讀取資料並進行基礎清洗與分類。
+    設定 INGEST_URL 時改從本機收價服務讀取 (每次只抓游標之後的新成交)。
+    """
+    if INGEST_URL:
+        return load_ingest_data(INGEST_URL)
+    return load_sheet_data(SHEET_URL)
+
+@st.cache_data(ttl=60 * 5) # 緩存 5 分鐘
+def load_sheet_data(SHEET_URL):
     try:
         df = pd.read_csv(SHEET_URL)
         if len(df.columns) >= 4:
             df = df.iloc[:, :4] 
             df.columns = ["時間", "物品", "屬性", "單價"]
-            df = df.dropna(subset=["物品", "單價"])
-
-            def parse_google_time(t_str):
-                try:
-                    t_str = str(t_str).strip()
-                    if "下午" in t_str or "上午" in t_str:
-                        is_pm = "下午" in t_str
-                        clean_str = t_str.replace("下午", "").replace("上午", "").strip()
-                        dt = pd.to_datetime(clean_str)
-                        if is_pm and dt.hour != 12: dt += pd.Timedelta(hours=12)
-                        elif not is_pm and dt.hour == 12: dt -= pd.Timedelta(hours=12)
-                        return dt
-                    else:
-                        t_str = t_str.replace("/", "-")
-                        return pd.to_datetime(t_str)
-                except:
-                    return pd.NaT
-
-            df['時間'] = df['時間'].apply(parse_google_time)
-            df = df.dropna(subset=["時間"])
-            df['單價'] = pd.to_numeric(df['單價'], errors='coerce')
-            df = df.dropna(subset=["單價"])
-            
-            # 自動分類 (與原版相同)
-            def get_category(row):
-                name = str(row['物品']).strip()
-                attr = str(row['屬性']).strip() if pd.notna(row['屬性']) else ""
-                check_str = name + attr
-                if "武器" in check_str: return "⚔️ 武器王石"
-                if "防具" in check_str: return "🛡️ 防具王石"
-                if "追加" in check_str: return "🎩 追加王石"
-                if "特殊" in check_str: return "💍 特殊王石"
-                if "通用" in check_str: return "*️⃣ 通用王石"
-                if "外觀" in check_str: return "👗 外觀"
-                if any(x in check_str for x in ["雙洞", "單洞", "不限洞", "空洞"]): return "⚔️ 裝備"
-                return "📦 其他雜項"
-
-            df['分類'] = df.apply(get_category, axis=1)
-            df = df.sort_values("時間")
-
-            # 6️⃣ VWAP (成交量加權平均) 的體積估計 (每筆交易量為 1)
-            df['Volume'] = 1 
-            
-            return df, None
+            return prepare_frame(df), None
         else:
             return pd.DataFrame(), "欄位不足"
     except Exception as e:
         return pd.DataFrame(), str(e)
+
+@st.cache_resource
+def get_tick_feed(ingest_url):
+    """每個程序一個 TickFeed (所有工作階段共用，poll 內部互斥)，游標與已清洗的資料留在記憶體。"""
+    return TickFeed(ingest_url, prepare=prepare_frame, cache_path=INGEST_CACHE, token=os.environ.get("INGEST_TOKEN"))
+
+def load_ingest_data(ingest_url):
+    try:
+        feed = get_tick_feed(ingest_url)
+        feed.poll()
+        return feed.frame, None
+    except Exception as e:
+        return pd.DataFrame(), str(e)
         
 def filter_and_prepare_data(df, item_name, start_date=None, end_date=None):
     """依物品名稱和日期過濾資料。"""
     target_df = df[df['物品'] == item_name].copy()
     if start_date and end_date:
         target_df = target_df[(target_df['時間'] >= start_date) & (target_df['時間'] <= end_date)]
-    return target_df.reset_index(drop=True)
\ No newline at end of file
+    return target_df.reset_index(drop=True)
+
+def get_data_version(df):
+    """
+    資料版本指紋 (筆數 + 最新時間)，給 st.cache_data 當作快取鍵。
+    load_data 每次重新下載後只要有新資料，版本就會改變。
+    """
+    if df.empty:
+        return (0, None)
+    return (len(df), str(df['時間'].max()))
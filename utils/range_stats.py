@@ -0,0 +1,97 @@
+# utils/range_stats.py
+import pandas as pd
+import numpy as np
+
+STAT_COLUMNS = ["start", "end", "count", "first", "last", "max", "min", "mean", "std"]
+
+class RangeStatsIndex:
+    """
+    單一物品的區間統計索引 (線性時間建構，任意區間 O(1) 查詢)。
+    - 前綴和 (Σx, Σx²) -> 平均值 / 標準差
+    - Sparse Table -> 區間最高 / 最低
+    - searchsorted -> 時間邊界轉索引
+    """
+    def __init__(self, times, prices):
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.prices = np.asarray(prices, dtype=float)
+        n = len(self.prices)
+
+        # 以第一筆價格為平移量，避免大額價格平方後的浮點誤差
+        self.shift = self.prices[0] if n else 0.0
+        centered = self.prices - self.shift
+        self.sum1 = np.concatenate([[0.0], np.cumsum(centered)])
+        self.sum2 = np.concatenate([[0.0], np.cumsum(centered ** 2)])
+
+        # Sparse Table: 第 k 層存放 [i, i + 2^k) 的最大/最小值 (尾端以 ±inf 補齊，方便批次查詢)
+        levels = max(1, int(np.log2(n)) + 1) if n else 1
+        self.table_max = np.full((levels, n), -np.inf)
+        self.table_min = np.full((levels, n), np.inf)
+        if n:
+            self.table_max[0] = self.prices
+            self.table_min[0] = self.prices
+        for k in range(1, levels):
+            half = 1 << (k - 1)
+            width = n - (1 << k) + 1
+            self.table_max[k, :width] = np.maximum(self.table_max[k - 1, :width], self.table_max[k - 1, half:half + width])
+            self.table_min[k, :width] = np.minimum(self.table_min[k - 1, :width], self.table_min[k - 1, half:half + width])
+
+    @classmethod
+    def from_df(cls, df):
+        """由 filter_and_prepare_data 的結果 (已依時間排序) 建立索引。"""
+        return cls(df['時間'].to_numpy(), df['單價'].to_numpy())
+
+    def __len__(self):
+        return len(self.prices)
+
+    def _bounds(self, starts, ends):
+        """時間區間 [start, end] (兩端皆含) -> 索引區間 [lo, hi)"""
+        lo = np.searchsorted(self.times, np.asarray(starts, dtype='datetime64[ns]'), side='left')
+        hi = np.searchsorted(self.times, np.asarray(ends, dtype='datetime64[ns]'), side='right')
+        return lo, np.maximum(hi, lo)
+
+    def query_many(self, starts, ends):
+        """
+        批次查詢多個區間 (全部以陣列運算完成)。
+        :param starts: 區間起點序列
+        :param ends: 區間終點序列 (含)
+        :return: 每個區間一列的 DataFrame (count=0 的區間其餘欄位為 NaN)
+        """
+        starts = pd.DatetimeIndex(starts)
+        ends = pd.DatetimeIndex(ends)
+        lo, hi = self._bounds(starts, ends)
+        count = hi - lo
+        has = count > 0
+        safe_lo = np.where(has, lo, 0)
+        safe_last = np.where(has, hi - 1, 0)
+        safe_count = np.where(has, count, 1)
+
+        k = np.floor(np.log2(safe_count)).astype(int)
+        right = safe_last + 1 - (1 << k)
+        rng_max = np.maximum(self.table_max[k, safe_lo], self.table_max[k, right]) if len(self) else np.full(len(lo), np.nan)
+        rng_min = np.minimum(self.table_min[k, safe_lo], self.table_min[k, right]) if len(self) else np.full(len(lo), np.nan)
+
+        s1 = self.sum1[hi] - self.sum1[lo]
+        s2 = self.sum2[hi] - self.sum2[lo]
+        mean = self.shift + s1 / safe_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = (s2 - s1 ** 2 / safe_count) / (count - 1)  # 樣本標準差 (ddof=1，與 pandas 相同)
+        std = np.where(count >= 2, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+        prices = self.prices if len(self) else np.array([np.nan])
+        result = pd.DataFrame({
+            "start": starts,
+            "end": ends,
+            "count": count,
+            "first": prices[safe_lo],
+            "last": prices[safe_last],
+            "max": rng_max,
+            "min": rng_min,
+            "mean": mean,
+            "std": std,
+        }, columns=STAT_COLUMNS)
+        result.loc[~has, ["first", "last", "max", "min", "mean", "std"]] = np.nan
+        return result
+
+    def query(self, start, end):
+        """單一區間查詢，回傳 dict (count 為 0 代表區間內無資料)。"""
+        return self.query_many([start], [end]).iloc[0].to_dict()
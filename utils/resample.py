@@ -0,0 +1,49 @@
+# utils/resample.py
+import pandas as pd
+import numpy as np
+
+# 依顯示範圍決定共同時間格點的間隔 (點數維持在數百點左右)
+GRID_FREQ_BY_SPAN = [
+    (pd.Timedelta(days=8), "1h"),
+    (pd.Timedelta(days=31), "4h"),
+    (pd.Timedelta(days=91), "12h"),
+]
+
+def choose_grid_freq(start, end):
+    """依時間範圍長度挑選格點間隔。"""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for max_span, freq in GRID_FREQ_BY_SPAN:
+        if span <= max_span:
+            return freq
+    return "1D"
+
+def make_time_grid(start, end, freq):
+    """產生 [start, end] 的共同時間格點 (對齊到 freq 的整點)。"""
+    start = pd.Timestamp(start).floor(freq)
+    end = pd.Timestamp(end).ceil(freq)
+    return pd.date_range(start, end, freq=freq)
+
+def resample_to_grid(times, prices, grid):
+    """
+    將不規則的成交序列以向量化 forward-fill 對齊到共同格點。
+    每個格點取「該時間點(含)之前最後一筆」價格；第一筆之前為 NaN。
+    :param times: 已排序的時間 (datetime64 陣列)
+    :param prices: 對應價格
+    :param grid: make_time_grid 的結果
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    prices = np.asarray(prices, dtype=float)
+    pos = np.searchsorted(times, grid.to_numpy(dtype='datetime64[ns]'), side='right') - 1
+    out = np.full(len(grid), np.nan)
+    valid = pos >= 0
+    out[valid] = prices[pos[valid]]
+    return out
+
+def rebase_to_100(matrix):
+    """每一欄以區間內第一個有效值為基準換算成 100。"""
+    values = matrix.to_numpy(dtype=float)
+    if values.size == 0:
+        return matrix.copy()
+    first_idx = np.argmax(~np.isnan(values), axis=0)
+    base = values[first_idx, np.arange(values.shape[1])]  # 全為 NaN 的欄位 base 仍是 NaN
+    return pd.DataFrame(values / base * 100, index=matrix.index, columns=matrix.columns)
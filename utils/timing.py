@@ -0,0 +1,42 @@
+# utils/timing.py
+import time
+import datetime
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+
+TIMINGS_KEY = "_section_timings"
+DEBUG_KEY = "debug_timing"
+
+@contextmanager
+def section_timer(name):
+    """量測一個頁面區塊的執行時間，結果存入 session_state 供除錯面板顯示。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = st.session_state.setdefault(TIMINGS_KEY, {})
+        entry = timings.setdefault(name, {"runs": 0})
+        entry["ms"] = (time.perf_counter() - start) * 1000
+        entry["runs"] += 1
+        entry["at"] = datetime.datetime.now().strftime("%H:%M:%S")
+
+def show_section_timing(name):
+    """在區塊底部顯示該區塊最近一次的執行時間 (片段單獨重跑時側邊欄不會刷新，所以就地顯示)。"""
+    if not st.session_state.get(DEBUG_KEY):
+        return
+    entry = st.session_state.get(TIMINGS_KEY, {}).get(name)
+    if entry:
+        st.caption(f"⏱️ {name}: {entry['ms']:,.1f} ms (第 {entry['runs']} 次執行 @ {entry['at']})")
+
+def render_timing_panel(container):
+    """在指定容器 (通常是側邊欄) 繪製所有區塊的耗時表。"""
+    timings = st.session_state.get(TIMINGS_KEY, {})
+    if not timings:
+        container.caption("尚無計時資料。")
+        return
+    table = pd.DataFrame([
+        {"區塊": name, "耗時 (ms)": round(v["ms"], 1), "執行次數": v["runs"], "最後執行": v["at"]}
+        for name, v in timings.items()
+    ])
+    container.dataframe(table, hide_index=True, use_container_width=True)
@@ -0,0 +1,295 @@
+# backends.py
+"""
+抓價機的視窗 / 輸入 / 截圖後端：ToramBot 只透過這裡碰遊戲。
+
+    LiveBackend     Windows 上的遊戲視窗 (pygetwindow + pydirectinput + mss + pyperclip)
+    ReplayBackend   錄下來的截圖 + 虛擬時鐘，記錄所有輸入事件；Linux 上也能跑完整的導航 → 截圖 → OCR → 上傳
+
+後端需要提供:
+    find_window() -> 有 left / top 的物件 (找不到回傳 None)
+    sct.grab(monitor)                                   截圖 (與 mss 相同介面)
+    move_to(x, y)、click()、mouse_down()、mouse_up()、move_rel(dx, dy)
+    press(key)、key_down(key)、key_up(key)、paste(text) 把文字放進剪貼簿
+    clock()、sleep(seconds)
+
+效能 / 準確率量測 (標註好的整個視窗截圖，檔名 <價格>-<數量>_<編號>.png，數量可省略):
+    python backends.py bench <截圖資料夾> [--templates digit_templates] [--no-easyocr]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import contextlib
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from digit_ocr import TEMPLATE_DIR, _percentile, label_from_filename
+
+class LiveBackend:
+    """實際的遊戲視窗；Windows 專用套件在建立時才載入。"""
+    def __init__(self, title):
+        import mss
+        import pydirectinput
+        import pyperclip
+        import pygetwindow
+        pydirectinput.PAUSE = 0.01  # 全域加速設定
+        self.title = title
+        self.sct = mss.mss()
+        self._input = pydirectinput
+        self._clipboard = pyperclip
+        self._windows = pygetwindow
+
+    def find_window(self):
+        windows = self._windows.getWindowsWithTitle(self.title)
+        if not windows:
+            return None
+        window = windows[0]
+        if not window.isActive:
+            window.activate()
+            time.sleep(0.5)
+        return window
+
+    def move_to(self, x, y):
+        self._input.moveTo(x, y)
+
+    def click(self):
+        self._input.click()
+
+    def mouse_down(self):
+        self._input.mouseDown()
+
+    def mouse_up(self):
+        self._input.mouseUp()
+
+    def move_rel(self, dx, dy):
+        self._input.moveRel(dx, dy)
+
+    def press(self, key):
+        self._input.press(key)
+
+    def key_down(self, key):
+        self._input.keyDown(key)
+
+    def key_up(self, key):
+        self._input.keyUp(key)
+
+    def paste(self, text):
+        self._clipboard.copy(text)
+
+    clock = staticmethod(time.monotonic)
+    sleep = staticmethod(time.sleep)
+
+# ==========================================
+# 🎞️ 重播後端
+# ==========================================
+class _Shot:
+    """與 mss 的 ScreenShot 相同用法：.raw / .width / .height，也可以 np.asarray()。"""
+    def __init__(self, img):
+        self.img = img
+        self.height, self.width = img.shape[:2]
+
+    @property
+    def raw(self):
+        return self.img.tobytes()
+
+    def __array__(self, dtype=None, copy=None):
+        return self.img if dtype is None else self.img.astype(dtype)
+
+class ReplayBackend:
+    """
+    依序播放錄下的整個視窗截圖 (BGRA)。
+    每次點擊 trigger 座標 (搜尋的確認鍵) 就換下一張，latency 秒 (虛擬時間) 後才出現，之前顯示 idle 畫面。
+    sleep 只推進虛擬時間；clock = 虛擬時間 + 實際經過時間，所以量到的時間包含 OCR 等計算。
+    :param frames: [BGRA 影像]，每個物品一張
+    :param trigger: 觸發換圖的點擊座標 (相對於視窗)
+    """
+    def __init__(self, frames, trigger, latency=0.2, idle=None, window=(0, 0)):
+        self.frames = list(frames)
+        self.trigger = tuple(trigger)
+        self.latency = latency
+        self.idle = idle if idle is not None else np.zeros_like(self.frames[0])
+        self.window = SimpleNamespace(left=window[0], top=window[1])
+        self.sct = SimpleNamespace(grab=self.grab)
+        self.events = []        # [(時間, 動作, 參數)]
+        self.virtual = 0.0
+        self._start = time.perf_counter()
+        self._index = -1        # 目前顯示的截圖 (-1 = idle)
+        self._pending = None    # (出現時間, 索引)
+        self._next = 0          # 下一次觸發要出現的截圖
+        self._pos = (0, 0)
+
+    def find_window(self):
+        return self.window
+
+    # --- 時間 ---
+    def clock(self):
+        return self.virtual + (time.perf_counter() - self._start)
+
+    def sleep(self, seconds):
+        self.virtual += max(seconds, 0.0)
+
+    # --- 截圖 ---
+    def current(self):
+        if self._pending and self.clock() >= self._pending[0]:
+            self._index, self._pending = self._pending[1], None
+        return self.idle if self._index < 0 else self.frames[self._index]
+
+    def grab(self, monitor):
+        top, left = monitor["top"] - self.window.top, monitor["left"] - self.window.left
+        return _Shot(np.ascontiguousarray(self.current()[top:top + monitor["height"], left:left + monitor["width"]]))
+
+    # --- 輸入 (只記錄) ---
+    def _log(self, action, *args):
+        self.events.append((self.clock(), action, args))
+
+    def move_to(self, x, y):
+        self._pos = (x, y)
+        self._log("move_to", x, y)
+
+    def click(self):
+        self._log("click", *self._pos)
+        relative = (self._pos[0] - self.window.left, self._pos[1] - self.window.top)
+        if relative == self.trigger and self._next < len(self.frames):
+            self._index = -1  # 舊結果清掉，新結果 latency 秒後出現
+            self._pending = (self.clock() + self.latency, self._next)
+            self._next += 1
+
+    def mouse_down(self):
+        self._log("mouse_down", *self._pos)
+
+    def mouse_up(self):
+        self._log("mouse_up", *self._pos)
+
+    def move_rel(self, dx, dy):
+        self._pos = (self._pos[0] + dx, self._pos[1] + dy)
+        self._log("move_rel", dx, dy)
+
+    def press(self, key):
+        self._log("press", key)
+
+    def key_down(self, key):
+        self._log("key_down", key)
+
+    def key_up(self, key):
+        self._log("key_up", key)
+
+    def paste(self, text):
+        self._log("paste", text)
+
+# ==========================================
+# 📏 量測
+# ==========================================
+def load_labeled(sample_dir):
+    """
+    <價格>-<數量>_<編號>.png → (BGRA 影像, 價格, 數量 or None)；價格可含逗號。
+    """
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.png"))):
+        label = label_from_filename(path).replace(",", "")
+        price, _, amount = label.partition("-")
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None or not price.isdigit() or (amount and not amount.isdigit()):
+            continue
+        if img.ndim == 2 or img.shape[2] == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA if img.ndim == 2 else cv2.COLOR_BGR2BGRA)
+        samples.append((img, int(price), int(amount) if amount else None))
+    return samples
+
+class _RecordingDB:
+    def __init__(self):
+        self.saved = {}
+
+    def save(self, name, attr, price, extra=None):
+        self.saved[name] = (price, extra)
+        return True
+
+    def close(self, timeout=0):
+        return 0
+
+def benchmark(sample_dir, template_dir=TEMPLATE_DIR, use_easyocr=True, latency=0.2, telemetry_path=None):
+    """
+    每張截圖當作一個物品，用 ReplayBackend 跑 ToramBot 的完整流程 (分組模式、同步辨識)。
+    :return: {"items", "cycle": 每物品秒數, "waited": 等待的虛擬秒數, "ocr_ms", "correct", "wrong", "rejected", "inputs", "failures"}
+    """
+    import toram_bot
+    from digit_ocr import DigitRecognizer
+    from market_session import MarketSession
+    from telemetry import Telemetry
+
+    samples = load_labeled(sample_dir)
+    if not samples:
+        return None
+    backend = ReplayBackend([img for img, *_ in samples], toram_bot.COORDS["BTN_CONFIRM_SEARCH"], latency=latency)
+    items = [
+        {"search_text": f"item{i}", "save_as": f"item{i}", "attr": "bench", "slot": "-" if amount else 2, "mode": "normal"}
+        for i, (_, _, amount) in enumerate(samples)
+    ]
+    # 數量欄位有標註的是一般物品，沒有的當作單一數量物品 (只讀價格)；兩種各自一組
+    order = sorted(range(len(items)), key=lambda i: items[i]["slot"] != "-")
+    backend.frames = [backend.frames[i] for i in order]
+    samples = [samples[i] for i in order]
+    items = [items[i] for i in order]
+
+    db = _RecordingDB()
+    telemetry = Telemetry(telemetry_path, clock=backend.clock)
+    with contextlib.redirect_stdout(open(os.devnull, "w", encoding="utf-8")):
+        bot = toram_bot.ToramBot(backend=backend, db=db, telemetry=telemetry)
+        bot.digits = DigitRecognizer(template_dir, fallback=bot.easyocr_fallback if use_easyocr else None)
+        ocr_ms = []
+        recognize = bot.recognize
+        def timed_recognize(images, binaries=None, item=None):
+            t0 = time.perf_counter()
+            try:
+                return recognize(images, binaries, item)
+            finally:
+                ocr_ms.append((time.perf_counter() - t0) * 1000)
+        bot.recognize = timed_recognize
+
+        session = MarketSession(bot, clock=backend.clock, telemetry=telemetry)
+        start_virtual = backend.virtual
+        session.run(items, bot.record_price)
+    telemetry.close()
+
+    correct = wrong = rejected = 0
+    for item, (_, price, amount) in zip(items, samples):
+        expected = price // (amount or 1)
+        got = db.saved.get(item["save_as"], (None,))[0]
+        correct += got == expected
+        wrong += got is not None and got != expected
+        rejected += got is None
+    return {
+        "items": len(items), "cycle": list(session.item_seconds.values()), "waited": backend.virtual - start_virtual,
+        "ocr_ms": ocr_ms, "correct": correct, "wrong": wrong, "rejected": rejected, "inputs": len(backend.events),
+        "failures": session.failures,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抓價機後端：重播量測")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="用標註好的視窗截圖量測每物品時間、OCR 延遲與準確率")
+    p_bench.add_argument("sample_dir")
+    p_bench.add_argument("--templates", default=TEMPLATE_DIR)
+    p_bench.add_argument("--no-easyocr", action="store_true")
+    p_bench.add_argument("--latency", type=float, default=0.2, help="搜尋結果出現前的延遲 (虛擬秒數)")
+    p_bench.add_argument("--telemetry", help="同時寫出逐步計時 JSONL (python telemetry.py summary 查看)")
+    args = parser.parse_args(argv)
+
+    r = benchmark(args.sample_dir, args.templates, not args.no_easyocr, args.latency, args.telemetry)
+    if r is None:
+        print(f"❌ {args.sample_dir} 沒有標註好的截圖 (檔名格式: <價格>-<數量>_<編號>.png)")
+        return 1
+    n = r["items"]
+    print(f"📂 {n} 個物品 | 輸入事件 {r['inputs']} 個 (每物品 {r['inputs'] / n:.1f})")
+    print(f"⏱️ 每物品 p50 {_percentile(r['cycle'], 50):.2f}s | p95 {_percentile(r['cycle'], 95):.2f}s "
+          f"(其中等待共 {r['waited']:.1f}s，虛擬時間)")
+    print(f"🔢 OCR p50 {_percentile(r['ocr_ms'], 50):.2f} ms | p95 {_percentile(r['ocr_ms'], 95):.2f} ms")
+    print(f"🎯 正確 {r['correct'] / n:.1%} | 錯讀 {r['wrong'] / n:.1%} | 拒讀 {r['rejected'] / n:.1%}")
+    for f in r["failures"]:
+        print(f"   ⏭️ {f['item']} ({f['stage']}): {f['reason']} {f['detail']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# capture.py
+"""
+市場畫面截圖：價格與數量的 ROI 一次截取 (兩個區域的聯集框)，
+截圖 / 灰階 / 二值化都寫進重複使用的緩衝區，各 ROI 只是其中的 numpy view (不複製)。
+
+用法:
+    cap = RegionCapture(sct, {"PRICE_REGION": {...}, "AMOUNT_REGION": {...}})
+    rois = cap.grab(window.left, window.top)        # {名稱: BGRA view}
+    binaries = cap.binary_views                     # {名稱: 二值化 view}，給 DigitRecognizer.read_many
+
+效能檢查 (用錄下來的整個視窗截圖，比較「每個區域各截一次」與「聯集框截一次 + 批次辨識」):
+    python capture.py bench <截圖資料夾> [--templates digit_templates] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from digit_ocr import BINARY_THRESHOLD, DigitRecognizer, TEMPLATE_DIR, _percentile
+
+# 截圖區域 (相對於遊戲視窗)，toram_bot.COORDS 也引用這裡
+AMOUNT_REGION = {"top": 200, "left": 477, "width": 28, "height": 45}
+PRICE_REGION = {"top": 200, "left": 980, "width": 220, "height": 45}
+MARKET_REGIONS = {"PRICE_REGION": PRICE_REGION, "AMOUNT_REGION": AMOUNT_REGION}
+# 搜尋結果每一列掛單的間距 (像素)；第 i 列的區域 = 第一列往下 i × LISTING_PITCH
+LISTING_PITCH = int(os.environ.get("TORAM_LISTING_PITCH", "60"))
+
+def listing_keys(i):
+    """第 i 列掛單的 (價格, 數量) 區域名稱；第 0 列沿用 PRICE_REGION / AMOUNT_REGION。"""
+    return ("PRICE_REGION", "AMOUNT_REGION") if i == 0 else (f"PRICE_REGION_{i}", f"AMOUNT_REGION_{i}")
+
+def listing_regions(depth, pitch=LISTING_PITCH):
+    """前 depth 列掛單的價格 / 數量區域 (同一張截圖裡)。"""
+    regions = {}
+    for i in range(depth):
+        price_key, amount_key = listing_keys(i)
+        regions[price_key] = {**PRICE_REGION, "top": PRICE_REGION["top"] + i * pitch}
+        regions[amount_key] = {**AMOUNT_REGION, "top": AMOUNT_REGION["top"] + i * pitch}
+    return regions
+
+# 等待畫面變化時監看的市場面板 (縮小後輪詢，見 ui_wait.py)
+WATCH_REGION = {"top": 120, "left": 320, "width": 920, "height": 480}
+
+def union_box(regions):
+    """多個 {"top", "left", "width", "height"} 的最小外接框。"""
+    top = min(r["top"] for r in regions)
+    left = min(r["left"] for r in regions)
+    bottom = max(r["top"] + r["height"] for r in regions)
+    right = max(r["left"] + r["width"] for r in regions)
+    return {"top": top, "left": left, "width": right - left, "height": bottom - top}
+
+class RegionCapture:
+    """
+    :param sct: mss.mss() (或任何有 grab(monitor) 且回傳 raw/width/height 的物件)
+    :param regions: {名稱: 相對於遊戲視窗的區域}
+    :param light_text: 淺色字 / 深色底 (與 DigitRecognizer 相同)
+    """
+    def __init__(self, sct, regions, light_text=True):
+        self.sct = sct
+        self.regions = dict(regions)
+        self.box = union_box(self.regions.values())
+        self.mode = cv2.THRESH_BINARY if light_text else cv2.THRESH_BINARY_INV
+
+        h, w = self.box["height"], self.box["width"]
+        self.frame = np.empty((h, w, 4), dtype=np.uint8)
+        self.gray = np.empty((h, w), dtype=np.uint8)
+        self.binary = np.empty((h, w), dtype=np.uint8)
+        self.views = {}
+        self.binary_views = {}
+        for name, r in self.regions.items():
+            y, x = r["top"] - self.box["top"], r["left"] - self.box["left"]
+            rows, cols = slice(y, y + r["height"]), slice(x, x + r["width"])
+            self.views[name] = self.frame[rows, cols]
+            self.binary_views[name] = self.binary[rows, cols]
+        self.timing = {"capture": 0.0, "preprocess": 0.0}
+
+    def grab(self, origin_left=0, origin_top=0):
+        """
+        截一次聯集框，更新緩衝區後回傳各 ROI 的 view。
+        回傳的 view 在下一次 grab 時會被覆寫，需要保留請自行 copy。
+        timing 記下這一次 {"capture": 截圖秒數, "preprocess": 灰階 + 二值化秒數}。
+        """
+        t0 = time.perf_counter()
+        monitor = {
+            "top": origin_top + self.box["top"], "left": origin_left + self.box["left"],
+            "width": self.box["width"], "height": self.box["height"],
+        }
+        shot = self.sct.grab(monitor)
+        raw = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        np.copyto(self.frame, raw)
+        t1 = time.perf_counter()
+        cv2.cvtColor(self.frame, cv2.COLOR_BGRA2GRAY, dst=self.gray)
+        cv2.threshold(self.gray, BINARY_THRESHOLD, 255, self.mode, dst=self.binary)
+        self.timing = {"capture": t1 - t0, "preprocess": time.perf_counter() - t1}
+        return self.views
+
+# ==========================================
+# 📏 效能檢查
+# ==========================================
+class _RecordedScreen:
+    """用錄下來的整個視窗截圖模擬 mss：grab 回傳對應區域的 BGRA bytes。"""
+    class _Shot:
+        def __init__(self, img):
+            self.height, self.width = img.shape[:2]
+            self.raw = img.tobytes()
+
+    def __init__(self):
+        self.frame = None
+        self.grabs = 0
+
+    def grab(self, monitor):
+        self.grabs += 1
+        t, l = monitor["top"], monitor["left"]
+        return self._Shot(self.frame[t:t + monitor["height"], l:l + monitor["width"]])
+
+def benchmark(frame_dir, regions, template_dir=TEMPLATE_DIR, repeat=3):
+    """
+    每張錄下的視窗截圖當作一個物品，比較：
+    - 分開截圖：每個區域各 grab 一次、各自辨識 (原本的 get_number_from_screen 流程)
+    - 聯集截圖：RegionCapture 一次 grab，二值化一次，read_many 批次辨識
+    :return: {"separate": {...}, "union": {...}, "mismatch": 兩種方式結果不同的張數}
+    """
+    paths = sorted(p for p in os.listdir(frame_dir) if p.lower().endswith(".png"))
+    frames = []
+    for p in paths:
+        img = cv2.imread(os.path.join(frame_dir, p), cv2.IMREAD_UNCHANGED)
+        if img is not None:
+            frames.append(img if img.ndim == 3 and img.shape[2] == 4 else cv2.cvtColor(img, cv2.COLOR_BGR2BGRA))
+    recognizer = DigitRecognizer(template_dir)
+    screen = _RecordedScreen()
+    capture = RegionCapture(screen, regions)
+    names = list(regions)
+
+    def separate():
+        values = []
+        for name in names:
+            r = regions[name]
+            shot = screen.grab(r)
+            img = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4).copy()
+            values.append(recognizer.read(img)[0])
+        return values
+
+    def union():
+        views = capture.grab()
+        results = recognizer.read_many([views[n] for n in names], [capture.binary_views[n] for n in names])
+        return [r[0] for r in results]
+
+    report, outputs = {}, {}
+    for label, fn in (("separate", separate), ("union", union)):
+        timings, values = [], []
+        screen.grabs = 0
+        for _ in range(repeat):
+            values = []
+            for frame in frames:
+                screen.frame = frame
+                t0 = time.perf_counter()
+                values.append(fn())
+                timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        outputs[label] = values
+        report[label] = {
+            "items": len(frames), "grabs_per_item": screen.grabs / max(len(frames) * repeat, 1),
+            "p50_ms": _percentile(timings, 50), "p95_ms": _percentile(timings, 95),
+        }
+    report["mismatch"] = sum(a != b for a, b in zip(outputs["separate"], outputs["union"]))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="價格 / 數量 ROI 截圖效能檢查")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="用錄下來的整個視窗截圖比較截圖與辨識時間")
+    p_bench.add_argument("frame_dir")
+    p_bench.add_argument("--templates", default=TEMPLATE_DIR)
+    p_bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.frame_dir, MARKET_REGIONS, args.templates, args.repeat)
+    for label, title in (("separate", "分開截圖"), ("union", "聯集截圖")):
+        r = report[label]
+        print(f"⏱️ {title:<6} {r['items']} 個物品 | 每物品截圖 {r['grabs_per_item']:.0f} 次 | "
+              f"p50 {r['p50_ms']:7.2f} ms | p95 {r['p95_ms']:7.2f} ms")
+    print(f"🔍 兩種方式結果不同: {report['mismatch']} 個")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+import os
+import re
+import glob
+import time
+
+import cv2
+import numpy as np
+
+# ==========================================
+# 1. 設定
+# ==========================================
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "digit_templates")
+GLYPH_SIZE = (16, 24)          # (寬, 高)，所有字形縮放到同一大小再比對
+MATCH_THRESHOLD = 0.80         # 任一字元低於此分數就改用 EasyOCR
+BINARY_THRESHOLD = 120         # 與原本 EasyOCR 前處理相同的門檻
+MIN_GLYPH_HEIGHT_RATIO = 0.55  # 比最高字元矮太多的元件視為逗號 / 雜點
+
+# 檔名不能用的符號改用名稱
+LABEL_NAMES = {",": "comma", "(": "lparen", ")": "rparen"}
+NAME_LABELS = {v: k for k, v in LABEL_NAMES.items()}
+
+# ==========================================
+# 2. 前處理
+# ==========================================
+def to_gray(img):
+    """mss 截圖是 BGRA；存檔再讀回的樣本可能是 BGR 或灰階。"""
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+def binarize(img, light_text=True, out=None):
+    """
+    轉灰階後二值化，字形為 255、背景為 0 (連通元件分析需要前景為白)。
+    :param light_text: 遊戲的價格是淺色字 / 深色底
+    :param out: 重複使用的輸出緩衝區 (與 img 同高寬的 uint8)
+    """
+    mode = cv2.THRESH_BINARY if light_text else cv2.THRESH_BINARY_INV
+    _, bn = cv2.threshold(to_gray(img), BINARY_THRESHOLD, 255, mode, dst=out)
+    return bn
+
+def _split_wide(bn, x, y, w, h, parts):
+    """把黏在一起的字依垂直投影切開：在等分點附近找墨水最少的欄。"""
+    profile = (bn[y:y + h, x:x + w] > 0).sum(axis=0)
+    cuts, step = [0], w / parts
+    for k in range(1, parts):
+        lo, hi = int(k * step - step / 4), int(k * step + step / 4) + 1
+        cuts.append(lo + int(np.argmin(profile[lo:hi])))
+    cuts.append(w)
+    return [[x + a, y, b - a, h] for a, b in zip(cuts, cuts[1:]) if b > a]
+
+def segment_glyphs(bn, aspect=None):
+    """
+    以連通元件切出每個字元，依 x 座標排序。
+    :param aspect: 單一字元的寬高比 (由模板得到)；有提供時，過寬的元件會被視為黏字並切開
+    :return: [(x, y, w, h, glyph_img)]，已濾掉逗號與雜點
+    """
+    n, _, stats, _ = cv2.connectedComponentsWithStats(bn, connectivity=8)
+    boxes = [tuple(stats[i][:4]) for i in range(1, n) if stats[i][cv2.CC_STAT_AREA] >= 3]
+    if not boxes:
+        return []
+
+    # 同一個字被切成上下兩塊 (例如字型中的斷筆) 時，x 範圍重疊就合併
+    boxes.sort(key=lambda b: b[0])
+    merged = [list(boxes[0])]
+    for x, y, w, h in boxes[1:]:
+        mx, my, mw, mh = merged[-1]
+        overlap = min(mx + mw, x + w) - max(mx, x)
+        if overlap >= 0.6 * min(mw, w):
+            nx, ny = min(mx, x), min(my, y)
+            merged[-1] = [nx, ny, max(mx + mw, x + w) - nx, max(my + mh, y + h) - ny]
+        else:
+            merged.append([x, y, w, h])
+
+    max_h = max(b[3] for b in merged)
+    glyphs = [b for b in merged if b[3] >= max_h * MIN_GLYPH_HEIGHT_RATIO]
+    if aspect:
+        expected_w = max_h * aspect
+        split = []
+        for x, y, w, h in glyphs:
+            parts = int(round(w / expected_w))
+            split += _split_wide(bn, x, y, w, h, parts) if w > 1.5 * expected_w and parts > 1 else [[x, y, w, h]]
+        glyphs = split
+    return [(x, y, w, h, bn[y:y + h, x:x + w]) for x, y, w, h in glyphs]
+
+def normalize_glyph(glyph):
+    """縮放到固定大小並保留長寬比 (置中補黑邊)，讓窄的 1 不會被拉寬。"""
+    gw_, gh_ = GLYPH_SIZE
+    h, w = glyph.shape[:2]
+    scale = min(gw_ / w, gh_ / h)
+    resized = cv2.resize(glyph, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    canvas = np.zeros((gh_, gw_), dtype=np.uint8)
+    y0 = (gh_ - resized.shape[0]) // 2
+    x0 = (gw_ - resized.shape[1]) // 2
+    canvas[y0:y0 + resized.shape[0], x0:x0 + resized.shape[1]] = resized
+    return canvas
+
+# ==========================================
+# 3. EasyOCR (後備)
+# ==========================================
+def _easyocr_prepare(img):
+    """原本 get_number_from_screen 的前處理：放大 3 倍、反白二值化、加白邊。"""
+    img = cv2.resize(img, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+    _, bn = cv2.threshold(to_gray(img), BINARY_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    return cv2.copyMakeBorder(bn, 20, 20, 20, 20, cv2.BORDER_CONSTANT, value=[255, 255, 255])
+
+def _to_int(texts):
+    clean_text = re.sub(r'[^\d]', '', "".join(texts))
+    return int(clean_text) if clean_text else None
+
+def easyocr_read_many(reader, imgs):
+    """
+    多個 ROI 一次交給 EasyOCR (readtext_batched)，回傳整數或 None 的 list。
+    batched API 需要同樣大小的影像，所以先以白底補齊到最大尺寸。
+    """
+    # 允許的字符集：數字、括號、逗號、's' (OCR有時會將數字識別成s)
+    allow = '0123456789(),s'
+    bns = [_easyocr_prepare(img) for img in imgs]
+    if len(bns) == 1:
+        return [_to_int(reader.readtext(bns[0], detail=0, allowlist=allow))]
+    h = max(b.shape[0] for b in bns)
+    w = max(b.shape[1] for b in bns)
+    padded = [cv2.copyMakeBorder(b, 0, h - b.shape[0], 0, w - b.shape[1], cv2.BORDER_CONSTANT, value=255) for b in bns]
+    results = reader.readtext_batched(padded, detail=0, allowlist=allow)
+    return [_to_int(texts) for texts in results]
+
+def easyocr_read(reader, img):
+    return easyocr_read_many(reader, [img])[0]
+
+# ==========================================
+# 4. 模板比對辨識器
+# ==========================================
+class DigitRecognizer:
+    """
+    固定字型的數字辨識：連通元件切字 → 與字形模板比對 (OpenCV matchTemplate)。
+    任一字元信心不足或沒有模板時，才交給 fallback (通常是 EasyOCR)。
+
+    用法:
+        rec = DigitRecognizer(fallback=lambda imgs: easyocr_read_many(reader, imgs))
+        value, conf, source = rec.read(img)   # source: "template" / "easyocr" / None
+        results = rec.read_many([price_img, amount_img])  # 信心不足的一起批次交給後備
+
+    :param fallback: 批次後備辨識，接收影像 list、回傳數值 list
+    """
+    def __init__(self, template_dir=TEMPLATE_DIR, threshold=MATCH_THRESHOLD, fallback=None, light_text=True):
+        self.threshold = threshold
+        self.fallback = fallback
+        self.light_text = light_text
+        self.labels, self.templates = [], np.zeros((0, GLYPH_SIZE[1], GLYPH_SIZE[0]), dtype=np.float32)
+        self.aspect = None  # 數字模板的寬高比中位數，用來切開黏字
+        self.load_templates(template_dir)
+        self.stats = {"template": 0, "fallback": 0, "failed": 0}
+
+    def load_templates(self, template_dir):
+        """模板檔名：<標籤>_<編號>.png，例如 7_001.png、comma_000.png。"""
+        labels, templates, aspects = [], [], []
+        for path in sorted(glob.glob(os.path.join(template_dir, "*.png"))):
+            name = os.path.basename(path).rsplit("_", 1)[0]
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            labels.append(NAME_LABELS.get(name, name))
+            templates.append(normalize_glyph(img).astype(np.float32))
+            if name.isdigit() and name != "1":
+                aspects.append(img.shape[1] / img.shape[0])
+        self.labels = labels
+        if templates:
+            self.templates = np.stack(templates)
+        self.aspect = float(np.median(aspects)) if aspects else None
+        return len(labels)
+
+    def _match(self, glyph):
+        """回傳 (標籤, 分數)。以正規化相關係數 (同 TM_CCOEFF_NORMED) 一次比對所有模板。"""
+        g = normalize_glyph(glyph).astype(np.float32)
+        g -= g.mean()
+        t = self.templates - self.templates.mean(axis=(1, 2), keepdims=True)
+        denom = np.sqrt((g ** 2).sum() * (t ** 2).sum(axis=(1, 2)))
+        scores = np.where(denom > 0, (t * g).sum(axis=(1, 2)) / np.maximum(denom, 1e-6), 0)
+        best = int(np.argmax(scores))
+        return self.labels[best], float(scores[best])
+
+    def match_text(self, img, binary=None):
+        """
+        只用模板辨識。
+        :param binary: 已二值化的影像 (例如整張截圖二值化後切出的 view)，可省略
+        :return: (文字, 最低分數)；沒有模板或切不到字時回傳 ("", 0.0)
+        """
+        if not self.labels:
+            return "", 0.0
+        if binary is None:
+            binary = binarize(img, self.light_text)
+        glyphs = segment_glyphs(binary, self.aspect)
+        if not glyphs:
+            return "", 0.0
+        chars, confidence = [], 1.0
+        for *_, glyph in glyphs:
+            label, score = self._match(glyph)
+            chars.append(label)
+            confidence = min(confidence, score)
+        return "".join(chars), confidence
+
+    def read(self, img, binary=None):
+        """
+        :return: (數值 or None, 信心分數, 來源)
+        """
+        return self.read_many([img], None if binary is None else [binary])[0]
+
+    def read_many(self, imgs, binaries=None):
+        """
+        一次辨識多個 ROI：先全部做模板比對，信心不足的再一起批次交給後備。
+        :return: [(數值 or None, 信心分數, 來源)]
+        """
+        binaries = binaries or [None] * len(imgs)
+        results, pending = [], []
+        for i, (img, binary) in enumerate(zip(imgs, binaries)):
+            text, confidence = self.match_text(img, binary)
+            digits = re.sub(r'[^\d]', '', text)
+            if digits and confidence >= self.threshold:
+                self.stats["template"] += 1
+                results.append((int(digits), confidence, "template"))
+            else:
+                results.append((None, confidence, None))
+                pending.append(i)
+
+        if pending and self.fallback is not None:
+            values = self.fallback([imgs[i] for i in pending])
+            for i, value in zip(pending, values):
+                if value is not None:
+                    results[i] = (value, results[i][1], "easyocr")
+        for i in pending:
+            if results[i][0] is None:
+                self.stats["failed"] += 1
+            else:
+                self.stats["fallback"] += 1
+        return results
+
+# ==========================================
+# 5. 從標註好的截圖建立模板
+# ==========================================
+def label_from_filename(path):
+    """
+    截圖檔名以正確文字開頭：12,345,678_001.png → "12,345,678"；
+    括號與逗號可用 LABEL_NAMES 的名稱代替，例如 lparen12rparen_003.png。
+    """
+    label = os.path.basename(path).rsplit("_", 1)[0]
+    for name, ch in NAME_LABELS.items():
+        label = label.replace(name, ch)
+    return label
+
+def build_templates(sample_dir, template_dir=TEMPLATE_DIR, light_text=True, per_label=3):
+    """
+    從標註好的 ROI 截圖切字並存成模板；切出的字數與標籤 (不含逗號) 不符的圖會被略過。
+    :return: 每個標籤存了幾張
+    """
+    os.makedirs(template_dir, exist_ok=True)
+    counts = {}
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.png"))):
+        label = label_from_filename(path).replace(",", "")
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            continue
+        glyphs = segment_glyphs(binarize(img, light_text))
+        if len(glyphs) != len(label):
+            print(f"⚠️ 略過 {os.path.basename(path)}：切出 {len(glyphs)} 個字，標籤有 {len(label)} 個")
+            continue
+        for ch, (*_, glyph) in zip(label, glyphs):
+            if counts.get(ch, 0) >= per_label:
+                continue
+            name = LABEL_NAMES.get(ch, ch)
+            cv2.imwrite(os.path.join(template_dir, f"{name}_{counts.get(ch, 0):03d}.png"), glyph)
+            counts[ch] = counts.get(ch, 0) + 1
+    print(f"✅ 模板已建立: {dict(sorted(counts.items()))}")
+    return counts
+
+# ==========================================
+# 6. 量測：模板 vs EasyOCR (CPU)
+# ==========================================
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def benchmark(sample_dir, template_dir=TEMPLATE_DIR, use_easyocr=True, light_text=True):
+    """
+    對資料夾內標註好的 ROI 截圖逐張辨識，列出每次讀取的延遲與準確率。
+    EasyOCR 以 CPU 執行 (沒有安裝時略過)。
+    """
+    paths = sorted(glob.glob(os.path.join(sample_dir, "*.png")))
+    samples = [(cv2.imread(p, cv2.IMREAD_UNCHANGED), re.sub(r'[^\d]', '', label_from_filename(p))) for p in paths]
+    samples = [(img, label) for img, label in samples if img is not None and label]
+    if not samples:
+        print(f"❌ {sample_dir} 沒有標註好的截圖 (檔名格式: <數字>_<編號>.png)")
+        return
+
+    engines = {}
+    reader = None
+    if use_easyocr:
+        try:
+            import easyocr
+            reader = easyocr.Reader(['en'], gpu=False)
+            engines["EasyOCR (CPU)"] = lambda img: (easyocr_read(reader, img), "easyocr")
+        except ImportError:
+            print("⚠️ 未安裝 easyocr，只量測模板辨識")
+    template_only = DigitRecognizer(template_dir, light_text=light_text)
+    engines["模板 (無後備)"] = lambda img: template_only.read(img)[::2]
+    if reader is not None:
+        hybrid = DigitRecognizer(template_dir, light_text=light_text, fallback=lambda imgs: easyocr_read_many(reader, imgs))
+        engines["模板 + EasyOCR 後備"] = lambda img: hybrid.read(img)[::2]
+
+    print(f"📂 {len(samples)} 張截圖，模板 {len(template_only.labels)} 個")
+    for name, engine in engines.items():
+        engine(samples[0][0])  # 暖機
+        latencies, correct, fallbacks, rejected, wrong = [], 0, 0, 0, 0
+        for img, label in samples:
+            start = time.perf_counter()
+            value, source = engine(img)
+            latencies.append((time.perf_counter() - start) * 1000)
+            correct += value is not None and str(value) == label
+            wrong += value is not None and str(value) != label
+            rejected += value is None
+            fallbacks += source == "easyocr" and name != "EasyOCR (CPU)"
+        # 錯讀 (讀出錯的數字) 比拒讀 (交給後備) 嚴重得多，分開列出
+        print(f"⏱️ {name:<16} 正確 {correct / len(samples):6.1%} | 錯讀 {wrong / len(samples):5.1%} | "
+              f"拒讀 {rejected / len(samples):5.1%} | "
+              f"p50 {_percentile(latencies, 50):7.2f} ms | p95 {_percentile(latencies, 95):7.2f} ms"
+              + (f" | 後備 {fallbacks} 次" if fallbacks else ""))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="數字模板辨識：建立模板 / 量測")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="從標註好的 ROI 截圖建立模板")
+    p_build.add_argument("sample_dir")
+    p_bench = sub.add_parser("bench", help="量測延遲與準確率")
+    p_bench.add_argument("sample_dir")
+    p_bench.add_argument("--no-easyocr", action="store_true")
+    for p in (p_build, p_bench):
+        p.add_argument("--templates", default=TEMPLATE_DIR)
+        p.add_argument("--dark-text", action="store_true", help="深色字 / 淺色底")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build_templates(args.sample_dir, args.templates, light_text=not args.dark_text)
+    else:
+        benchmark(args.sample_dir, args.templates, use_easyocr=not args.no_easyocr, light_text=not args.dark_text)
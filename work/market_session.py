@@ -0,0 +1,317 @@
+# market_session.py
+"""
+市場導航狀態機：把 TARGET_ITEMS 依篩選條件 (洞數、外觀) 分組，
+每組只進一次市場、套一次篩選，組內只換搜尋文字。
+
+狀態:
+    OUTSIDE ──enter(key)──▶ FILTERED(key) ──search(item)──▶ RESULTS(key) ──search(下一個)──▶ RESULTS(key)
+       ▲                                                         │
+       └────────────────────────── leave() (esc) ◀───────────────┘  (換組 / 出錯 / 全部完成)
+
+ui 需要提供 (ToramBot 與 SimulatedMarketUI 都有):
+    press(key, delay)、click(target, delay)、scroll_ui()、input_search(text, custom_pos)
+    verify(step) (選用)：進市場後檢查畫面，不對就丟出 ScreenStateError
+
+快速失敗 (畫面判斷見 screen_state.py)：
+    no_results    仍在購買清單、篩選還在 → 記錄後直接搜下一個，不退出
+    popup         先 esc 關掉彈出視窗，再退出市場重來
+    wrong_screen  退出市場，下一個物品重新進入
+每個失敗的物品都記在 failures：{"item", "stage", "reason", "detail", "seconds"}
+有 telemetry (telemetry.py) 時另外記下每個物品的 enter / navigate 時間與失敗原因
+
+離線比較 (模擬 UI，依原本的固定等待估算時間):
+    python market_session.py bench [--no-results 10]
+"""
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+OUTSIDE, FILTERED, RESULTS = "OUTSIDE", "FILTERED", "RESULTS"
+
+# 洞數篩選要點幾次 BTN_SLOT_CLICK
+SLOT_CLICKS = {0: 1, 1: 2, 2: 3}
+
+class ScreenStateError(Exception):
+    """畫面不是預期的狀態 (state: no_results / popup / wrong_screen，見 screen_state.py)。"""
+    def __init__(self, step, state, detail=""):
+        super().__init__(f"{step}: {state}" + (f" ({detail})" if detail else ""))
+        self.step = step
+        self.state = state
+        self.detail = detail
+
+def filter_key(item):
+    """物品的篩選條件：(洞數, 是否外觀)；洞數 "-" 代表不篩選。"""
+    return item.get("slot", "-"), item.get("mode") == "app"
+
+def group_items(items):
+    """依篩選條件分組，組的順序與組內順序都沿用原本清單第一次出現的順序。"""
+    groups = {}
+    for item in items:
+        groups.setdefault(filter_key(item), []).append(item)
+    return list(groups.items())
+
+class MarketSession:
+    """
+    :param ui: 見模組說明
+    :param per_item: True = 原本的流程 (每個物品都進出市場一次)
+    :param clock: 計算每個物品耗時 (模擬時換成模擬 UI 的累計時間)
+    :param telemetry: telemetry.Telemetry (選用)
+    """
+    def __init__(self, ui, per_item=False, clock=time.perf_counter, telemetry=None):
+        self.ui = ui
+        self.per_item = per_item
+        self.clock = clock
+        self.telemetry = telemetry
+        self.state = OUTSIDE
+        self.key = None
+        self.stats = {"enter": 0, "search": 0, "leave": 0, "failed": 0, "failed_seconds": 0.0}
+        self.failures = []
+        self.item_seconds = {}   # 物品 -> 搜尋到讀完 (或放棄) 的秒數
+
+    # --- 導航 ---
+    def enter(self, key):
+        """從外面進到世界市場、依價格排序，並套用篩選。"""
+        if self.state != OUTSIDE:
+            if self.key == key:
+                return
+            self.leave()
+        ui = self.ui
+        started = self.clock()
+        for delay in (0.2, 0.2, 0.4):  # 最後一下多等 0.2 秒 (原本 f 之後的額外等待)
+            ui.press('f', delay)
+        ui.click("BTN_USE_MARKET", 0.6)
+        ui.click("BTN_BUY_ITEM", 0.1)
+        ui.click("BTN_SORT_PRICE", 0.5)
+        ui.click("BTN_WORLD_MARKET", 0.5)
+        ui.scroll_ui()
+
+        slot, is_app = key
+        for _ in range(SLOT_CLICKS.get(slot, 0)):
+            ui.click("BTN_SLOT_CLICK", 0.3)
+        if is_app:
+            ui.click("BTN_TYPE_APP", 0.4)
+        # 先標記已進市場：檢查失敗時 recover() 才知道要退出
+        self.state, self.key = FILTERED, key
+        if hasattr(ui, "verify"):
+            ui.verify("enter")
+        self.stats["enter"] += 1
+        if self.telemetry:
+            self.telemetry.record("enter", self.clock() - started, slot=str(slot), app=is_app)
+
+    def search(self, item):
+        """在目前的篩選下搜尋物品 (需要時先進市場)。"""
+        key = filter_key(item)
+        if self.state == OUTSIDE or self.key != key:
+            self.enter(key)
+        self.ui.input_search(item["search_text"], item.get("search_pos"))
+        self.state = RESULTS
+        self.stats["search"] += 1
+
+    def leave(self):
+        if self.state == OUTSIDE:
+            return
+        print("🔄 退出")
+        self.ui.press('esc', 1.0)
+        self.state, self.key = OUTSIDE, None
+        self.stats["leave"] += 1
+
+    def reset(self):
+        """出錯後畫面不明：按 esc 回到外面，下一個物品重新進市場。"""
+        self.state = RESULTS
+        self.leave()
+
+    def recover(self, error):
+        """依畫面狀態恢復：空結果不必退出，其他情況退出市場。"""
+        if error.state == "no_results" and self.state != OUTSIDE:
+            self.state = FILTERED
+            return
+        if error.state == "popup":
+            self.ui.press('esc', 0.3)
+        self.reset()
+
+    def _fail(self, item, stage, reason, detail, started):
+        seconds = self.clock() - started
+        self.stats["failed"] += 1
+        self.stats["failed_seconds"] += seconds
+        if self.telemetry:
+            self.telemetry.record("failed", seconds, stage=stage, reason=reason, detail=detail)
+        self.failures.append({"item": item["save_as"], "stage": stage, "reason": reason, "detail": detail, "seconds": seconds})
+
+    # --- 整輪 ---
+    def run(self, items, handle):
+        """
+        依組別掃描。
+        :param handle: handle(item)，在搜尋結果畫面讀取並儲存 (例外只影響該物品)
+        :return: 成功處理的物品數
+        """
+        done = 0
+        for key, group in ([(filter_key(i), [i]) for i in items] if self.per_item else group_items(items)):
+            for item in group:
+                print(f"📍 查詢: {item['save_as']}")
+                started = self.clock()
+                if self.telemetry:
+                    self.telemetry.item = item["save_as"]
+                try:
+                    with self.telemetry.step("navigate") if self.telemetry else contextlib.nullcontext():
+                        self.search(item)
+                    handle(item)
+                    done += 1
+                    self.item_seconds[item["save_as"]] = self.clock() - started
+                except ScreenStateError as e:
+                    print(f"⏭️ {item['save_as']} 略過: {e}")
+                    self._fail(item, e.step, e.state, e.detail, started)
+                    self.item_seconds[item["save_as"]] = self.failures[-1]["seconds"]
+                    self.recover(e)
+                except Exception as e:
+                    print(f"❌ 錯誤: {e}")
+                    self._fail(item, "handle", "error", str(e), started)
+                    self.item_seconds[item["save_as"]] = self.failures[-1]["seconds"]
+                    self.reset()
+                if self.per_item:
+                    self.leave()
+        self.leave()
+        return done
+
+# ==========================================
+# 🧪 模擬 UI
+# ==========================================
+class UIError(Exception):
+    """模擬 UI 收到在目前畫面無效的操作。"""
+
+class SimulatedMarketUI:
+    """
+    模擬遊戲畫面的轉換，檢查操作順序，並依傳入的等待秒數累計時間。
+    searches 記錄每次搜尋時實際生效的 (文字, 洞數, 外觀)，用來確認篩選正確。
+    :param no_results: 搜不到東西的搜尋文字
+    :param fast_fail: True = 有畫面判斷 (verify / 空結果馬上放棄)；False = 原本等到逾時再 OCR
+    """
+    ACTION_COST = 0.1       # 每個滑鼠 / 鍵盤操作本身的時間 (click 的 hover 等)
+    RESULT_TIMEOUT = 2.6    # 原本等價格列出現文字，沒有結果時要等到逾時 (1.3 × 2)
+    FAST_FAIL_WAIT = 0.35   # 空清單維持 screen_state.FAIL_HOLD 加上一次輪詢
+
+    def __init__(self, no_results=(), fast_fail=True):
+        self.no_results = set(no_results)
+        self.fast_fail = fast_fail
+        self.screen = "field"
+        self.f_presses = 0
+        self.elapsed = 0.0
+        self.actions = 0
+        self.searches = []
+        self._reset_filters()
+
+    def _reset_filters(self):
+        self.sorted = self.world = self.scrolled = self.app = False
+        self.slot_clicks = 0
+
+    def _tick(self, delay):
+        self.actions += 1
+        self.elapsed += self.ACTION_COST + delay
+
+    def _expect(self, *screens):
+        if self.screen not in screens:
+            raise UIError(f"畫面 {self.screen} 不能執行此操作 (需要 {screens})")
+
+    def press(self, key, delay=0.2):
+        self._tick(delay)
+        if key == 'f':
+            self._expect("field")
+            self.f_presses += 1
+            if self.f_presses >= 3:
+                self.screen, self.f_presses = "npc_menu", 0
+        elif key == 'esc':
+            self.screen, self.f_presses = "field", 0
+            self._reset_filters()
+
+    def click(self, target, delay=0.2):
+        self._tick(delay)
+        if target == "BTN_USE_MARKET":
+            self._expect("npc_menu")
+            self.screen = "market_menu"
+        elif target == "BTN_BUY_ITEM":
+            self._expect("market_menu")
+            self.screen = "buy_list"
+        elif target == "BTN_SORT_PRICE":
+            self._expect("buy_list")
+            self.sorted = True
+        elif target == "BTN_WORLD_MARKET":
+            self._expect("buy_list")
+            self.world = True
+        elif target == "BTN_SLOT_CLICK":
+            self._expect("buy_list")
+            if not self.scrolled:
+                raise UIError("篩選按鈕在捲動後才看得到")
+            self.slot_clicks += 1
+        elif target == "BTN_TYPE_APP":
+            self._expect("buy_list")
+            if not self.scrolled:
+                raise UIError("篩選按鈕在捲動後才看得到")
+            self.app = True
+
+    def scroll_ui(self):
+        self._tick(0.5)
+        self._expect("buy_list")
+        self.scrolled = True
+
+    def input_search(self, text, custom_pos=None):
+        # BTN_OPEN_INPUT、INPUT_BOX、貼上、Enter、搜尋目標、確認、移開滑鼠
+        for delay in (0.3, 0.3, 0.3, 0.8, 0.3 if custom_pos is None else 0.1, 0.3):
+            self._tick(delay)
+        empty = text in self.no_results
+        self._tick(1.0 if not empty else self.FAST_FAIL_WAIT if self.fast_fail else self.RESULT_TIMEOUT)
+        self._expect("buy_list")
+        if not (self.sorted and self.world):
+            raise UIError("尚未切換到世界市場 / 依價格排序")
+        slot = {v: k for k, v in SLOT_CLICKS.items()}.get(self.slot_clicks, "-")
+        self.searches.append((text, slot, self.app))
+        if empty and self.fast_fail:
+            raise ScreenStateError("search", "no_results")
+
+    def verify(self, step):
+        if self.fast_fail and self.screen != "buy_list":
+            raise ScreenStateError(step, "wrong_screen", self.screen)
+
+def simulate(items, per_item, no_results=(), fast_fail=True):
+    """
+    :param no_results: 搜不到東西的物品 (save_as)；原本的流程會等到逾時、OCR 讀不到才放棄
+    :return: {..., "empty_seconds": 花在這些物品上的秒數}
+    """
+    no_results = set(no_results)
+    ui = SimulatedMarketUI([i["search_text"] for i in items if i["save_as"] in no_results], fast_fail)
+    session = MarketSession(ui, per_item=per_item, clock=lambda: ui.elapsed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        done = session.run(items, handle=lambda item: ui._tick(0.05))  # 原本的流程對空結果也會跑一次 OCR
+    wrong = [
+        text for (text, slot, app), item in zip(ui.searches, items if per_item else [i for _, g in group_items(items) for i in g])
+        if (text, slot, app) != (item["search_text"], *filter_key(item))
+    ]
+    return {
+        "done": done, "seconds": ui.elapsed, "actions": ui.actions, "enter": session.stats["enter"], "wrong_filter": wrong,
+        "empty_seconds": sum(s for name, s in session.item_seconds.items() if name in no_results),
+        "failures": session.failures,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="市場導航模擬")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="以模擬 UI 比較逐項進出市場與分組模式")
+    p_bench.add_argument("--no-results", type=int, default=0, help="每隔幾個物品有一個搜不到 (0 = 全部搜得到)")
+    args = parser.parse_args(argv)
+
+    from toram_bot import TARGET_ITEMS
+    empty = {it["save_as"] for it in TARGET_ITEMS[::args.no_results]} if args.no_results else set()
+    for label, per_item in (("逐項進出", True), ("分組模式", False)):
+        r = simulate(TARGET_ITEMS, per_item, empty)
+        print(f"⏱️ {label}: {r['done']} 個物品 | 進市場 {r['enter']} 次 | 操作 {r['actions']} 次 | "
+              f"估計 {r['seconds']:.0f}s (每物品 {r['seconds'] / max(r['done'], 1):.2f}s)"
+              + (f" | ⚠️ 篩選錯誤 {len(r['wrong_filter'])}" if r["wrong_filter"] else ""))
+    if empty:
+        for label, fast_fail in (("等到逾時", False), ("快速失敗", True)):
+            r = simulate(TARGET_ITEMS, False, empty, fast_fail)
+            print(f"⏭️ {label}: 搜不到的 {len(empty)} 個物品共花 {r['empty_seconds']:.1f}s "
+                  f"(每個 {r['empty_seconds'] / len(empty):.2f}s)，整輪 {r['seconds']:.0f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
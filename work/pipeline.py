@@ -0,0 +1,200 @@
+# pipeline.py
+"""
+抓價流水線：UI 執行緒只負責導航與截圖，辨識與上傳交給背景 worker。
+
+    UI (主執行緒)                    辨識 worker                上傳 worker
+    導航 → 截圖 ──[capture 佇列]──▶ 模板 / EasyOCR ──[upload 佇列]──▶ DataManager.save
+         ↑ 截到就去下一個物品
+
+- 佇列有上限：辨識或上傳跟不上時，submit 會等待 (背壓)，不會無限制吃記憶體
+- 每個截圖都帶著自己的物品資料與序號，辨識 / 上傳的失敗只記在該物品上
+- EasyOCR Reader 不保證執行緒安全，辨識 worker 預設 1 個；上傳是網路 I/O，可以多開
+
+用法:
+    pipe = ScanPipeline(recognize=bot.recognize_price, upload=bot.upload_price)
+    pipe.start()
+    pipe.submit(item, images, binaries)     # 在 UI 執行緒
+    pipe.close()                            # 等所有物品處理完
+    pipe.failures                           # [{"item", "stage", "reason"}]
+
+吞吐量比較 (假 UI / 假辨識 / 假上傳，時間按比例縮小):
+    python pipeline.py bench [--items 60]
+"""
+import sys
+import time
+import queue
+import random
+import argparse
+import threading
+from dataclasses import dataclass, field
+
+CAPTURE_QUEUE_SIZE = 8
+UPLOAD_QUEUE_SIZE = 32
+
+_STOP = object()
+
+@dataclass
+class CapturedItem:
+    seq: int
+    item: dict
+    images: dict                 # 區域 -> ROI (已複製，不會被下一次截圖覆寫)
+    binaries: dict = field(default_factory=dict)
+    captured_at: float = field(default_factory=time.monotonic)
+    price: int = None
+    extra: dict = None           # recognize 可以附上數量 / 掛單深度等資料，跟著上傳
+
+class ScanPipeline:
+    """
+    :param recognize: recognize(captured) -> 單價 or None (None 視為讀取失敗)
+    :param upload: upload(item, price, extra) -> 是否成功
+    """
+    def __init__(self, recognize, upload, recognize_workers=1, upload_workers=2,
+                 capture_queue_size=CAPTURE_QUEUE_SIZE, upload_queue_size=UPLOAD_QUEUE_SIZE):
+        self.recognize = recognize
+        self.upload = upload
+        self.capture_queue = queue.Queue(maxsize=capture_queue_size)
+        self.upload_queue = queue.Queue(maxsize=upload_queue_size)
+        self.recognize_workers = [
+            threading.Thread(target=self._recognize_loop, name=f"recognize-{i}", daemon=True) for i in range(recognize_workers)
+        ]
+        self.upload_workers = [
+            threading.Thread(target=self._upload_loop, name=f"upload-{i}", daemon=True) for i in range(upload_workers)
+        ]
+        self.failures = []
+        self.stats = {"submitted": 0, "recognized": 0, "uploaded": 0, "failed": 0, "blocked": 0.0}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    # --- 生命週期 ---
+    def start(self):
+        for t in self.recognize_workers + self.upload_workers:
+            t.start()
+        return self
+
+    def close(self):
+        """送出結束訊號並等所有物品處理完。"""
+        for _ in self.recognize_workers:
+            self.capture_queue.put(_STOP)
+        for t in self.recognize_workers:
+            t.join()
+        for _ in self.upload_workers:
+            self.upload_queue.put(_STOP)
+        for t in self.upload_workers:
+            t.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- UI 端 ---
+    def submit(self, item, images, binaries=None):
+        """把截圖交給辨識 worker；佇列滿時等待 (記錄在 stats["blocked"])。"""
+        self._seq += 1
+        captured = CapturedItem(self._seq, item, images, binaries or {})
+        t0 = time.monotonic()
+        self.capture_queue.put(captured)
+        with self._lock:
+            self.stats["submitted"] += 1
+            self.stats["blocked"] += time.monotonic() - t0
+        return captured.seq
+
+    # --- worker ---
+    def _fail(self, captured, stage, reason):
+        name = captured.item.get("save_as")
+        print(f"⚠️ {name} {stage}失敗: {reason}")
+        with self._lock:
+            self.stats["failed"] += 1
+            self.failures.append({"seq": captured.seq, "item": name, "stage": stage, "reason": str(reason)})
+
+    def _recognize_loop(self):
+        while True:
+            captured = self.capture_queue.get()
+            if captured is _STOP:
+                return
+            try:
+                captured.price = self.recognize(captured)
+            except Exception as e:
+                self._fail(captured, "辨識", e)
+                continue
+            if not captured.price:
+                self._fail(captured, "辨識", "讀取失敗")
+                continue
+            with self._lock:
+                self.stats["recognized"] += 1
+            self.upload_queue.put(captured)
+
+    def _upload_loop(self):
+        while True:
+            captured = self.upload_queue.get()
+            if captured is _STOP:
+                return
+            try:
+                ok = self.upload(captured.item, captured.price, captured.extra)
+            except Exception as e:
+                ok, reason = False, e
+            else:
+                reason = "上傳回傳失敗"
+            if ok:
+                with self._lock:
+                    self.stats["uploaded"] += 1
+            else:
+                self._fail(captured, "上傳", reason)
+
+# ==========================================
+# 📏 吞吐量比較
+# ==========================================
+def benchmark(n_items=60, nav=0.05, ocr=0.02, upload=0.06, upload_error_rate=0.1, seed=7):
+    """
+    假 UI：每個物品導航 nav 秒；假辨識 ocr 秒；假上傳 upload 秒、upload_error_rate 機率失敗。
+    :return: {"inline": 每分鐘物品數, "pipelined": 每分鐘物品數, "failures": 流水線記錄的失敗數}
+    """
+    items = [{"save_as": f"item{i}"} for i in range(n_items)]
+
+    def make_upload():
+        rng, lock = random.Random(seed), threading.Lock()
+        def fake_upload(item, price, extra=None):
+            time.sleep(upload)
+            with lock:
+                return rng.random() >= upload_error_rate
+        return fake_upload
+
+    def fake_recognize(captured):
+        time.sleep(ocr)
+        return 100 + captured.seq
+
+    # 原本的流程：導航 → 辨識 → 上傳，全部在同一個執行緒
+    fake_upload = make_upload()
+    t0 = time.perf_counter()
+    for i, item in enumerate(items, start=1):
+        time.sleep(nav)
+        price = fake_recognize(CapturedItem(i, item, {}))
+        fake_upload(item, price)
+    inline = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ScanPipeline(fake_recognize, make_upload()) as pipe:
+        for item in items:
+            time.sleep(nav)
+            pipe.submit(item, {})
+    pipelined = time.perf_counter() - t0
+    return {
+        "inline": n_items / inline * 60, "pipelined": n_items / pipelined * 60,
+        "failures": len(pipe.failures), "uploaded": pipe.stats["uploaded"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抓價流水線")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="假 UI / 假上傳的吞吐量比較")
+    p_bench.add_argument("--items", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    r = benchmark(args.items)
+    print(f"⏱️ 同步流程   {r['inline']:7.0f} 物品/分鐘")
+    print(f"⏱️ 流水線     {r['pipelined']:7.0f} 物品/分鐘 (上傳成功 {r['uploaded']}，失敗 {r['failures']})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+# price_guard.py
+"""
+OCR 價格合理性檢查：每個物品依近期成交算出價格帶，讀到的單價落在帶外才重新讀取。
+
+常見的錯讀 (少讀一個千分位後的數字、把 s 讀成數字) 都是差了約 10 倍，
+價格帶 = 近期中位數 ×/÷ max(BAND_MIN_FACTOR, e^(BAND_K × 對數價格的 MAD))，正常讀取不受影響。
+
+帶外的讀數 (見 ToramBot.validate):
+    1. 同步模式先重新截圖再讀一次 (畫面可能還沒畫完)
+    2. 再用 EasyOCR 讀同一張截圖；落在帶內就用它
+    3. EasyOCR 與模板讀到同一個數字 → 視為真的暴漲 / 暴跌 (confirmed)，照常上傳，並把價格帶放寬
+    4. 最近 REPEAT_WINDOW 內另外 REPEAT_SCANS 輪掃描也讀到相近的帶外價格 → 視為行情真的變了 (repeated)，照常上傳
+       (EasyOCR 不能用或讀數略有差異時，價格帶要等舊資料滑出視窗才會跟上，這樣才不會整週沒有資料)
+    5. 都不行 → 不上傳 (rejected)，ROI 存到 .cache/price_rejects/ 方便建模板
+
+每一筆最後仍在帶外的讀數 (confirmed / repeated / rejected) 都記在 .cache/price_rejects.jsonl，
+下一輪啟動時讀回來做第 4 步的比對。價格帶快取在 .cache/price_bands.json (BAND_MAX_AGE 內不重新讀取歷史資料)。
+
+用法:
+    python price_guard.py bands [--item 物品]        # 目前的價格帶
+    python price_guard.py evaluate                  # 用歷史資料模擬 10 倍錯讀，量測攔截率與誤擋率
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+BAND_WINDOW = pd.Timedelta(days=7)
+BAND_MIN_POINTS = 5         # 少於此筆數不建立價格帶 (不檢查)
+BAND_K = 4.0                # 對數價格 MAD 的倍數
+BAND_MIN_FACTOR = 2.5       # 價格帶至少是中位數 ×/÷ 2.5
+BAND_CACHE = os.environ.get("TORAM_PRICE_BANDS", os.path.join(".cache", "price_bands.json"))
+BAND_MAX_AGE = 6 * 3600
+REJECT_DIR = os.path.join(".cache", "price_rejects")
+REPEAT_WINDOW = 24 * 3600   # 帶外讀數在這段時間內重複出現才算數
+REPEAT_SCANS = 2            # 之前至少幾輪掃描讀到相近的帶外價格
+REPEAT_TOLERANCE = 0.15     # 「相近」= 差距在 ±15% 內
+
+@dataclass
+class PriceBand:
+    median: float
+    low: float
+    high: float
+    points: int
+
+def build_bands(df, now, window=BAND_WINDOW, min_points=BAND_MIN_POINTS):
+    """
+    :param df: 至少有 時間 / 物品 / 單價 欄位
+    :return: {物品: PriceBand}
+    """
+    bands = {}
+    if df.empty:
+        return bands
+    recent = df[(df['時間'] >= now - window) & (df['時間'] <= now) & (df['單價'] > 0)]
+    for item, prices in recent.groupby('物品', sort=False)['單價']:
+        if len(prices) < min_points:
+            continue
+        logs = np.log(prices.to_numpy(dtype=float))
+        center = float(np.median(logs))
+        mad = float(np.median(np.abs(logs - center))) * 1.4826
+        width = max(math.log(BAND_MIN_FACTOR), BAND_K * mad)
+        bands[item] = PriceBand(math.exp(center), math.exp(center - width), math.exp(center + width), len(prices))
+    return bands
+
+def load_bands(path=BAND_CACHE, max_age=BAND_MAX_AGE, df=None):
+    """快取夠新就直接用；否則從歷史資料重算並寫回快取，讀不到歷史資料時沿用舊快取。"""
+    cached = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        cached = {k: PriceBand(**v) for k, v in data["bands"].items()}
+        if df is None and time.time() - data["built_at"] < max_age:
+            return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    from scheduler import load_history, taipei_now
+    df = load_history() if df is None else df
+    if df is None or df.empty:
+        print(f"⚠️ 沒有歷史資料，價格帶沿用快取 ({len(cached)} 個物品)")
+        return cached
+    bands = build_bands(df, taipei_now())
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"built_at": time.time(), "bands": {k: asdict(v) for k, v in bands.items()}}, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"⚠️ 價格帶快取寫入失敗: {e}")
+    return bands
+
+def load_outliers(path, window=REPEAT_WINDOW):
+    """price_rejects.jsonl 中最近 window 秒內的帶外讀數。"""
+    cutoff = time.time() - window
+    records = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("epoch", 0) >= cutoff:
+                    records.append(record)
+    except OSError:
+        pass
+    return records
+
+class PriceGuard:
+    """
+    :param bands: {物品: PriceBand}；沒有價格帶的物品一律視為合理
+    :param reject_dir: 帶外讀數的 ROI 存放處，紀錄寫在旁邊的 price_rejects.jsonl (None = 只留在記憶體)
+    :param scan: 這一輪的編號 (repeated 只算其他輪的紀錄)
+    """
+    def __init__(self, bands=None, reject_dir=REJECT_DIR, scan=None):
+        self.bands = dict(bands or {})
+        self.reject_dir = reject_dir
+        self.scan = scan or time.strftime("%Y%m%d-%H%M%S")
+        self.rejected = []
+        self.outliers = load_outliers(self.log_path) if reject_dir else []
+        self.stats = {"checked": 0, "suspect": 0, "reread": 0, "confirmed": 0, "repeated": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def log_path(self):
+        return os.path.join(os.path.dirname(self.reject_dir) or ".", "price_rejects.jsonl") if self.reject_dir else None
+
+    def plausible(self, name, price):
+        band = self.bands.get(name)
+        return band is None or band.low <= price <= band.high
+
+    def check(self, name, price):
+        """第一次讀數的檢查 (計入統計)。"""
+        ok = self.plausible(name, price)
+        with self._lock:
+            self.stats["checked"] += 1
+            self.stats["suspect"] += not ok
+        return ok
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def widen(self, name, price):
+        """確認過的暴漲 / 暴跌：放寬價格帶，同一輪不會再擋。"""
+        band = self.bands.get(name)
+        if band:
+            self.bands[name] = PriceBand(band.median, min(band.low, price), max(band.high, price), band.points)
+
+    def repeated(self, name, price, window=REPEAT_WINDOW, scans=REPEAT_SCANS, tolerance=REPEAT_TOLERANCE):
+        """最近 window 秒內，另外至少 scans 輪掃描也讀到與 price 相近的帶外價格。"""
+        cutoff = time.time() - window
+        with self._lock:
+            seen = {
+                r["scan"] for r in self.outliers
+                if r["item"] == name and r["scan"] != self.scan and r.get("epoch", 0) >= cutoff
+                and r["price"] and abs(r["price"] - price) <= tolerance * price
+            }
+        return len(seen) >= scans
+
+    def record(self, name, price, reads, outcome, images=None):
+        """
+        記錄最後仍在帶外的讀數 (confirmed / repeated / rejected)；rejected 的 ROI 另存圖檔。
+        :param reads: 各次讀取的結果，例如 {"template": 12345, "recapture": 12345, "easyocr": None}
+        """
+        band = self.bands.get(name)
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"), "epoch": round(time.time(), 3), "scan": self.scan,
+            "item": name, "price": price, "outcome": outcome, "reads": reads,
+            "band": [round(band.low), round(band.high)] if band else None,
+        }
+        with self._lock:
+            self.stats[outcome] += 1
+            self.outliers.append(record)
+            if outcome == "rejected":
+                self.rejected.append(record)
+            if not self.reject_dir:
+                return record
+            try:
+                os.makedirs(self.reject_dir, exist_ok=True)
+                if images and outcome == "rejected":
+                    import cv2
+                    stamp = time.time_ns()
+                    for key, img in images.items():
+                        cv2.imwrite(os.path.join(self.reject_dir, f"{price}_{key}_{stamp}.png"), img)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"⚠️ 帶外讀數紀錄寫入失敗: {e}")
+        return record
+
+# ==========================================
+# 🧪 用歷史資料評估
+# ==========================================
+def misreads(price):
+    """常見的 OCR 錯讀：少一位數 (÷10)、多一位數 (×10 + 末位雜訊)。"""
+    price = int(price)
+    return [v for v in (price // 10, price * 10 + 5) if v > 0]
+
+def evaluate(df, train_ratio=0.7):
+    """
+    每個物品依時間切開：前段建價格帶，後段的真實價格算誤擋率，後段價格的錯讀版本算攔截率。
+    :return: {"items", "genuine", "false_reject", "corrupted", "caught"}
+    """
+    genuine = false_reject = corrupted = caught = items = 0
+    for item, group in df.sort_values('時間').groupby('物品', sort=False):
+        split = int(len(group) * train_ratio)
+        train, test = group.iloc[:split], group.iloc[split:]
+        bands = build_bands(train, train['時間'].max(), window=pd.Timedelta(days=3650))
+        if item not in bands or test.empty:
+            continue
+        guard = PriceGuard(bands, reject_dir=None)
+        items += 1
+        for price in test['單價']:
+            genuine += 1
+            false_reject += not guard.plausible(item, price)
+            for wrong in misreads(price):
+                corrupted += 1
+                caught += not guard.plausible(item, wrong)
+    return {"items": items, "genuine": genuine, "false_reject": false_reject, "corrupted": corrupted, "caught": caught}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR 價格合理性檢查")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bands = sub.add_parser("bands", help="目前的價格帶")
+    p_bands.add_argument("--item")
+    p_bands.add_argument("--refresh", action="store_true", help="忽略快取，重新讀取歷史資料")
+    sub.add_parser("evaluate", help="用歷史資料模擬錯讀，量測攔截率與誤擋率")
+    args = parser.parse_args(argv)
+
+    if args.command == "bands":
+        bands = load_bands(max_age=0 if args.refresh else BAND_MAX_AGE)
+        for name, b in sorted(bands.items()):
+            if args.item and args.item not in name:
+                continue
+            print(f"{name:<16} 中位數 {b.median:>12,.0f} | {b.low:>12,.0f} ~ {b.high:>12,.0f} ({b.points} 筆)")
+        print(f"📏 {len(bands)} 個物品有價格帶")
+        return 0
+
+    from scheduler import load_history
+    r = evaluate(load_history())
+    if not r["genuine"]:
+        print("❌ 歷史資料不足")
+        return 1
+    print(f"📂 {r['items']} 個物品 | 真實價格 {r['genuine']} 筆 | 模擬錯讀 {r['corrupted']} 筆")
+    print(f"🎯 錯讀攔截 {r['caught'] / r['corrupted']:.1%} | 真實價格誤擋 {r['false_reject'] / r['genuine']:.2%} (會多讀一次)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
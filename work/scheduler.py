@@ -0,0 +1,222 @@
+# scheduler.py
+"""
+依波動度安排掃描：波動大的物品更新得比較勤，平穩的物品久久掃一次，每一輪都在時間預算內。
+
+每個物品：
+- 波動度 = 最近 VOL_WINDOW 內逐筆價格的對數報酬標準差
+- 目標更新間隔 = BASE_INTERVAL × REF_VOL / 波動度，限制在 [MIN_INTERVAL, MAX_INTERVAL]；
+  日報看板上的物品間隔減半；資料不足 (新物品) 用 MIN_INTERVAL
+- 急迫度 = 距離上一筆成交的時間 / 目標間隔 (≥ 1 代表該掃了)
+
+每一輪依急迫度由高到低挑選 (同分依 TARGET_ITEMS 順序)，累計估計時間直到用完預算，
+再依篩選條件分組 (配合 market_session 的分組模式)。同樣的輸入一定得到同樣的順序。
+
+用法:
+    python scheduler.py plan --budget 1800              # 用目前資料排出這一輪
+    python scheduler.py simulate --budget 240 --hours 48 # 與固定順序比較各波動分組的掃描次數
+"""
+import os
+import sys
+import json
+import math
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from market_session import filter_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 🔴 與儀表板相同的 Google Sheet CSV 連結 (設定 INGEST_URL 時改讀本機收價服務)
+SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQtSvfsvYpDjQutAO9L4AV1Rq8XzZAQEAZcLZxl9JsSvxCo7X2JsaFTVdTAQwGNQRC2ySe5OPJaTzp9/pub?gid=915078159&single=true&output=csv"
+
+VOL_WINDOW = pd.Timedelta(days=3)
+REF_VOL = 0.02                          # 逐筆報酬標準差 2% 對應 BASE_INTERVAL
+BASE_INTERVAL = pd.Timedelta(hours=6)
+MIN_INTERVAL = pd.Timedelta(hours=1)
+MAX_INTERVAL = pd.Timedelta(hours=48)
+HIGHLIGHT_FACTOR = 0.5
+ITEM_COST = 4.5                         # 分組模式下每個物品的估計秒數 (market_session bench)
+GROUP_COST = 6.0                        # 每組進市場、套篩選的估計秒數
+
+@dataclass
+class ItemPlan:
+    index: int                  # 在 TARGET_ITEMS 中的位置
+    item: dict
+    volatility: float           # NaN = 資料不足
+    interval: pd.Timedelta
+    age: pd.Timedelta           # 距離上一筆成交 (從未成交 = None)
+    urgency: float
+    highlighted: bool = False
+
+def item_stats(df, now, window=VOL_WINDOW):
+    """
+    :param df: 至少有 時間 / 物品 / 單價 欄位
+    :return: {物品: (波動度, 最後成交時間)}
+    """
+    stats = {}
+    if df.empty:
+        return stats
+    last_seen = df.groupby('物品')['時間'].max()
+    recent = df[(df['時間'] >= now - window) & (df['時間'] <= now)]
+    for item, group in recent.groupby('物品', sort=False):
+        prices = group['單價'].to_numpy(dtype=float)
+        prices = prices[prices > 0]
+        returns = np.diff(np.log(prices)) if len(prices) > 2 else np.array([])
+        stats[item] = (float(returns.std(ddof=1)) if len(returns) > 1 else math.nan, last_seen[item])
+    for item, seen in last_seen.items():
+        stats.setdefault(item, (math.nan, seen))
+    return stats
+
+def target_interval(volatility, highlighted=False):
+    if math.isnan(volatility):
+        interval = MIN_INTERVAL
+    else:
+        interval = BASE_INTERVAL * (REF_VOL / max(volatility, 1e-6))
+        interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+    return interval * HIGHLIGHT_FACTOR if highlighted else interval
+
+def prioritize(items, stats, now, highlighted=()):
+    """為每個物品算出目標間隔與急迫度，依急迫度 (高→低)、原始順序排序。"""
+    highlighted = set(highlighted)
+    plans = []
+    for i, item in enumerate(items):
+        name = item["save_as"]
+        volatility, seen = stats.get(name, (math.nan, None))
+        is_hot = name in highlighted
+        interval = target_interval(volatility, is_hot)
+        age = None if seen is None else max(now - seen, pd.Timedelta(0))
+        urgency = math.inf if age is None else age / interval
+        plans.append(ItemPlan(i, item, volatility, interval, age, urgency, is_hot))
+    plans.sort(key=lambda p: (-p.urgency, p.index))
+    return plans
+
+def plan_pass(items, stats, now, budget, highlighted=(), item_cost=ITEM_COST, group_cost=GROUP_COST, fill=True):
+    """
+    排出一輪的掃描清單。
+    :param budget: 這一輪可用的秒數
+    :param fill: 該掃的都排完還有預算時，是否繼續排還沒到期的物品
+    :return: (依篩選分組後的物品清單, 被選中的 ItemPlan 清單 (依急迫度))
+    """
+    chosen, groups, spent = [], set(), 0.0
+    for plan in prioritize(items, stats, now, highlighted):
+        if plan.urgency < 1 and not fill:
+            break
+        key = filter_key(plan.item)
+        cost = item_cost + (0 if key in groups else group_cost)
+        if spent + cost > budget:
+            continue  # 換組成本可能讓這個放不下，後面同組的較便宜，繼續找
+        chosen.append(plan)
+        groups.add(key)
+        spent += cost
+
+    # 組的順序依組內最急的物品，組內依急迫度
+    group_rank = {}
+    for rank, plan in enumerate(chosen):
+        group_rank.setdefault(filter_key(plan.item), rank)
+    ordered = sorted(enumerate(chosen), key=lambda x: (group_rank[filter_key(x[1].item)], x[0]))
+    return [p.item for _, p in ordered], chosen
+
+def taipei_now():
+    """資料的時間是不含時區的台灣時間。"""
+    return pd.Timestamp.now(tz="Asia/Taipei").tz_localize(None)
+
+def load_highlights(path=None):
+    """日報狀態快照中所有報告看板上的物品 (reporting/state.py)。"""
+    path = path or os.environ.get("REPORT_STATE_PATH", os.path.join(ROOT, ".cache", "report_state.json"))
+    try:
+        with open(path, encoding="utf-8") as f:
+            boards = json.load(f).get("highlights", {})
+    except (OSError, ValueError):
+        return set()
+    return {h["item"] for board in boards.values() for h in board}
+
+def load_history():
+    """與儀表板相同的資料來源 (INGEST_URL 或試算表 CSV)。"""
+    sys.path.insert(0, ROOT)
+    from utils.preprocess import load_data
+    df, err = load_data(SHEET_URL)
+    if err:
+        print(f"⚠️ 讀取歷史資料失敗: {err}")
+    return df
+
+def plan_scan(items, budget, now=None, df=None):
+    """toram_bot 用：讀資料、排出這一輪的物品清單。"""
+    df = load_history() if df is None else df
+    now = now or taipei_now()
+    ordered, chosen = plan_pass(items, item_stats(df, now), now, budget, load_highlights())
+    due = sum(p.urgency >= 1 for p in chosen)
+    print(f"🗓️ 這一輪掃描 {len(ordered)}/{len(items)} 個物品 (到期 {due} 個，預算 {budget:.0f}s)")
+    return ordered
+
+# ==========================================
+# 🧪 離線模擬
+# ==========================================
+def simulate(items, volatility, hours=48, budget=900, pass_every=pd.Timedelta(hours=1), start=None, static=False):
+    """
+    以固定的每物品波動度模擬 hours 小時：每 pass_every 跑一輪，被掃到的物品產生一筆成交。
+    :param static: True = 原本的固定順序 (每輪從上次停下的地方繼續，同樣的預算)
+    :return: {物品: 掃描次數}
+    """
+    start = start or pd.Timestamp("2026-01-01")
+    rows = [{"時間": start - pd.Timedelta(hours=1), "物品": it["save_as"], "單價": 100.0} for it in items]
+    counts = {it["save_as"]: 0 for it in items}
+    rng = np.random.default_rng(0)
+    cursor = 0
+    for step in range(int(pd.Timedelta(hours=hours) / pass_every)):
+        now = start + step * pass_every
+        if static:
+            picked, groups, spent = [], set(), 0.0
+            while len(picked) < len(items):
+                it = items[cursor]
+                cost = ITEM_COST + (0 if filter_key(it) in groups else GROUP_COST)
+                if spent + cost > budget:
+                    break
+                picked.append(it)
+                groups.add(filter_key(it))
+                spent += cost
+                cursor = (cursor + 1) % len(items)
+        else:
+            df = pd.DataFrame(rows)
+            picked, _ = plan_pass(items, item_stats(df, now), now, budget)
+        for it in picked:
+            name = it["save_as"]
+            counts[name] += 1
+            last = next(r["單價"] for r in reversed(rows) if r["物品"] == name)
+            rows.append({"時間": now, "物品": name, "單價": last * math.exp(rng.normal(0, volatility[name]))})
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="依波動度安排掃描")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_plan = sub.add_parser("plan", help="用目前資料排出這一輪")
+    p_plan.add_argument("--budget", type=float, default=1800)
+    p_sim = sub.add_parser("simulate", help="與固定順序比較各波動分組的掃描次數")
+    p_sim.add_argument("--budget", type=float, default=240)
+    p_sim.add_argument("--hours", type=int, default=48)
+    args = parser.parse_args(argv)
+
+    from toram_bot import TARGET_ITEMS
+    if args.command == "plan":
+        df = load_history()
+        now = taipei_now()
+        _, chosen = plan_pass(TARGET_ITEMS, item_stats(df, now), now, args.budget, load_highlights())
+        for p in chosen:
+            age = "從未" if p.age is None else f"{p.age.total_seconds() / 3600:5.1f}h"
+            vol = "  -  " if math.isnan(p.volatility) else f"{p.volatility:5.1%}"
+            print(f"{p.urgency:6.2f} | 波動 {vol} | 間隔 {p.interval.total_seconds() / 3600:4.1f}h | 距上次 {age}"
+                  f"{' 🔥' if p.highlighted else ''} | {p.item['save_as']}")
+        return 0
+
+    # 波動度：依清單位置分成四組 (0.5% / 1% / 3% / 8%)，比較兩種排程的掃描次數
+    levels = [0.005, 0.01, 0.03, 0.08]
+    volatility = {it["save_as"]: levels[i % 4] for i, it in enumerate(TARGET_ITEMS)}
+    for label, static in (("固定順序", True), ("波動排程", False)):
+        counts = simulate(TARGET_ITEMS, volatility, args.hours, args.budget, static=static)
+        per_level = [np.mean([c for n, c in counts.items() if volatility[n] == v]) for v in levels]
+        print(f"⏱️ {label}: " + " | ".join(f"波動 {v:.1%} 平均 {c:4.1f} 次" for v, c in zip(levels, per_level)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# screen_state.py
+"""
+市場畫面狀態判斷：每一步操作後用幾個小區域的模板 / 直方圖檢查，馬上知道走錯了，
+不必等完所有等待、跑完 OCR 才發現「⚠️ 讀取失敗」。
+
+狀態:
+    results       價格列有數字，可以讀價
+    no_results    搜尋結果清單是空的
+    popup         畫面中央有彈出視窗 (斷線 / 通知 / 確認框)
+    wrong_screen  不在市場購買清單 (標題列對不上)
+    unknown       都不確定 (例如結果還在載入)
+
+所有區域都在 WATCH_REGION 之內：ScreenWaiter 每次輪詢截的那張圖就能直接判斷，不必另外截圖。
+參考圖放在 state_templates/ (從整個視窗截圖切出)，有就檢查，沒有就略過該項：
+    market_header.png   購買清單的標題列，對不上 = wrong_screen (模板比對)
+    popup.png           彈出視窗，直方圖相近 = popup
+    no_results.png      空的結果清單，直方圖相近 = no_results (沒有參考圖時改用「清單區沒有字」)
+
+用法:
+    python screen_state.py record <視窗截圖.png> market_header     # 切出參考圖
+    python screen_state.py check <截圖資料夾>                     # 檔名以狀態開頭，例如 no_results_003.png
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from capture import PRICE_REGION, WATCH_REGION
+from digit_ocr import _percentile
+
+STATE_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_templates")
+
+RESULTS, NO_RESULTS, POPUP, WRONG_SCREEN, UNKNOWN = "results", "no_results", "popup", "wrong_screen", "unknown"
+STATES = (RESULTS, NO_RESULTS, POPUP, WRONG_SCREEN, UNKNOWN)
+
+# 檢查區域 (相對於遊戲視窗，需在 WATCH_REGION 之內；以 get_pos.py 量測)
+HEADER_REGION = {"top": 125, "left": 330, "width": 300, "height": 40}    # 購買清單標題列
+POPUP_REGION = {"top": 300, "left": 480, "width": 400, "height": 160}    # 彈出視窗的位置
+LIST_REGION = {"top": 195, "left": 340, "width": 880, "height": 170}     # 前幾列搜尋結果
+STATE_REGIONS = {"market_header": HEADER_REGION, "popup": POPUP_REGION, "no_results": LIST_REGION}
+
+HEADER_MATCH = 0.75      # 標題列模板的正規化相關係數下限
+HIST_MATCH = 0.90        # 直方圖相關係數下限 (彈出視窗 / 空清單)
+HIST_BINS = 32
+TEXT_THRESHOLD = 120     # 淺色字的二值化門檻 (與 ui_wait.has_text 相同)
+TEXT_RATIO = 0.02        # 價格列字形像素比例下限
+EMPTY_RATIO = 0.003      # 清單區字形像素比例低於此值視為空清單
+FAIL_HOLD = 0.3          # 失敗狀態要連續維持多久才算數 (切換畫面時會短暫出現空清單)
+
+@dataclass
+class ScreenState:
+    state: str
+    detail: str = ""
+
+def crop(frame, region, origin=WATCH_REGION):
+    """從 origin 區域的截圖切出 region (兩者都是視窗座標)。"""
+    top, left = region["top"] - origin["top"], region["left"] - origin["left"]
+    return frame[top:top + region["height"], left:left + region["width"]]
+
+def to_gray(img):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+def gray_hist(img):
+    hist = cv2.calcHist([to_gray(img)], [0], None, [HIST_BINS], [0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+def text_ratio(img, threshold=TEXT_THRESHOLD):
+    _, bn = cv2.threshold(to_gray(img), threshold, 255, cv2.THRESH_BINARY)
+    return cv2.countNonZero(bn) / bn.size
+
+class StateClassifier:
+    """
+    :param template_dir: 參考圖資料夾 (缺少的參考圖對應的檢查會略過)
+    """
+    def __init__(self, template_dir=STATE_TEMPLATE_DIR):
+        self.header = self.popup_hist = self.empty_hist = None
+        header = self._load(template_dir, "market_header")
+        if header is not None:
+            self.header = to_gray(header)
+        popup = self._load(template_dir, "popup")
+        if popup is not None:
+            self.popup_hist = gray_hist(popup)
+        empty = self._load(template_dir, "no_results")
+        if empty is not None:
+            self.empty_hist = gray_hist(empty)
+
+    @staticmethod
+    def _load(template_dir, name):
+        path = os.path.join(template_dir, f"{name}.png")
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED) if os.path.exists(path) else None
+
+    @property
+    def checks(self):
+        """目前啟用的檢查 (沒有參考圖的不列出)。"""
+        names = ["results", "empty_text" if self.empty_hist is None else "no_results"]
+        return names + [n for n, ref in (("popup", self.popup_hist), ("market_header", self.header)) if ref is not None]
+
+    def classify(self, frame, origin=WATCH_REGION):
+        """
+        :param frame: origin 區域的截圖 (預設是 ScreenWaiter 監看的 WATCH_REGION)
+        """
+        # 彈出視窗會蓋住標題列，先檢查
+        if self.popup_hist is not None:
+            score = cv2.compareHist(gray_hist(crop(frame, POPUP_REGION, origin)), self.popup_hist, cv2.HISTCMP_CORREL)
+            if score >= HIST_MATCH:
+                return ScreenState(POPUP, f"直方圖 {score:.2f}")
+        if self.header is not None:
+            region = to_gray(crop(frame, HEADER_REGION, origin))
+            score = float(cv2.matchTemplate(region, self.header, cv2.TM_CCOEFF_NORMED).max())
+            if score < HEADER_MATCH:
+                return ScreenState(WRONG_SCREEN, f"標題列 {score:.2f}")
+
+        if text_ratio(crop(frame, PRICE_REGION, origin)) >= TEXT_RATIO:
+            return ScreenState(RESULTS)
+        listing = crop(frame, LIST_REGION, origin)
+        if self.empty_hist is not None:
+            score = cv2.compareHist(gray_hist(listing), self.empty_hist, cv2.HISTCMP_CORREL)
+            if score >= HIST_MATCH:
+                return ScreenState(NO_RESULTS, f"直方圖 {score:.2f}")
+        elif text_ratio(listing) < EMPTY_RATIO:
+            return ScreenState(NO_RESULTS, "清單區沒有字")
+        return ScreenState(UNKNOWN)
+
+class StateWatch:
+    """
+    給 ScreenWaiter.wait 的條件：出現 results 立即成立；失敗狀態要連續維持 hold 秒才成立。
+    每次等待前呼叫 reset()；last 是最後一次的判斷結果。
+    """
+    def __init__(self, classifier, hold=FAIL_HOLD, clock=time.monotonic):
+        self.classifier = classifier
+        self.hold = hold
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self._since = None
+
+    def __call__(self, frame):
+        current = self.classifier.classify(frame)
+        if current.state == RESULTS:
+            self.last = current
+            return True
+        if current.state == UNKNOWN:
+            self.last, self._since = current, None
+            return False
+        if self.last is None or self.last.state != current.state or self._since is None:
+            self._since = self.clock()
+        self.last = current
+        return self.clock() - self._since >= self.hold
+
+# ==========================================
+# 🧪 參考圖與離線檢查
+# ==========================================
+def record_template(screenshot_path, name, template_dir=STATE_TEMPLATE_DIR):
+    """從整個視窗截圖切出參考圖 (name: market_header / popup / no_results)。"""
+    img = cv2.imread(screenshot_path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"讀不到 {screenshot_path}")
+    os.makedirs(template_dir, exist_ok=True)
+    path = os.path.join(template_dir, f"{name}.png")
+    cv2.imwrite(path, crop(img, STATE_REGIONS[name], {"top": 0, "left": 0}))
+    return path
+
+def check(sample_dir, template_dir=STATE_TEMPLATE_DIR):
+    """
+    對標註好的整個視窗截圖逐張判斷 (檔名以狀態開頭，例如 popup_001.png)。
+    :return: {"total", "correct", "confusion": {(標註, 判斷): 張數}, "p50_ms", "p95_ms"}
+    """
+    classifier = StateClassifier(template_dir)
+    whole = {"top": 0, "left": 0}
+    confusion, latencies = {}, []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.png"))):
+        name = os.path.basename(path)
+        label = next((s for s in STATES if name.startswith(s + "_")), None)
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if label is None or img is None:
+            continue
+        # 與執行時相同：只看 WATCH_REGION 那一塊
+        frame = np.ascontiguousarray(crop(img, WATCH_REGION, whole))
+        t0 = time.perf_counter()
+        state = classifier.classify(frame).state
+        latencies.append((time.perf_counter() - t0) * 1000)
+        confusion[(label, state)] = confusion.get((label, state), 0) + 1
+    total = sum(confusion.values())
+    return {
+        "checks": classifier.checks, "total": total,
+        "correct": sum(n for (label, state), n in confusion.items() if label == state),
+        "confusion": confusion, "p50_ms": _percentile(latencies, 50), "p95_ms": _percentile(latencies, 95),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="市場畫面狀態判斷")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_record = sub.add_parser("record", help="從整個視窗截圖切出參考圖")
+    p_record.add_argument("screenshot")
+    p_record.add_argument("name", choices=sorted(STATE_REGIONS))
+    p_check = sub.add_parser("check", help="對標註好的截圖檢查判斷結果與耗時")
+    p_check.add_argument("sample_dir")
+    for p in (p_record, p_check):
+        p.add_argument("--templates", default=STATE_TEMPLATE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        print(f"✅ 參考圖已存到 {record_template(args.screenshot, args.name, args.templates)}")
+        return 0
+
+    r = check(args.sample_dir, args.templates)
+    if not r["total"]:
+        print(f"❌ {args.sample_dir} 沒有標註好的截圖 (檔名格式: <狀態>_<編號>.png，狀態: {', '.join(STATES)})")
+        return 1
+    print(f"📂 {r['total']} 張截圖 | 啟用的檢查: {', '.join(r['checks'])}")
+    print(f"🎯 正確 {r['correct'] / r['total']:.1%} | p50 {r['p50_ms']:.2f} ms | p95 {r['p95_ms']:.2f} ms")
+    for (label, state), n in sorted(r["confusion"].items()):
+        if label != state:
+            print(f"   ❌ {label} 判成 {state}: {n} 張")
+    return 0 if r["correct"] == r["total"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# telemetry.py
+"""
+抓價機逐步計時：每個物品的每一步寫一行 JSONL，事後用 summary 找出整輪掃描的時間花在哪。
+
+每一行:
+    {"scan": 這一輪的編號, "t": epoch 秒, "item": 物品, "step": 步驟, "ms": 耗時, ...額外欄位}
+
+步驟:
+    enter       進市場、套篩選 (每組一次，記在該組第一個物品)
+    navigate    搜尋一個物品 (含 enter 與其中的等待)
+    wait        其中一次畫面等待 (reason: match / stable / timeout)，已包含在 navigate 內
+    capture     截圖 (聯集框 grab + 複製)
+    preprocess  灰階 + 二值化
+    recognize   辨識 (confidence: 最低信心、fallback: 交給 EasyOCR 的區域數、retries: 重新讀取次數)
+    validate    讀數超出價格帶時的重新讀取 (outcome: reread / confirmed / repeated / rejected，含其中的重新截圖與辨識)
+    upload      寫進上傳 spool
+    failed      放棄這個物品 (stage / reason；ms 是從開始搜尋到放棄，與上面的步驟重疊)
+
+寫入只在記憶體緩衝，一行約數微秒；TORAM_TELEMETRY=0 關閉。
+
+用法:
+    python telemetry.py summary [.cache/telemetry.jsonl] [--scan 編號|all] [--top 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+
+TELEMETRY_PATH = os.environ.get("TORAM_TELEMETRY", os.path.join(".cache", "telemetry.jsonl"))
+STEPS = ("enter", "navigate", "wait", "capture", "preprocess", "recognize", "validate", "upload", "failed")
+NESTED = {"enter", "wait"}   # 已包含在 navigate 裡
+OVERLAPPING = NESTED | {"failed"}   # 不計入物品總時間
+
+class Telemetry:
+    """
+    :param path: None / "0" = 關閉 (所有方法都是空操作)
+    :param clock: step() 計時用 (重播時換成 ReplayBackend.clock)
+    item: UI 執行緒目前處理的物品；背景執行緒 (辨識 / 上傳) 要自己傳 item
+    """
+    def __init__(self, path=TELEMETRY_PATH, scan=None, clock=time.perf_counter):
+        self.enabled = bool(path) and path != "0"
+        self.clock = clock
+        self.scan = scan or time.strftime("%Y%m%d-%H%M%S")
+        self.item = None
+        self._lock = threading.Lock()
+        self._file = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8", buffering=1 << 16)
+        self.path = path
+
+    def record(self, step, seconds, item=None, **fields):
+        if not self.enabled:
+            return
+        row = {"scan": self.scan, "t": round(time.time(), 3), "item": item or self.item, "step": step,
+               "ms": round(seconds * 1000, 2), **fields}
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    @contextlib.contextmanager
+    def step(self, step, item=None, **fields):
+        """計時一段程式；yield 的 dict 可以在區塊內補上額外欄位。"""
+        if not self.enabled:
+            yield fields
+            return
+        start = self.clock()
+        try:
+            yield fields
+        finally:
+            self.record(step, self.clock() - start, item, **fields)
+
+    def close(self):
+        if self._file:
+            with self._lock:
+                self._file.close()
+            self._file, self.enabled = None, False
+
+# ==========================================
+# 📊 統計
+# ==========================================
+def load(path, scan=None):
+    """讀取 JSONL；scan=None 只取最後一輪，"all" 取全部。"""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue  # 程式中斷時最後一行可能不完整
+    if scan is None and rows:
+        scan = rows[-1]["scan"]
+    return rows if scan == "all" else [r for r in rows if r["scan"] == scan]
+
+def summarize(rows, top=10):
+    """
+    :return: {"steps": {步驟: {"count", "total", "p50", "p95", "max"}} (毫秒 / total 秒),
+              "items": [(物品, 總秒數, {步驟: 毫秒})] 由慢到快, "low_confidence": [(物品, 信心)], "failed": [...]}
+    """
+    from digit_ocr import _percentile
+    by_step, per_item, confidence, failed = {}, {}, {}, []
+    for r in rows:
+        by_step.setdefault(r["step"], []).append(r["ms"])
+        if r["step"] == "failed":
+            failed.append(r)
+        if r["step"] in OVERLAPPING or r["item"] is None:
+            continue
+        steps = per_item.setdefault(r["item"], {})
+        steps[r["step"]] = steps.get(r["step"], 0.0) + r["ms"]
+        if r["step"] == "recognize" and r.get("confidence") is not None:
+            confidence[r["item"]] = min(confidence.get(r["item"], 1.0), r["confidence"])
+
+    steps = {}
+    for name in sorted(by_step, key=lambda s: STEPS.index(s) if s in STEPS else len(STEPS)):
+        values = by_step[name]
+        steps[name] = {
+            "count": len(values), "total": sum(values) / 1000,
+            "p50": _percentile(values, 50), "p95": _percentile(values, 95), "max": max(values),
+        }
+    items = sorted(((name, sum(s.values()) / 1000, s) for name, s in per_item.items()), key=lambda x: -x[1])
+    return {
+        "steps": steps, "items": items[:top], "item_count": len(per_item),
+        "low_confidence": sorted(confidence.items(), key=lambda x: x[1])[:top], "failed": failed,
+    }
+
+def _duration(ms):
+    return f"{ms / 1000:.2f}s" if ms >= 1000 else f"{ms:.1f}ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抓價機逐步計時統計")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_sum = sub.add_parser("summary", help="各步驟的百分位數與最慢的物品")
+    p_sum.add_argument("path", nargs="?", default=TELEMETRY_PATH)
+    p_sum.add_argument("--scan", help="這一輪的編號 (預設最後一輪，all = 全部)")
+    p_sum.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到 {args.path}")
+        return 1
+    rows = load(args.path, args.scan)
+    if not rows:
+        print("❌ 沒有紀錄")
+        return 1
+    r = summarize(rows, args.top)
+    scans = sorted({row["scan"] for row in rows})
+    print(f"📂 {len(rows)} 筆紀錄 | {r['item_count']} 個物品 | 掃描 {', '.join(scans)}")
+    print(f"{'步驟':<10} {'次數':>6} {'合計 s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, s in r["steps"].items():
+        nested = " (navigate 內)" if name in NESTED else ""
+        print(f"{name:<10} {s['count']:>6} {s['total']:>9.1f} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['max']:>9.1f}{nested}")
+    waits = [row for row in rows if row["step"] == "wait"]
+    if waits:
+        reasons = {}
+        for row in waits:
+            reasons[row.get("reason")] = reasons.get(row.get("reason"), 0) + 1
+        print("⌛ 等待結束原因: " + " / ".join(f"{k} {v}" for k, v in sorted(reasons.items(), key=str)))
+
+    print(f"🐢 最慢的 {len(r['items'])} 個物品:")
+    for name, total, steps in r["items"]:
+        detail = " | ".join(f"{k} {_duration(v)}" for k, v in sorted(steps.items(), key=lambda x: -x[1]))
+        print(f"   {total:6.2f}s {name}: {detail}")
+    if r["low_confidence"]:
+        print("🔍 辨識信心最低: " + ", ".join(f"{name} {c:.2f}" for name, c in r["low_confidence"]))
+    for row in r["failed"]:
+        print(f"   ❌ {row['item']} ({row.get('stage')}): {row.get('reason')}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
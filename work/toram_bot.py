@@ -1,24 +1,51 @@
-import re
+import os
 import time
 import cv2
 import numpy as np
-import mss
-import pydirectinput
-import easyocr
-import pyperclip
-import pygetwindow as gw
-import requests
 
-# ==========================================
-# 0. 全域加速設定
-# ==========================================
-pydirectinput.PAUSE = 0.01 
+from backends import LiveBackend
+from digit_ocr import DigitRecognizer, easyocr_read_many
+from capture import RegionCapture, AMOUNT_REGION, PRICE_REGION, WATCH_REGION, listing_keys, listing_regions
+from ui_wait import ScreenWaiter
+from screen_state import StateClassifier, StateWatch, NO_RESULTS, POPUP, WRONG_SCREEN
+from market_session import MarketSession, ScreenStateError
+from pipeline import ScanPipeline
+from scheduler import plan_scan
+from telemetry import Telemetry, TELEMETRY_PATH
+from price_guard import PriceGuard, load_bands
+from uploader import SpoolUploader, GoogleFormSink, IngestSink, SPOOL_PATH
 
 # ==========================================
 # 1. 核心設定區
 # ==========================================
 GAME_TITLE = "ToramOnline"
 
+# OCR：先用數字模板比對，信心不足才用 EasyOCR (抓價機沒有 GPU，預設 CPU)
+OCR_GPU = os.environ.get("TORAM_OCR_GPU", "0") == "1"
+# 設定後會把每次截到的 ROI 以「讀到的數字_時間.png」存下，檢查後可用來建立模板 (python digit_ocr.py build <資料夾>)
+ROI_SAMPLE_DIR = os.environ.get("TORAM_ROI_SAMPLE_DIR")
+
+# 等待方式：screen = 偵測畫面變化 (預設)，fixed = 原本的固定 sleep (用來比較整輪掃描時間)
+WAIT_MODE = os.environ.get("TORAM_WAIT_MODE", "screen")
+# 滑鼠移過去到按下的間隔 (遊戲要先偵測到 hover)
+HOVER_DELAY = 0.1 if WAIT_MODE == "fixed" else 0.03
+# 分組模式：同樣篩選條件 (洞數 / 外觀) 的物品只進一次市場；設為 0 回到每個物品都進出市場
+SESSION_MODE = os.environ.get("TORAM_SESSION", "1") == "1"
+# 流水線：UI 截完圖就去下一個物品，辨識與上傳在背景執行緒；設為 0 回到逐項同步處理
+PIPELINE_MODE = os.environ.get("TORAM_PIPELINE", "1") == "1"
+# 設定秒數後改用波動排程：只掃這一輪預算內最該更新的物品 (見 scheduler.py)
+SCAN_BUDGET = os.environ.get("TORAM_SCAN_BUDGET")
+# 每次搜尋讀前幾列掛單 (1 = 只讀最便宜的一列)；多列時一起截圖、批次辨識，上傳時附上數量與掛單深度
+DEPTH_LISTINGS = max(1, int(os.environ.get("TORAM_DEPTH", "1")))
+UPLOAD_WORKERS = int(os.environ.get("TORAM_UPLOAD_WORKERS", "1"))  # 上傳只寫本機 spool，1 個就夠
+# 讀到的單價與近期價格帶比對，不合理才重新讀取，仍不合理就不上傳 (見 price_guard.py)；設為 0 關閉
+PRICE_CHECK = os.environ.get("TORAM_PRICE_CHECK", "1") == "1"
+
+# 本機收價服務 (python -m ingest.server serve)；設定後價格直接送到這裡，儀表板幾秒內就看得到
+INGEST_URL = os.environ.get("TORAM_INGEST_URL")
+# 有收價服務時 Google 表單只是備援鏡像，設為 0 關閉；沒有收價服務時一律送表單
+FORM_MIRROR = os.environ.get("TORAM_FORM_MIRROR", "1") == "1" or not INGEST_URL
+
 GOOGLE_FORM_CONFIG = {
     "URL": "https://docs.google.com/forms/d/e/1FAIpQLSfiHCTUAwRjmdvTbPQaJQ7lttdrwDEclr_pAn--9PtIZ89KxQ/formResponse", 
     "ENTRY_NAME": "entry.1808413303",
@@ -188,52 +215,104 @@ COORDS = {
     "BTN_CONFIRM_SEARCH": (1025, 200),  
     
     # 截圖區域
-    "AMOUNT_REGION": {"top": 200, "left": 477, "width": 28, "height": 45},
-    "PRICE_REGION":  {"top": 200, "left": 980, "width": 220, "height": 45}
+    "AMOUNT_REGION": AMOUNT_REGION,
+    "PRICE_REGION":  PRICE_REGION,
+    "WATCH_REGION":  WATCH_REGION
 }
 
 # ==========================================
 # 3. 數據上傳模組
 # ==========================================
 class DataManager:
+    """
+    價格先寫進本機 spool 就返回，背景執行緒再送出；斷線或中途關閉的資料下次啟動補送 (見 uploader.py)。
+    每個目的地 (收價服務 / Google 表單) 各有一個 spool，互不影響。
+    """
     def __init__(self):
         self.config = GOOGLE_FORM_CONFIG
-        self.session = requests.Session()
+        self.uploaders = []
+        if INGEST_URL:
+            ingest_spool = os.path.join(os.path.dirname(SPOOL_PATH), "ingest_spool.sqlite3")
+            sink = IngestSink(INGEST_URL, token=os.environ.get("INGEST_TOKEN"))
+            self.uploaders.append(SpoolUploader(sink, ingest_spool).start())
+        if FORM_MIRROR:
+            self.uploaders.append(SpoolUploader(GoogleFormSink(self.config)).start())
         
-    def save(self, name, attr, price):
-        form_data = {
-            self.config["ENTRY_NAME"]: name,
-            self.config["ENTRY_ATTR"]: attr,
-            self.config["ENTRY_PRICE"]: str(price)
-        }
-        try:
-            response = self.session.post(self.config["URL"], data=form_data, timeout=3)
-            if response.status_code == 200:
-                print(f"✅ 上傳成功: {name} | ${price:,.0f}")
-            else:
-                print(f"⚠️ 上傳失敗 (Code: {response.status_code})")
-        except Exception as e:
-            print(f"❌ 網路錯誤: {e}")
+    def save(self, name, attr, price, extra=None):
+        """
+        :param extra: {"quantity": 最低價那列的數量, "depth": [[單價, 數量], ...]} (表單只收價格)
+        :return: 是否已收下 (寫進 spool)
+        """
+        return all([u.save(name, attr, price, extra) for u in self.uploaders])
+
+    def close(self, timeout=10.0):
+        """盡量送完；回傳留在 spool 的筆數。"""
+        return sum(u.close(timeout) for u in self.uploaders)
 
 # ==========================================
 # 4. 機器人主程式
 # ==========================================
 class ToramBot:
-    def __init__(self):
+    """
+    :param backend: 視窗 / 輸入 / 截圖 (backends.py)；預設是實際的遊戲視窗，離線量測用 ReplayBackend
+    :param db: 預設 DataManager()
+    :param telemetry: 逐步計時 (telemetry.py)；預設關閉
+    :param guard: 價格合理性檢查 (price_guard.py)；預設不檢查
+    """
+    def __init__(self, backend=None, db=None, telemetry=None, guard=None):
         print("🚀 初始化中... (支援自定義座標版)")
-        self.reader = easyocr.Reader(['en'], gpu=True) 
-        self.db = DataManager()
-        self.sct = mss.mss()
+        self.backend = backend or LiveBackend(GAME_TITLE)
+        self.telemetry = telemetry or Telemetry(None)
+        self.guard = guard or PriceGuard()
+        self.reader = None  # EasyOCR 只在模板信心不足時才載入
+        self.digits = DigitRecognizer(fallback=self.easyocr_fallback)
+        print(f"🔢 數字模板: {len(self.digits.labels)} 個" + ("" if self.digits.labels else " (尚未建立，全部使用 EasyOCR)"))
+        self.db = db or DataManager()
+        self.sct = self.backend.sct
+        # 價格與數量同一列：截一次聯集框，ROI 只是緩衝區裡的 view
+        self.capture = RegionCapture(self.sct, listing_regions(DEPTH_LISTINGS))
+        self.waiter = ScreenWaiter(
+            lambda: self.grab_region("WATCH_REGION"), clock=self.backend.clock, sleep=self.backend.sleep
+        )
+        # 畫面狀態：搜尋後等到有結果，或確定搜不到 / 跳出視窗就馬上放棄 (screen_state.py)
+        self.screen_state = StateClassifier()
+        self.state_watch = StateWatch(self.screen_state, clock=self.backend.clock)
+        print(f"🧭 畫面檢查: {', '.join(self.screen_state.checks)}")
         
-        try:
-            self.window = gw.getWindowsWithTitle(GAME_TITLE)[0]
-            if not self.window.isActive: 
-                self.window.activate()
-                time.sleep(0.5)
-        except IndexError:
+        self.window = self.backend.find_window()
+        if self.window is None:
             print(f"❌ 找不到 '{GAME_TITLE}'")
             exit()
 
+    def grab_region(self, region_key):
+        r = COORDS[region_key]
+        monitor = {
+            "top": self.window.top + r["top"], "left": self.window.left + r["left"],
+            "width": r["width"], "height": r["height"]
+        }
+        return np.asarray(self.sct.grab(monitor))
+
+    def snapshot(self):
+        """操作前的畫面 (固定等待模式不需要)。"""
+        return None if WAIT_MODE == "fixed" else self.waiter.snapshot()
+
+    def settle(self, delay, reference=None, condition=None, condition_region=None):
+        """
+        取代 time.sleep(delay)：畫面穩定或條件成立就繼續，最多等 delay 的兩倍。
+        :param reference: 操作前的 snapshot()
+        :param condition: 例如 self.state_watch；有 condition_region 時改檢查該區域的截圖
+        """
+        if WAIT_MODE == "fixed":
+            self.backend.sleep(delay)
+            self.telemetry.record("wait", delay, reason="fixed")
+            return None
+        grab = (lambda: self.grab_region(condition_region)) if condition_region else None
+        result = self.waiter.wait(condition, reference, timeout=max(delay * 2, 0.5), grab=grab)
+        self.telemetry.record("wait", result.elapsed, reason=result.reason, polls=result.polls)
+        if not result.ok:
+            print(f"⌛ 等待逾時 ({result.elapsed:.2f}s)，照常繼續")
+        return result
+
     # 🛠️ 修改點 1: 讓 click 支援字串(查表) 或 元組(直接座標)
     def click(self, target, delay=0.2): 
         if isinstance(target, str):
@@ -250,10 +329,11 @@ class ToramBot:
         x = self.window.left + rx
         y = self.window.top + ry
         
-        pydirectinput.moveTo(x, y)
-        time.sleep(0.1) 
-        pydirectinput.click()
-        if delay > 0: time.sleep(delay)
+        self.backend.move_to(x, y)
+        self.backend.sleep(HOVER_DELAY)
+        reference = self.snapshot() if delay > 0 else None
+        self.backend.click()
+        if delay > 0: self.settle(delay, reference)
 
     def scroll_ui(self):
         # 這裡也要用 self.window.left/top 因為沒有用 click 函式
@@ -261,24 +341,26 @@ class ToramBot:
         bx = self.window.left + scroll_def[0]
         by = self.window.top + scroll_def[1]
 
-        pydirectinput.moveTo(bx, by + 200)
-        pydirectinput.mouseDown()
+        self.backend.move_to(bx, by + 200)
+        reference = self.snapshot()
+        self.backend.mouse_down()
         for _ in range(5):
-            pydirectinput.moveRel(0, int(-400/5))
-            time.sleep(0.02)
-        pydirectinput.mouseUp()
-        time.sleep(0.5) 
+            self.backend.move_rel(0, int(-400/5))
+            self.backend.sleep(0.02)
+        self.backend.mouse_up()
+        self.settle(0.5, reference)
 
     # 🛠️ 修改點 2: 增加 custom_pos 參數
     def input_search(self, text, custom_pos=None):
         self.click("BTN_OPEN_INPUT", 0.3)
         self.click("INPUT_BOX", 0.3)
-        pyperclip.copy(text)
-        pydirectinput.keyDown('ctrl'); time.sleep(0.1)
-        pydirectinput.press('v'); time.sleep(0.1)
-        pydirectinput.keyUp('ctrl'); time.sleep(0.1)
-        pydirectinput.press('enter')
-        time.sleep(0.8) 
+        self.backend.paste(text)
+        self.backend.key_down('ctrl'); self.backend.sleep(0.1)
+        self.backend.press('v'); self.backend.sleep(0.1)
+        self.backend.key_up('ctrl'); self.backend.sleep(0.1)
+        reference = self.snapshot()
+        self.backend.press('enter')
+        self.settle(0.8, reference)
         
         # 判斷是否使用特例座標
         if custom_pos:
@@ -288,109 +370,281 @@ class ToramBot:
             self.click("BTN_SEARCH_TARGET", 0.3) 
         
         # 確認搜尋按鈕 (右上角那個)
-        self.click("BTN_CONFIRM_SEARCH", 0.3)
+        reference = self.snapshot()
+        self.click("BTN_CONFIRM_SEARCH", 0)
         
-        # 移開滑鼠
-        self.click("MOUSE_RESET", 1.0)
-
-    # 🛠️ 新增修改點：接收 item 參數，判斷是否為單一數量
-    def get_number_from_screen(self, region_key, is_price=False):
-        r = COORDS[region_key]
-        monitor = {
-            "top": self.window.top + r["top"], 
-            "left": self.window.left + r["left"], 
-            "width": r["width"], 
-            "height": r["height"]
-        }
+        # 移開滑鼠，等價格列出現數字 (或確定搜不到 / 跳出視窗)
+        self.click("MOUSE_RESET", 0)
+        self.state_watch.reset()
+        self.settle(1.3, reference, condition=self.state_watch)
+        self.verify("search")
+
+    def verify(self, step):
+        """
+        每一步之後的快速檢查：確定是失敗狀態就丟出 ScreenStateError，由 MarketSession 決定怎麼恢復。
+        搜尋後要有結果；進市場後只要不是彈出視窗 / 錯的畫面就好。判斷不出來 (unknown) 時照常繼續。
+        """
+        current = self.state_watch.last if step == "search" else None
+        current = current or self.screen_state.classify(self.grab_region("WATCH_REGION"))
+        failed = (NO_RESULTS, POPUP, WRONG_SCREEN) if step == "search" else (POPUP, WRONG_SCREEN)
+        if current.state in failed:
+            raise ScreenStateError(step, current.state, current.detail)
+
+    def easyocr_fallback(self, imgs):
+        if self.reader is None:
+            print(f"⏳ 載入 EasyOCR ({'GPU' if OCR_GPU else 'CPU'})...")
+            import easyocr
+            self.reader = easyocr.Reader(['en'], gpu=OCR_GPU)
+        return easyocr_read_many(self.reader, imgs)
+
+    def grab_rois(self, region_keys, copy=False):
+        """
+        截一次聯集框。
+        :param copy: 要交給其他執行緒時複製一份 (緩衝區下一次截圖會被覆寫)
+        :return: ({區域: 影像}, {區域: 二值化影像})
+        """
+        views = self.capture.grab(self.window.left, self.window.top)
+        images = {k: views[k] for k in region_keys}
+        binaries = {k: self.capture.binary_views[k] for k in region_keys}
+        t0 = time.perf_counter()
+        if copy:
+            images = {k: v.copy() for k, v in images.items()}
+            binaries = {k: v.copy() for k, v in binaries.items()}
+        timing = self.capture.timing
+        self.telemetry.record("capture", timing["capture"] + time.perf_counter() - t0, regions=len(region_keys))
+        self.telemetry.record("preprocess", timing["preprocess"])
+        return images, binaries
+
+    def recognize(self, images, binaries=None, item=None):
+        """
+        批次辨識多個區域 (可在背景執行緒呼叫)。
+        :param item: 背景執行緒呼叫時傳入物品名稱 (計時紀錄用)
+        :return: {區域: 數值 or None}
+        """
+        keys = list(images)
+        t0 = time.perf_counter()
+        results = self.digits.read_many(
+            [images[k] for k in keys], [binaries[k] for k in keys] if binaries else None
+        )
+        elapsed = time.perf_counter() - t0
+        print(f"⏱️ OCR {elapsed * 1000:.1f} ms ({len(keys)} 區域)")
+        fallback = sum(source == "easyocr" for _, _, source in results)
+        self.telemetry.record(
+            "recognize", elapsed, item, regions=len(keys), fallback=fallback, retries=int(fallback > 0),
+            confidence=round(min((c for _, c, _ in results), default=0.0), 3),
+            unread=sum(value is None for value, _, _ in results),
+        )
+
+        numbers = {}
+        for key, (value, confidence, source) in zip(keys, results):
+            if source == "easyocr":
+                print(f"🐢 {key} 模板信心不足 ({confidence:.2f})，改用 EasyOCR: {value}")
+            if ROI_SAMPLE_DIR:
+                os.makedirs(ROI_SAMPLE_DIR, exist_ok=True)
+                cv2.imwrite(os.path.join(ROI_SAMPLE_DIR, f"{value}_{time.time_ns()}.png"), images[key])
+            numbers[key] = value
+        return numbers
+
+    def alternate_read(self, images):
+        """模板以外的第二種辨識 (EasyOCR)；沒有安裝或載入失敗時回傳 None。"""
+        keys = list(images)
         try:
-            img = np.array(self.sct.grab(monitor))
-            img = cv2.resize(img, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
-            _, bn = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY_INV)
-            bn = cv2.copyMakeBorder(bn, 20, 20, 20, 20, cv2.BORDER_CONSTANT, value=[255, 255, 255])
-
-            # 允許的字符集：數字、括號、逗號、's' (OCR有時會將數字識別成s)
-            res = self.reader.readtext(bn, detail=0, allowlist='0123456789(),s')
-            if not res: return None
-            
-            full_text = "".join(res)
-            # 清理所有非數字字符
-            clean_text = re.sub(r'[^\d]', '', full_text)
-            
-            if not clean_text: return None
-            return int(clean_text)
-
+            values = self.easyocr_fallback([images[k] for k in keys])
         except Exception as e:
-            print(f"⚠️ 截圖錯誤: {e}")
+            print(f"⚠️ EasyOCR 無法使用: {e}")
             return None
+        return dict(zip(keys, values))
+
+    def validate(self, item, price, extra, images=None, recapture=True):
+        """
+        與近期價格帶比對 (price_guard.py)：正常讀數直接通過，帶外的才重新截圖 / 改用 EasyOCR 再讀。
+        :param images: 原本的 ROI (背景執行緒不能重新截圖，直接交給 EasyOCR)
+        :param recapture: 還停在搜尋結果畫面時先重新截圖再讀一次
+        :return: (單價 or None = 拒絕, extra)
+        """
+        name = item["save_as"]
+        if not price or self.guard.check(name, price):
+            return price, extra
+        band = self.guard.bands[name]
+        print(f"🧐 {name} 讀到 ${price:,}，超出近期價格帶 ${band.low:,.0f} ~ ${band.high:,.0f}，再讀一次")
+        t0 = time.perf_counter()
+        reads, outcome, result = {"template": price}, "rejected", (None, extra)
+        latest = (price, extra)  # 最後一次成功的模板讀數
+        if recapture:
+            try:
+                images, binaries = self.grab_rois(self.price_regions(item), copy=True)
+                again, again_extra = self.quote(item, self.recognize(images, binaries, name))
+            except Exception as e:
+                print(f"⚠️ 重新截圖錯誤: {e}")
+                again = None
+            reads["recapture"] = again
+            if again:
+                latest = (again, again_extra)
+            if again and self.guard.plausible(name, again):
+                outcome, result = "reread", latest
+
+        numbers = self.alternate_read(images) if outcome == "rejected" and images is not None else None
+        if numbers is not None:
+            alt, alt_extra = self.quote(item, numbers)
+            reads["easyocr"] = alt
+            if alt and self.guard.plausible(name, alt):
+                outcome, result = "reread", (alt, alt_extra)
+            elif alt and alt == latest[0]:
+                # 兩種辨識讀到同一個數字：是真的暴漲 / 暴跌
+                outcome, result = "confirmed", (alt, alt_extra)
+
+        if outcome == "rejected" and self.guard.repeated(name, latest[0]):
+            # 前幾輪也讀到差不多的帶外價格：行情真的變了 (價格帶要等舊資料滑出視窗才會跟上)
+            outcome, result = "repeated", latest
+
+        if outcome == "reread":
+            self.guard.count(outcome)
+        else:
+            self.guard.record(name, latest[0], reads, outcome, images)
+        if outcome == "rejected":
+            print(f"🚫 {name} 讀數不合理，不上傳: {reads}")
+        else:
+            if outcome != "reread":
+                self.guard.widen(name, result[0])
+            print(f"✅ {name} 重新讀取: ${result[0]:,} ({outcome})")
+        self.telemetry.record("validate", time.perf_counter() - t0, name, outcome=outcome, retries=len(reads) - 1, price=price)
+        return result
+
+    def read_numbers(self, region_keys):
+        """截一次聯集框，批次辨識多個區域。"""
+        try:
+            return self.recognize(*self.grab_rois(region_keys))
+        except Exception as e:
+            print(f"⚠️ 截圖錯誤: {e}")
+            return {k: None for k in region_keys}
 
-    # 🛠️ 新增修改點：根據 item 判斷是否強制數量為 1
-    def get_unit_price(self, item): 
-        total_price = self.get_number_from_screen("PRICE_REGION", is_price=True)
-        if total_price is None: return None
-        
+    def get_number_from_screen(self, region_key, is_price=False):
+        return self.read_numbers([region_key])[region_key]
+
+    @staticmethod
+    def price_regions(item):
         # 判斷是否為單一數量物品（有洞數限制或外觀）
         is_single_item = (item.get("slot", "-") != "-") or (item.get("mode") == "app")
+        keys = []
+        for i in range(DEPTH_LISTINGS):
+            price_key, amount_key = listing_keys(i)
+            keys += [price_key] if is_single_item else [price_key, amount_key]
+        return keys
+
+    # 🛠️ 新增修改點：根據 item 判斷是否強制數量為 1
+    def get_unit_price(self, item): 
+        # 價格與數量一次截圖、一次辨識
+        return self.unit_price(item, self.read_numbers(self.price_regions(item)))
+
+    def unit_price(self, item, numbers):
+        return self.quote(item, numbers)[0]
+
+    def quote(self, item, numbers):
+        """
+        把辨識結果換算成單價。
+        :return: (最低單價 or None, extra)；extra = {"quantity", "depth": [[單價, 數量], ...]}
+        """
+        is_single_item = "AMOUNT_REGION" not in numbers
+        listings = []
+        for i in range(DEPTH_LISTINGS):
+            price_key, amount_key = listing_keys(i)
+            total_price = numbers.get(price_key)
+            if total_price is None: break  # 沒有更多掛單 (或讀不到)
+
+            if is_single_item:
+                # 強制設定數量為 1
+                amount = 1
+            else:
+                amount = numbers.get(amount_key)
+                if amount is None or amount == 0: amount = 1 
+            listings.append([int(total_price / amount), amount])
 
+        if not listings: return None, None
+        price, amount = listings[0]
         if is_single_item:
-            # 強制設定數量為 1
-            amount = 1
-            print(f"🔎 (單一數量, Slot/外觀) 價格: ${total_price}")
+            print(f"🔎 (單一數量, Slot/外觀) 價格: ${price}")
         else:
-            # 嘗試 OCR 讀取數量
-            amount = self.get_number_from_screen("AMOUNT_REGION")
-            if amount is None or amount == 0: amount = 1 
-            print(f"🔎 價格: ${total_price} / 數量: {amount}")
-            
-        return int(total_price / amount)
+            print(f"🔎 價格: ${numbers['PRICE_REGION']} / 數量: {amount}")
+        extra = {"quantity": amount}
+        if DEPTH_LISTINGS > 1:
+            extra["depth"] = listings
+            print(f"📚 掛單深度 {len(listings)} 列，共 {sum(a for _, a in listings)} 個")
+        return price, extra
+
+    def press(self, key, delay=0.2):
+        reference = self.snapshot()
+        self.backend.press(key)
+        self.settle(delay, reference)
+
+    def record_price(self, item):
+        """在搜尋結果畫面讀價並上傳。"""
+        price, extra = self.quote(item, self.read_numbers(self.price_regions(item)))
+        price, extra = self.validate(item, price, extra)
+
+        if price: self.upload_price(item, price, extra)
+        else: print(f"⚠️ 讀取失敗")
 
-    def run_cycle(self, item):
-        print(f"📍 查詢: {item['save_as']}")
-        
-        for _ in range(3):
-            pydirectinput.press('f'); time.sleep(0.2)
-        time.sleep(0.2) 
-        
-        self.click("BTN_USE_MARKET", 0.6)
-        self.click("BTN_BUY_ITEM", 0.1)
-        self.click("BTN_SORT_PRICE", 0.5)
-        self.click("BTN_WORLD_MARKET", 0.5)
-        self.scroll_ui()
-
-        slot = item.get("slot")
-        clicks = 0
-        if slot == 2: clicks = 3
-        elif slot == 1: clicks = 2
-        elif slot == 0: clicks = 1
-        if clicks > 0:
-            for _ in range(clicks): self.click("BTN_SLOT_CLICK", 0.3)
-
-        if item.get("mode") == "app": self.click("BTN_TYPE_APP", 0.4)
-
-        # 🛠️ 修改點 3: 讀取 item 設定中的 search_pos 並傳遞
-        custom_pos = item.get("search_pos") # 如果沒有設定，會拿到 None
-        self.input_search(item["search_text"], custom_pos)
-        
-        # 🛠️ 修改點 4: 傳入 item 字典給 get_unit_price
-        price = self.get_unit_price(item) 
+    # --- 流水線模式：UI 執行緒只截圖 ---
+    def capture_item(self, pipe, item):
+        """在搜尋結果畫面截圖後交給流水線，不等辨識與上傳。"""
+        images, binaries = self.grab_rois(self.price_regions(item), copy=True)
+        pipe.submit(item, images, binaries)
+
+    def recognize_price(self, captured):
+        numbers = self.recognize(captured.images, captured.binaries, captured.item["save_as"])
+        read, extra = self.quote(captured.item, numbers)
+        # UI 已經離開這個畫面，不能重新截圖，只換 EasyOCR 讀同一張
+        price, captured.extra = self.validate(captured.item, read, extra, captured.images, recapture=False)
+        if read and price is None:
+            raise ValueError(f"讀數 ${read:,} 超出近期價格帶，未上傳")
+        return price
+
+    def upload_price(self, item, price, extra=None):
+        with self.telemetry.step("upload", item["save_as"]) as fields:
+            fields["ok"] = self.db.save(item["save_as"], item.get("attr", "Auto"), price, extra)
+        return fields["ok"]
 
-        if price: self.db.save(item["save_as"], item.get("attr", "Auto"), price)
-        else: print(f"⚠️ 讀取失敗")
-            
-        print("🔄 退出")
-        pydirectinput.press('esc') 
-        time.sleep(1.0)
+    def run_cycle(self, item):
+        """單一物品：進市場、套篩選、搜尋、讀價、退出 (導航細節見 market_session.py)。"""
+        MarketSession(self, per_item=True).run([item], self.record_price)
 
 if __name__ == "__main__":
     print("=== 托蘭機器人 (自定義搜尋按鈕版) ===")
     print("3秒後開始...")
     time.sleep(3)
-    bot = ToramBot()
-    for item in TARGET_ITEMS:
-        try:
-            bot.run_cycle(item)
-            time.sleep(0.5) 
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            pydirectinput.press('esc')
-            time.sleep(1)
\ No newline at end of file
+    telemetry = Telemetry(TELEMETRY_PATH)
+    guard = PriceGuard(load_bands()) if PRICE_CHECK else None
+    if guard:
+        print(f"📏 價格帶: {len(guard.bands)} 個物品")
+    bot = ToramBot(telemetry=telemetry, guard=guard)
+    scan_items = plan_scan(TARGET_ITEMS, float(SCAN_BUDGET)) if SCAN_BUDGET else TARGET_ITEMS
+    session = MarketSession(bot, per_item=not SESSION_MODE, telemetry=telemetry)
+    scan_start = time.perf_counter()
+    if PIPELINE_MODE:
+        with ScanPipeline(bot.recognize_price, bot.upload_price, upload_workers=UPLOAD_WORKERS) as pipe:
+            done = session.run(scan_items, lambda item: bot.capture_item(pipe, item))
+            print(f"🖱️ 導航完成 {time.perf_counter() - scan_start:.1f}s，等待辨識 / 上傳收尾...")
+        print(f"📦 上傳成功 {pipe.stats['uploaded']} / 失敗 {pipe.stats['failed']}")
+        for f in pipe.failures:
+            print(f"   ❌ {f['item']} ({f['stage']}): {f['reason']}")
+            telemetry.record("failed", 0, f["item"], stage=f["stage"], reason=f["reason"])
+    else:
+        done = session.run(scan_items, bot.record_price)
+    if session.failures:
+        print(f"⏭️ 略過 {session.stats['failed']} 個物品，共 {session.stats['failed_seconds']:.1f}s")
+        for f in session.failures:
+            print(f"   ⏭️ {f['item']} ({f['stage']}): {f['reason']} {f['detail']} [{f['seconds']:.1f}s]")
+    if guard and guard.stats["suspect"]:
+        g = guard.stats
+        print(f"🧐 超出價格帶 {g['suspect']} / {g['checked']} 筆：重新讀取成功 {g['reread']}、確認為真 {g['confirmed']}、"
+              f"連續多輪相同 {g['repeated']}、不上傳 {g['rejected']} (見 .cache/price_rejects.jsonl)")
+    bot.db.close()
+    scan_time = time.perf_counter() - scan_start
+    print(f"⏱️ 整輪掃描 {scan_time:.1f}s ({done}/{len(scan_items)} 個物品，平均 {scan_time / max(len(scan_items), 1):.2f}s，"
+          f"等待模式: {WAIT_MODE}，{'分組' if SESSION_MODE else '逐項'}進市場 {session.stats['enter']} 次)")
+    if WAIT_MODE != "fixed":
+        s = bot.waiter.stats
+        print(f"   畫面等待 {s['waited']:.1f}s | 條件成立 {s['match']} / 穩定 {s['stable']} / 逾時 {s['timeout']}")
+    telemetry.close()
+    if telemetry.path and telemetry.path != "0":
+        print(f"📈 逐步計時已寫入 {telemetry.path} (python telemetry.py summary 查看)")
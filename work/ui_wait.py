@@ -0,0 +1,200 @@
+# ui_wait.py
+"""
+畫面變化偵測：取代固定 sleep。
+
+每次操作前先記下監看區域的縮小灰階畫面，操作後輪詢同一區域：
+- 符合指定條件 (例如價格列出現文字) → 立即繼續
+- 畫面變動後連續幾次不再變化 (動畫結束) → 繼續
+- 一直沒有變化：過了 change_grace 仍與操作前相同，視為畫面不需要更新，穩定後繼續
+- 超過 timeout → 回傳 timeout，由呼叫端決定要不要照常進行
+
+用法:
+    waiter = ScreenWaiter(lambda: grab(WATCH_REGION))
+    ref = waiter.snapshot()
+    click(...)
+    result = waiter.wait(reference=ref, timeout=1.2)     # result.reason: match / stable / timeout
+
+離線驗證 (錄下來的畫面序列，檔名為操作後經過的毫秒數，例如 0000.png、0033.png ...):
+    python ui_wait.py replay <序列資料夾> [--fixed 0.6] [--timeout 1.2]
+"""
+import os
+import sys
+import time
+import argparse
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+WATCH_SCALE = 0.125      # 監看區域縮小倍率 (1/8)
+POLL_INTERVAL = 0.03     # 輪詢間隔 (秒)
+STABLE_POLLS = 3         # 連續幾次沒有變化視為穩定
+DIFF_TOLERANCE = 2.0     # 縮小灰階圖的平均絕對差，低於此值視為沒有變化
+CHANGE_GRACE = 0.15      # 操作後多久還沒變化，就當作畫面不會變
+
+@dataclass
+class WaitResult:
+    ok: bool
+    reason: str          # "match" / "stable" / "timeout"
+    elapsed: float
+    polls: int
+
+def shrink(img, scale=WATCH_SCALE):
+    """BGRA / BGR / 灰階 → 縮小的灰階 float32 (INTER_AREA 同時有去雜訊效果)。"""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    h, w = img.shape[:2]
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def frame_diff(a, b):
+    return float(np.mean(np.abs(a - b)))
+
+# ==========================================
+# 🔎 常用條件 (接收原始截圖，回傳 bool)
+# ==========================================
+def has_text(threshold=120, light_text=True, min_ratio=0.02):
+    """區域內有足夠的字形像素，例如搜尋後價格列出現數字。"""
+    mode = cv2.THRESH_BINARY if light_text else cv2.THRESH_BINARY_INV
+    def condition(img):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+        _, bn = cv2.threshold(gray, threshold, 255, mode)
+        return cv2.countNonZero(bn) >= min_ratio * bn.size
+    return condition
+
+def matches_template(template, threshold=0.9):
+    """區域與模板的正規化相關係數 ≥ threshold (模板需與區域同大小或較小)。"""
+    tpl = shrink(template, 1.0)
+    def condition(img):
+        score = cv2.matchTemplate(shrink(img, 1.0), tpl, cv2.TM_CCOEFF_NORMED).max()
+        return score >= threshold
+    return condition
+
+# ==========================================
+# ⏳ 等待
+# ==========================================
+class ScreenWaiter:
+    """
+    :param grab: 無參數函式，回傳監看區域的截圖 (numpy)
+    :param clock / sleep: 可替換成虛擬時鐘，搭配錄下的畫面序列離線驗證
+    """
+    def __init__(self, grab, scale=WATCH_SCALE, interval=POLL_INTERVAL, stable_polls=STABLE_POLLS,
+                 tolerance=DIFF_TOLERANCE, change_grace=CHANGE_GRACE, clock=time.monotonic, sleep=time.sleep):
+        self.grab = grab
+        self.scale = scale
+        self.interval = interval
+        self.stable_polls = stable_polls
+        self.tolerance = tolerance
+        self.change_grace = change_grace
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = {"match": 0, "stable": 0, "timeout": 0, "waited": 0.0}
+
+    def snapshot(self):
+        return shrink(self.grab(), self.scale)
+
+    def wait(self, condition=None, reference=None, timeout=1.0, grab=None):
+        """
+        :param condition: 接收原始截圖的條件函式，成立就立即返回 (可省略)
+        :param reference: 操作前的 snapshot()；有的話先等畫面離開這個狀態再判斷穩定
+        :param grab: 條件要檢查的區域與監看區域不同時，另外提供截圖函式
+        """
+        start = self.clock()
+        previous, still, polls = None, 0, 0
+        changed = reference is None
+        while True:
+            img = self.grab()
+            polls += 1
+            elapsed = self.clock() - start
+            if condition is not None and condition(img if grab is None else grab()):
+                return self._done(True, "match", elapsed, polls)
+
+            small = shrink(img, self.scale)
+            if not changed:
+                changed = frame_diff(small, reference) > self.tolerance or elapsed >= self.change_grace
+            if changed and condition is None:
+                still = still + 1 if previous is not None and frame_diff(small, previous) <= self.tolerance else 0
+                if still >= self.stable_polls - 1:
+                    return self._done(True, "stable", elapsed, polls)
+            previous = small
+
+            if elapsed >= timeout:
+                return self._done(False, "timeout", elapsed, polls)
+            self.sleep(self.interval)
+
+    def _done(self, ok, reason, elapsed, polls):
+        self.stats[reason] += 1
+        self.stats["waited"] += elapsed
+        return WaitResult(ok, reason, elapsed, polls)
+
+# ==========================================
+# 🎞️ 離線驗證：錄下的畫面序列 + 虛擬時鐘
+# ==========================================
+class RecordedFrames:
+    """
+    錄下的畫面序列。frames: [(操作後經過秒數, 影像)]，依時間排序。
+    clock / sleep / grab 共用同一個虛擬時間，grab 回傳當下最後一張已出現的畫面。
+    """
+    def __init__(self, frames):
+        self.frames = sorted(frames, key=lambda f: f[0])
+        self.now = 0.0
+
+    @classmethod
+    def load(cls, folder):
+        frames = []
+        for name in sorted(os.listdir(folder)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() == ".png" and stem.isdigit():
+                frames.append((int(stem) / 1000, cv2.imread(os.path.join(folder, name), cv2.IMREAD_UNCHANGED)))
+        return cls(frames)
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def grab(self):
+        current = self.frames[0][1]
+        for t, img in self.frames:
+            if t > self.now:
+                break
+            current = img
+        return current
+
+    def settled_at(self):
+        """最後一次畫面變化的時間 (理想上最早可以繼續的時間)。"""
+        return self.frames[-1][0]
+
+def replay(folder, fixed=None, timeout=1.2, reference_frame=0, waiter_kwargs=None):
+    """對一段錄下的操作畫面跑 ScreenWaiter，回傳 (WaitResult, 理想等待秒數)。"""
+    rec = RecordedFrames.load(folder)
+    if not rec.frames:
+        raise ValueError(f"{folder} 沒有畫面 (檔名需為毫秒數，例如 0033.png)")
+    waiter = ScreenWaiter(rec.grab, clock=rec.clock, sleep=rec.sleep, **(waiter_kwargs or {}))
+    reference = shrink(rec.frames[reference_frame][1], waiter.scale)
+    return waiter.wait(reference=reference, timeout=timeout), rec.settled_at()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="畫面變化等待的離線驗證")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_replay = sub.add_parser("replay", help="對錄下的畫面序列 (一個或多個資料夾) 模擬等待")
+    p_replay.add_argument("folders", nargs="+")
+    p_replay.add_argument("--fixed", type=float, help="原本的固定等待秒數，用來比較")
+    p_replay.add_argument("--timeout", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    total_wait = total_fixed = 0.0
+    for folder in args.folders:
+        result, settled = replay(folder, timeout=args.timeout)
+        total_wait += result.elapsed
+        total_fixed += args.fixed or 0.0
+        early = " ⚠️ 畫面還沒穩定就繼續" if result.elapsed < settled else ""
+        print(f"🎞️ {os.path.basename(folder.rstrip(os.sep))}: {result.reason} @ {result.elapsed * 1000:.0f} ms "
+              f"({result.polls} 次輪詢，最後變化 {settled * 1000:.0f} ms){early}")
+    if args.fixed is not None:
+        print(f"⏱️ 合計 {total_wait:.2f}s (固定等待 {total_fixed:.2f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
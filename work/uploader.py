@@ -0,0 +1,358 @@
+# uploader.py
+"""
+非同步上傳：save() 只把價格寫進本機 SQLite 佇列 (spool) 就返回，背景執行緒再分批送出。
+
+- 寫入 spool 才算收下：網路斷線、程式被關掉，下次啟動會自動補送
+- 目的地支援批次 (sink.supports_batch) 時一次送一批，否則逐筆送，遇到第一筆失敗就停下等待重試
+- 失敗以指數退避 (含抖動) 重試，不會丟掉任何一筆
+
+用法:
+    uploader = SpoolUploader(GoogleFormSink(GOOGLE_FORM_CONFIG)).start()
+    uploader.save("魔晶獸", "武器王石", 12000)   # 立即返回
+    uploader.close(timeout=10)                    # 盡量送完；沒送完的留在 spool
+
+斷線 / 重啟檢查 (本機會隨機失敗的 HTTP 替身):
+    python uploader.py check [--rows 200] [--error-rate 0.3]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+SPOOL_PATH = os.environ.get("TORAM_SPOOL_PATH", os.path.join(".cache", "upload_spool.sqlite3"))
+BATCH_SIZE = 20
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+
+# ==========================================
+# 🎯 上傳目的地
+# ==========================================
+class GoogleFormSink:
+    """
+    Google 表單一次只能送一筆，時間戳記是表單收到的時間 (補送的資料會記成補送當下)。
+    :return: send_batch 回傳成功送出的筆數 (依序，遇到失敗就停)
+    """
+    supports_batch = False
+
+    def __init__(self, config, timeout=3):
+        self.config = config
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send_batch(self, rows):
+        sent = 0
+        for row in rows:
+            form_data = {
+                self.config["ENTRY_NAME"]: row["name"],
+                self.config["ENTRY_ATTR"]: row["attr"],
+                self.config["ENTRY_PRICE"]: str(row["price"]),
+            }
+            try:
+                response = self.session.post(self.config["URL"], data=form_data, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"❌ 網路錯誤: {e}")
+                break
+            if response.status_code != 200:
+                print(f"⚠️ 上傳失敗 (Code: {response.status_code})")
+                break
+            print(f"✅ 上傳成功: {row['name']} | ${row['price']:,.0f}")
+            sent += 1
+        return sent
+
+class IngestSink:
+    """
+    本機收價服務 (ingest/server.py)：一次送一整批，帶抓價時間與唯一鍵 (重送不會重複寫入)，
+    以及 extra 中的數量與掛單深度。
+    """
+    supports_batch = True
+
+    def __init__(self, base_url, token=None, timeout=5):
+        self.url = base_url.rstrip("/") + "/ticks"
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def send_batch(self, rows):
+        ticks = [
+            {"item": r["name"], "attr": r["attr"], "price": r["price"], "captured_at": r["captured_at"], "uid": r["uid"],
+             **{k: v for k, v in (r["extra"] or {}).items() if k in ("quantity", "depth")}}
+            for r in rows
+        ]
+        try:
+            response = self.session.post(self.url, json=ticks, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"❌ 收價服務連線錯誤: {e}")
+            return 0
+        if response.status_code != 200:
+            print(f"⚠️ 收價服務回傳 {response.status_code}: {response.text[:200]}")
+            return 0
+        print(f"✅ 送出 {len(rows)} 筆到收價服務")
+        return len(rows)
+
+# ==========================================
+# 📦 Spool 上傳器
+# ==========================================
+class SpoolUploader:
+    """
+    :param sink: 有 send_batch(rows) -> 成功筆數 與 supports_batch 的物件
+    :param spool_path: SQLite 檔案；":memory:" 只用於測試 (不具持久性)
+    """
+    def __init__(self, sink, spool_path=SPOOL_PATH, batch_size=BATCH_SIZE,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, seed=None):
+        self.sink = sink
+        self.batch_size = batch_size if sink.supports_batch else 1
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rng = random.Random(seed)
+        if spool_path != ":memory:":
+            os.makedirs(os.path.dirname(spool_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(spool_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, attr TEXT, price REAL NOT NULL,"
+            " extra TEXT, captured_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        # 每個 spool 檔有自己的 id，加上列號就是全域唯一鍵 (收價服務用來去重)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('spool_id', ?)", (uuid.uuid4().hex,))
+        self.spool_id = self.db.execute("SELECT value FROM meta WHERE key = 'spool_id'").fetchone()[0]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+        self._running = False   # 背景執行緒還會用到 db (以 _lock 保護)
+        self._closing = False
+        self.stats = {"queued": 0, "sent": 0, "failures": 0, "replayed": self.pending()}
+        if self.stats["replayed"]:
+            print(f"📦 spool 中有 {self.stats['replayed']} 筆上次未送出的資料，將自動補送")
+
+    # --- 前景 ---
+    def start(self):
+        self._running = True
+        self._thread.start()
+        self._wake.set()
+        return self
+
+    def save(self, name, attr, price, extra=None):
+        """寫入 spool 後立即返回 (不等網路)。"""
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO pending (name, attr, price, extra, captured_at) VALUES (?, ?, ?, ?, ?)",
+                (name, attr, float(price), json.dumps(extra, ensure_ascii=False) if extra else None, time.time()),
+            )
+            self.stats["queued"] += 1
+        self._wake.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def close(self, timeout=10.0):
+        """等 spool 送完 (最多 timeout 秒) 後停止；沒送完的留到下次啟動。"""
+        deadline = time.monotonic() + timeout
+        while self._thread.is_alive() and self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=max(deadline - time.monotonic(), 1.0))
+        left = self.pending()
+        if left:
+            print(f"📦 還有 {left} 筆未送出，已保存在 spool，下次啟動補送")
+        with self._lock:
+            # 還在送的那一批送完後要刪掉 spool 裡的列 (否則下次啟動會重送)：由背景執行緒結束時關閉
+            self._closing = True
+            if not self._running:
+                self.db.close()
+        return left
+
+    # --- 背景 ---
+    def _next_batch(self):
+        with self._lock:
+            cur = self.db.execute(
+                "SELECT id, name, attr, price, extra, captured_at, attempts FROM pending ORDER BY id LIMIT ?",
+                (self.batch_size,),
+            )
+            cols = [c[0] for c in cur.description]
+            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        for row in rows:
+            row["extra"] = json.loads(row["extra"]) if row["extra"] else None
+            row["uid"] = f"{self.spool_id}:{row['id']}"
+        return rows
+
+    def _backoff(self, failures):
+        delay = min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+        return delay * self.rng.uniform(0.5, 1.0)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            with self._lock:
+                self._running = False
+                if self._closing:
+                    self.db.close()
+
+    def _loop(self):
+        failures = 0
+        while not self._stop.is_set():
+            rows = self._next_batch()
+            if not rows:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                sent = self.sink.send_batch(rows)
+            except Exception as e:
+                print(f"❌ 上傳錯誤: {e}")
+                sent = 0
+            with self._lock:
+                if sent:
+                    self.db.executemany("DELETE FROM pending WHERE id = ?", [(r["id"],) for r in rows[:sent]])
+                    self.stats["sent"] += sent
+                if sent < len(rows):
+                    self.db.execute("UPDATE pending SET attempts = attempts + 1 WHERE id = ?", (rows[sent]["id"],))
+            if sent == len(rows):
+                failures = 0
+                continue
+            failures += 1
+            self.stats["failures"] += 1
+            delay = self._backoff(failures)
+            print(f"⏳ 上傳失敗，{delay:.1f}s 後重試 (剩 {self.pending()} 筆)")
+            self._stop.wait(delay)
+
+# ==========================================
+# 🧪 會隨機失敗的本機替身
+# ==========================================
+class FlakyFormServer:
+    """
+    本機 HTTP 伺服器，接受與 Google 表單相同的 form-urlencoded POST，
+    也接受 JSON 陣列 (批次)。依 error_rate 隨機回 503；outage() 期間全部失敗。
+    received 記錄所有收下的資料 (失敗的請求不會寫入)。
+    """
+    def __init__(self, error_rate=0.3, seed=None):
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.received = []
+        self.requests = 0
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/formResponse"
+
+    def outage(self, seconds):
+        self._down_until = time.monotonic() + seconds
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.requests += 1
+                    failed = time.monotonic() < server._down_until or server.rng.random() < server.error_rate
+                    if not failed:
+                        if self.headers.get("Content-Type", "").startswith("application/json"):
+                            server.received += json.loads(body)
+                        else:
+                            server.received.append({k: v[0] for k, v in parse_qs(body.decode()).items()})
+                self.send_response(503 if failed else 200)
+                self.end_headers()
+
+        return Handler
+
+def check(rows=200, error_rate=0.3, seed=3):
+    """
+    模擬：送 rows 筆，中途斷線一段時間、再在還沒送完時關掉程式，
+    重新啟動同一個 spool 後確認每一筆都恰好送達一次。
+    """
+    import io
+    import tempfile
+    import contextlib
+
+    config = {"URL": None, "ENTRY_NAME": "entry.name", "ENTRY_ATTR": "entry.attr", "ENTRY_PRICE": "entry.price"}
+    spool = os.path.join(tempfile.mkdtemp(), "spool.sqlite3")
+    with FlakyFormServer(error_rate=error_rate, seed=seed) as server, contextlib.redirect_stdout(io.StringIO()):
+        config["URL"] = server.url
+        uploader = SpoolUploader(GoogleFormSink(config), spool, backoff_base=0.02, backoff_max=0.2, seed=seed).start()
+        save_ms = []
+        for i in range(rows):
+            if i == rows // 4:
+                server.outage(0.5)
+            t0 = time.perf_counter()
+            uploader.save(f"item{i}", "測試", 1000 + i)
+            save_ms.append((time.perf_counter() - t0) * 1000)
+        left = uploader.close(timeout=0.8)   # 模擬還沒送完就被關掉
+
+        restarted = SpoolUploader(GoogleFormSink(config), spool, backoff_base=0.02, backoff_max=0.2, seed=seed + 1).start()
+        replayed = restarted.stats["replayed"]
+        remaining = restarted.close(timeout=30)
+
+    names = [r["entry.name"] for r in server.received]
+    save_ms.sort()
+    return {
+        "rows": rows, "received": len(set(names)), "duplicates": len(names) - len(set(names)),
+        "left_at_shutdown": left, "replayed": replayed, "remaining": remaining,
+        "requests": server.requests, "save_p95_ms": save_ms[int(len(save_ms) * 0.95) - 1],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="上傳 spool")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_check = sub.add_parser("check", help="對會隨機失敗的本機替身測試斷線與重啟補送")
+    p_check.add_argument("--rows", type=int, default=200)
+    p_check.add_argument("--error-rate", type=float, default=0.3)
+    sub.add_parser("status", help="顯示 spool 中未送出的筆數")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        if not os.path.exists(SPOOL_PATH):
+            print(f"📦 {SPOOL_PATH} 不存在 (沒有未送出的資料)")
+            return 0
+        db = sqlite3.connect(SPOOL_PATH)
+        print(f"📦 {SPOOL_PATH}: {db.execute('SELECT COUNT(*) FROM pending').fetchone()[0]} 筆未送出")
+        return 0
+
+    r = check(args.rows, args.error_rate)
+    print(f"📤 {r['rows']} 筆 | 送達 {r['received']} (重複 {r['duplicates']}) | 關閉時未送 {r['left_at_shutdown']} → "
+          f"重啟補送 {r['replayed']} | 最後剩 {r['remaining']} | HTTP 請求 {r['requests']} 次")
+    print(f"⏱️ save() p95 {r['save_p95_ms']:.2f} ms (不等網路)")
+    return 0 if r["received"] == r["rows"] and not r["remaining"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())